@@ -1312,6 +1312,10 @@ class FanFicFarePlugin(InterfaceAction):
 
         ## save and share caches and cookiejar between all downloads.
         configuration = adapter.get_configuration()
+        ## like CLI --force, try again URLs that just failed.
+        if collision in (OVERWRITEALWAYS,UPDATEALWAYS):
+            configuration.set('overrides','use_negative_cache','false')
+
         if 'basic_cache' in options:
             configuration.set_basic_cache(options['basic_cache'])
         else:
@@ -211,6 +211,7 @@ def do_download_for_worker(book,options,merge,notification=lambda x,y:x):
 
         from calibre_plugins.fanficfare_plugin.fff_util import get_fff_config
 
+        configuration = None
         try:
             logger.info("\n\n" + ("-"*80) + " " + book['url'])
             ## No need to download at all.  Can happen now due to
@@ -231,6 +232,10 @@ def do_download_for_worker(book,options,merge,notification=lambda x,y:x):
             if options['fileform'] not in ("epub","html"):
                 configuration.set("overrides","include_images","false")
 
+            ## like CLI --force, try again URLs that just failed.
+            if book['collision'] in (OVERWRITEALWAYS,UPDATEALWAYS):
+                configuration.set('overrides','use_negative_cache','false')
+
             adapter = adapters.getAdapter(configuration,book['url'])
             adapter.is_adult = book['is_adult']
             adapter.username = book['username']
@@ -447,6 +452,11 @@ def do_download_for_worker(book,options,merge,notification=lambda x,y:x):
             book['icon']='dialog_error.png'
             book['status'] = _('Error')
             logger.info("Exception: %s:%s"%(book,book['comment']),exc_info=True)
+        finally:
+            ## each book reads the browser cache on its own, don't
+            ## keep the browser's files open between them.
+            if configuration is not None and configuration.browser_cache is not None:
+                configuration.browser_cache.close()
     return book
 
 ## calibre's columns for an existing book are passed in and injected
@@ -19,7 +19,9 @@ from __future__ import absolute_import
 
 import re
 
-stack = []
+## Stack of the open inline tags, used by htmlheuristics'
+## tag_sanitizer().  One for each call so replace_br_with_p() can run
+## in several threads at once.
 
 def get_end_tag(tag):
     if len(tag) > 0 and tag.find(u'<') > -1 and tag.rfind(u'>') > -1:
@@ -31,43 +33,38 @@ def get_tag_name(tag):
         return re.sub(r'</*([^\ >]+).*', r'\1', tag)
     return u''
 
-def push(tag):
-    if len(tag) > 0 and tag.find(u'<') > -1 and tag.rfind(u'>') > -1:
-        stack.append(tag)
+class HtmlTagStack(object):
+    def __init__(self):
+        self.stack = []
 
-def pop():
-    if len(stack) > 0:
-        return stack.pop()
-    return u''
+    def push(self, tag):
+        if len(tag) > 0 and tag.find(u'<') > -1 and tag.rfind(u'>') > -1:
+            self.stack.append(tag)
 
-def pop_end_tag():
-    return unicode(get_end_tag(pop()))
-
-def spool_end():
-    html = u''
-    for tag in reversed(stack):
-        html += get_end_tag(tag)
-    return html
-
-def spool_start():
-    html = u''
-    for item in stack:
-        html += item
-    return html
-
-def has_elements():
-    return len(stack) > 0
-
-def get_last():
-    # t = pop()
-    # push(t)
-    # return t
-    if len(stack) > 0:
-        return stack[len(stack)-1]
-    return u''
+    def pop(self):
+        if len(self.stack) > 0:
+            return self.stack.pop()
+        return u''
+
+    def pop_end_tag(self):
+        return get_end_tag(self.pop())
+
+    def spool_end(self):
+        return u''.join( get_end_tag(tag) for tag in reversed(self.stack) )
+
+    def spool_start(self):
+        return u''.join(self.stack)
+
+    def has_elements(self):
+        return len(self.stack) > 0
+
+    def get_last(self):
+        if len(self.stack) > 0:
+            return self.stack[-1]
+        return u''
 
-def flush():
-    del stack[:]
+    def flush(self):
+        del self.stack[:]
 
-def get_stack():
-    return stack
+    def get_stack(self):
+        return self.stack
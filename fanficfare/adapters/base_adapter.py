@@ -40,12 +40,46 @@ logger = logging.getLogger(__name__)
 from ..story import Story
 from ..requestable import Requestable
 from ..htmlcleanup import stripHTML, decode_email
+from ..souputils import parse_html, DEFAULT_SOUP_PARSER
 from ..exceptions import InvalidStoryURL, StoryDoesNotExist, HTTPErrorFFF
+from ..fetchers.prefetch import Prefetcher
 
 # was defined here before, imported for all the adapters that still
 # expect it.
 from ..dateutils import makeDate
 
+class SoupCleanupPlan(object):
+    '''
+    Settings for BaseSiteAdapter._do_utf8FromSoup(), from the
+    adapter's configuration sections.
+    '''
+    def __init__(self, adapter, sections):
+        self.sections = sections
+
+        acceptable_attributes = adapter.getConfigList('keep_html_attrs',['href','name','class','id','data-orighref'])
+        if adapter.getConfig("keep_style_attr"):
+            acceptable_attributes.append('style')
+        if adapter.getConfig("keep_title_attr"):
+            acceptable_attributes.append('title')
+        self.include_images = adapter.getConfig('include_images')
+        if self.include_images == 'true': # not false or coveronly
+            ## actually effects all tags' attrs, not just <img>, but I'm okay with that.
+            acceptable_attributes.extend(('src','alt','longdesc'))
+        self.acceptable_attributes = frozenset(acceptable_attributes)
+        self.cover_exclusion_regexp = adapter.getConfig('cover_exclusion_regexp')
+
+        self.remove_tags = frozenset(adapter.getConfigList('remove_tags',['script','style']))
+        self.replace_tags_with_spans = frozenset(adapter.getConfigList('replace_tags_with_spans',['u']))
+        self.keep_empty_tags = frozenset(adapter.getConfigList('keep_empty_tags',['p','td','th']))
+
+        ## only if class otherwise allowed (minor perf opt).
+        self.remove_class_chapter = ( 'class' in self.acceptable_attributes and
+                                      adapter.getConfig('remove_class_chapter',True) )
+        self.fix_relative_text_links = adapter.getConfig('fix_relative_text_links')
+        self.normalize_text_links = adapter.getConfig('normalize_text_links')
+        self.fix_text_links = self.fix_relative_text_links or self.normalize_text_links
+        self.decode_emails = adapter.getConfig("decode_emails",True)
+
 # quick convenience class
 class TimeKeeper(defaultdict):
     def __init__(self):
@@ -96,6 +130,7 @@ class BaseSiteAdapter(Requestable):
         self.logfile = None
         self.ignore_chapter_url_list = None
         self.parsed_QS = None
+        self.soup_cleanup_plan = None
 
         self.section_url_names(self.getSiteDomain(),self.get_section_url)
 
@@ -229,75 +264,87 @@ class BaseSiteAdapter(Requestable):
             percent = 0.0
             per_step = 1.0/self.story.getChapterCount()
             # logger.debug("self.story.getChapterCount():%s per_step:%s"%(self.story.getChapterCount(),per_step))
-            for index, chap in enumerate(self.chapterUrls):
-                title = chap['title']
-                url = chap['url']
-                #logger.debug("index:%s"%index)
-                newchap = False
-                passchap = dict(chap)
-                if (self.chapterFirst!=None and index < self.chapterFirst) or \
-                        (self.chapterLast!=None and index > self.chapterLast):
-                    passchap['html'] = None
-                else:
-                    data = None
-                    if self.oldchaptersmap:
-                        if url in self.oldchaptersmap:
-                            # logger.debug("index:%s title:%s url:%s"%(index,title,url))
-                            # logger.debug(self.oldchaptersmap[url])
+            preloaded = self.preload_browser_cache()
+            prefetcher = self.make_chapter_prefetcher()
+            try:
+                for index, chap in enumerate(self.chapterUrls):
+                    title = chap['title']
+                    url = chap['url']
+                    #logger.debug("index:%s"%index)
+                    newchap = False
+                    passchap = dict(chap)
+                    if (self.chapterFirst!=None and index < self.chapterFirst) or \
+                            (self.chapterLast!=None and index > self.chapterLast):
+                        passchap['html'] = None
+                    else:
+                        data = None
+                        if self.oldchaptersmap:
+                            if url in self.oldchaptersmap:
+                                # logger.debug("index:%s title:%s url:%s"%(index,title,url))
+                                # logger.debug(self.oldchaptersmap[url])
+                                data = self.utf8FromSoup(None,
+                                                         self.oldchaptersmap[url],
+                                                         partial(cachedfetch,self.get_request_raw,self.oldimgs))
+                        elif self.oldchapters and index < len(self.oldchapters):
                             data = self.utf8FromSoup(None,
-                                                     self.oldchaptersmap[url],
+                                                     self.oldchapters[index],
                                                      partial(cachedfetch,self.get_request_raw,self.oldimgs))
-                    elif self.oldchapters and index < len(self.oldchapters):
-                        data = self.utf8FromSoup(None,
-                                                 self.oldchapters[index],
-                                                 partial(cachedfetch,self.get_request_raw,self.oldimgs))
-
-                    if self.getConfig('mark_new_chapters') == 'true':
-                        # if already marked new -- ie, origtitle and title don't match
-                        # logger.debug("self.oldchaptersdata[url]:%s"%(self.oldchaptersdata[url]))
-                        newchap = (self.oldchaptersdata is not None and
-                                   url in self.oldchaptersdata and (
-                                self.oldchaptersdata[url]['chapterorigtitle'] !=
-                                self.oldchaptersdata[url]['chaptertitle']) )
-
-                    try:
-                        if not data:
-                            data = self.getChapterTextNum(url,index)
-                            # if had to fetch and has existing chapters
-                            newchap = bool(self.oldchapters or self.oldchaptersmap)
-
-                        if index == 0 and self.getConfig('always_reload_first_chapter'):
-                            data = self.getChapterTextNum(url,index)
-                            # first chapter is rarely marked new
-                            # anyway--only if it's replaced during an
-                            # update.
-                            newchap = False
-                    except Exception as e:
-                        if self.getConfig('continue_on_chapter_error',False):
-                            data = self.make_soup("""<div>
+
+                        if self.getConfig('mark_new_chapters') == 'true':
+                            # if already marked new -- ie, origtitle and title don't match
+                            # logger.debug("self.oldchaptersdata[url]:%s"%(self.oldchaptersdata[url]))
+                            newchap = (self.oldchaptersdata is not None and
+                                       url in self.oldchaptersdata and (
+                                    self.oldchaptersdata[url]['chapterorigtitle'] !=
+                                    self.oldchaptersdata[url]['chaptertitle']) )
+
+                        try:
+                            if not data:
+                                if prefetcher:
+                                    prefetcher.wait(url)
+                                data = self.getChapterTextNum(url,index)
+                                if prefetcher:
+                                    prefetcher.fetched(url)
+                                # if had to fetch and has existing chapters
+                                newchap = bool(self.oldchapters or self.oldchaptersmap)
+
+                            if index == 0 and self.getConfig('always_reload_first_chapter'):
+                                data = self.getChapterTextNum(url,index)
+                                # first chapter is rarely marked new
+                                # anyway--only if it's replaced during an
+                                # update.
+                                newchap = False
+                        except Exception as e:
+                            if self.getConfig('continue_on_chapter_error',False):
+                                data = self.make_soup("""<div>
 <p><b>Error</b></p>
 <p>FanFicFare failed to download this chapter.  Because
 <b>continue_on_chapter_error</b> is set to <b>true</b>, the download continued.</p>
 <p>Chapter URL:<br><a href="%s">%s</a></p>
 <p>Error:<br><pre>%s</pre></p>
 </div>"""%(url,url,traceback.format_exc().replace("&","&amp;").replace(">","&gt;").replace("<","&lt;")))
-                            title = title+self.getConfig("chapter_title_error_mark","(CHAPTER ERROR)")
-                            logger.info("continue_on_chapter_error: (%s) %s"%(url,e))
-                            logger.debug(traceback.format_exc())
-                            url="chapter url removed due to failure"
-                            self.story.chapter_error_count += 1
-                        else:
-                            raise
-
-                    percent += per_step
-                    notification(percent,self.url)
-                    passchap['url'] = url
-                    passchap['title'] = title
-                    passchap['html'] = data
-                    ## XXX -- add chapter text replacement here?
-                    ## No?  Want to be able to configure by [writer]
-                    ## It's a soup or soup part?
-                self.story.addChapter(passchap, newchap)
+                                title = title+self.getConfig("chapter_title_error_mark","(CHAPTER ERROR)")
+                                logger.info("continue_on_chapter_error: (%s) %s"%(url,e))
+                                logger.debug(traceback.format_exc())
+                                url="chapter url removed due to failure"
+                                self.story.chapter_error_count += 1
+                            else:
+                                raise
+
+                        percent += per_step
+                        notification(percent,self.url)
+                        passchap['url'] = url
+                        passchap['title'] = title
+                        passchap['html'] = data
+                        ## XXX -- add chapter text replacement here?
+                        ## No?  Want to be able to configure by [writer]
+                        ## It's a soup or soup part?
+                    self.story.addChapter(passchap, newchap)
+            finally:
+                if prefetcher:
+                    prefetcher.shutdown()
+                if preloaded:
+                    preloaded.clear_preloaded()
             self.storyDone = True
 
             # include image, but no cover from story, add default_cover_image cover.
@@ -333,6 +380,83 @@ class BaseSiteAdapter(Requestable):
         # logger.debug(u"getStory times:\n%s"%self.times)
         return self.story
 
+    def make_chapter_prefetcher(self):
+        '''
+        With prefetch_chapters:N, fetch the next N chapter pages in
+        background threads while the current chapter is parsed and
+        cleaned.  Prefetched pages are handed over through BasicCache,
+        so it does nothing without use_basic_cache:true--which is also
+        the list of adapters known to be safe fetching the same page
+        twice.
+
+        Prefetch requests go through the same SleepDecorator/
+        HostRateLimiter as everything else, so per-site limits hold
+        no matter how many workers there are.
+
+        Only the first chapter is prefetched until the adapter is seen
+        fetching that same URL, see Prefetcher.
+        '''
+        try:
+            window = int(self.getConfig('prefetch_chapters',0))
+        except ValueError:
+            logger.warning("Ignoring non-int prefetch_chapters(%s)"%self.getConfig('prefetch_chapters'))
+            window = 0
+        if window < 1:
+            return None
+        if not self.getConfig('use_basic_cache'):
+            logger.info("prefetch_chapters requires use_basic_cache:true, not prefetching.")
+            return None
+
+        fetcher = self.configuration.get_fetcher()
+
+        urls = self.get_chapter_urls_to_fetch()
+        if not urls:
+            return None
+        logger.debug("Prefetching %s chapters, window:%s"%(len(urls),window))
+        return Prefetcher(fetcher, urls,
+                          window=window)
+
+    def get_chapter_urls_to_fetch(self):
+        '''
+        Only chapters that will actually be fetched, in order.
+        '''
+        urls = []
+        for index, chap in enumerate(self.chapterUrls):
+            if (self.chapterFirst!=None and index < self.chapterFirst) or \
+                    (self.chapterLast!=None and index > self.chapterLast):
+                continue
+            url = chap['url']
+            if self.oldchaptersmap:
+                if url in self.oldchaptersmap:
+                    continue
+            elif self.oldchapters and index < len(self.oldchapters):
+                continue
+            urls.append(url)
+        return urls
+
+    def preload_browser_cache(self):
+        '''
+        With use_browser_cache, look up all the chapters in the browser
+        cache in one pass instead of one full lookup per chapter.
+        Found pages are handed to BrowserCacheDecorator the first time
+        each is requested.  Anything that goes wrong here just leaves
+        the chapters to be looked up one at a time as before.
+        '''
+        browser_cache = self.configuration.browser_cache
+        if not (self.getConfig('use_browser_cache') and browser_cache):
+            return None
+        ## as BrowserCacheDecorator will be asked for them.
+        condition_url = self.configuration.get_fetcher().condition_url
+        urls = [ condition_url(url) for url in self.get_chapter_urls_to_fetch() ]
+        if len(urls) < 2:
+            return None
+        try:
+            browser_cache.preload(urls)
+        except Exception as e:
+            logger.debug("Browser cache preload failed, looking up chapters one at a time: %s"%e)
+            return None
+        return browser_cache
+
     def getStoryMetadataOnly(self,get_cover=True):
         if not self.metadataDone:
             try:
@@ -643,202 +767,234 @@ class BaseSiteAdapter(Requestable):
         self.times.add("utf8FromSoup", datetime.now() - start)
         return retval
 
+    def remove_chapter_class(self,t):
+        t['class'].remove('chapter')
+        if not t['class']: # remove if list empty now.
+            del t['class']
+
     def remove_class_chapter(self,soup):
-        def rm_chp_cls(t):
-            t['class'].remove('chapter')
-            if not t['class']: # remove if list empty now.
-                del t['class']
         for t in soup.select('.chapter'):
-            rm_chp_cls(t)
+            self.remove_chapter_class(t)
         # if soup is itself a tag with class='chapter', select doesn't
         # find it.
         if soup.has_attr('class') and 'chapter' in soup['class']:
-            rm_chp_cls(soup)
-
-    def _do_utf8FromSoup(self,url,soup,fetch=None,allow_replace_br_with_p=True):
-        if not fetch:
-            fetch=self.get_request_raw
+            self.remove_chapter_class(soup)
 
-        if self.getConfig("decode_emails",True):
-            # <a href="/cdn-cgi/l/email-protection" class="__cf_email__" data-cfemail="c7ada8afa9a3a8a287a2aaa6aeabe9a4a8aa">[email&#160;protected]</a>
-            # <a href="/cdn-cgi/l/email-protection#e3a18f8a8d87ae8c969086d2d7d0a3b3abac8d869790cd8c9184"><span class="__cf_email__" data-cfemail="296b4540474d64465c5a4c181d1a69796166474c5d5a07465b4e">[email&#160;protected]</span></a>
-            for emailtag in soup.select('a.__cf_email__') + soup.select('span.__cf_email__'):
-                tagtext = '(tagtext not set yet)'
-                try:
-                    tagtext = unicode(emailtag)
-                    emaildata = emailtag['data-cfemail']
-                    if not emaildata:
-                        continue
-                    addr = decode_email(emaildata)
-                    repltag = emailtag
-                    if( emailtag.name == 'span' and
-                        emailtag.parent.name == 'a' and
-                        emailtag.parent['href'].startswith('/cdn-cgi/l/email-protection') ):
-                        repltag = emailtag.parent
-                    repltag.name='span'
-                    if repltag.has_attr('href'):
-                        del repltag['href']
-                    repltag['class']='decoded_email'
-                    repltag.string = addr
-                except Exception as e:
-                    logger.info("decode_emails failed on (%s)"%tagtext)
-                    logger.info(e)
-                    logger.debug(traceback.format_exc())
-
-        acceptable_attributes = self.getConfigList('keep_html_attrs',['href','name','class','id','data-orighref'])
-
-        if self.getConfig("keep_style_attr"):
-            acceptable_attributes.append('style')
-        if self.getConfig("keep_title_attr"):
-            acceptable_attributes.append('title')
+    def get_soup_cleanup_plan(self):
+        '''
+        The settings _do_utf8FromSoup() uses, looked up once per
+        adapter instead of for every tag in every chapter.  Made again
+        if the configuration's sections change, as when the story URL
+        section is set.
+        '''
+        sections = tuple(self.configuration.sectionslist)
+        if self.soup_cleanup_plan is None or self.soup_cleanup_plan.sections != sections:
+            self.soup_cleanup_plan = SoupCleanupPlan(self,sections)
+        return self.soup_cleanup_plan
+
+    def make_text_link_absolute(self,url,href):
+        parsedUrl = urlparse(url)
+        if href.startswith("//") :
+            return urlunparse(
+                (parsedUrl.scheme,
+                 '',
+                 href,
+                 '','',''))
+        elif href.startswith("/") :
+            return urlunparse(
+                (parsedUrl.scheme,
+                 parsedUrl.netloc,
+                 href,
+                 '','',''))
+        else:
+            if parsedUrl.path.endswith("/"):
+                toppath = parsedUrl.path
+            else:
+                toppath = parsedUrl.path[:parsedUrl.path.rindex('/')+1]
+            return urlunparse(
+                (parsedUrl.scheme,
+                 parsedUrl.netloc,
+                 toppath + href,
+                 '','',''))
+
+    def fix_text_link(self,url,alink,plan,ids=None):
+        '''
+        Returns False for an #anchor link when ids (of the chapter's
+        tags) isn't known yet, to be done again after.
+        '''
+        href = alink['href']
+        ## Make relative links in text into absolute links using page
+        ## URL.
+        if plan.fix_relative_text_links and href: # Saw some links with href=""
+            ## Mistakenly ended up with some // in image urls, like:
+            ## https://forums.spacebattles.com//styles/default/xenforo/clear.png
+            ## Removing one /, but not ://
+            if not href.startswith("file:"): # keep file:///
+                href = re.sub(r"([^:])//",r"\1/",href)
+            ## Link to an #anchor tag, keep if target tag also
+            ## in chapter text--any tag's id, not just <a>s
+            ## Came up in issue #952
+            if href.startswith("http") or href.startswith("file:") or url == None:
+                pass
+            elif href[0] == "#":
+                if ids is None:
+                    return False
+                if href[1:] not in ids:
+                    href = self.make_text_link_absolute(url,href)
+            else:
+                href = self.make_text_link_absolute(url,href)
 
-        #print("include_images:"+self.getConfig('include_images'))
-        if self.getConfig('include_images') == 'true': # not false or coveronly
-            ## actually effects all tags' attrs, not just <img>, but I'm okay with that.
-            acceptable_attributes.extend(('src','alt','longdesc'))
-            for img in soup.find_all('img'):
+        ## apply adapter's normalize_chapterurls to all links in
+        ## chapter texts, if they match chapter URLs.  While this will
+        ## be occasionally helpful by itself, it's really for the next
+        ## feature: internal text links.
+        if plan.normalize_text_links:
+            href = self.normalize_chapterurl(href)
+        alink['href'] = href
+        return True
+
+    def decode_cf_emails(self,soup):
+        # <a href="/cdn-cgi/l/email-protection" class="__cf_email__" data-cfemail="c7ada8afa9a3a8a287a2aaa6aeabe9a4a8aa">[email&#160;protected]</a>
+        # <a href="/cdn-cgi/l/email-protection#e3a18f8a8d87ae8c969086d2d7d0a3b3abac8d869790cd8c9184"><span class="__cf_email__" data-cfemail="296b4540474d64465c5a4c181d1a69796166474c5d5a07465b4e">[email&#160;protected]</span></a>
+        for emailtag in soup.find_all(['a','span'],class_='__cf_email__'):
+            tagtext = '(tagtext not set yet)'
+            try:
+                tagtext = unicode(emailtag)
+                emaildata = emailtag['data-cfemail']
+                if not emaildata:
+                    continue
+                addr = decode_email(emaildata)
+                repltag = emailtag
+                if( emailtag.name == 'span' and
+                    emailtag.parent.name == 'a' and
+                    emailtag.parent['href'].startswith('/cdn-cgi/l/email-protection') ):
+                    repltag = emailtag.parent
+                repltag.name='span'
+                if repltag.has_attr('href'):
+                    del repltag['href']
+                repltag['class']='decoded_email'
+                repltag.string = addr
+            except Exception as e:
+                logger.info("decode_emails failed on (%s)"%tagtext)
+                logger.info(e)
+                logger.debug(traceback.format_exc())
+
+    def clean_tag(self,url,t,fetch,plan):
+        '''
+        Cleans one tag before its children.  Returns False if t was
+        removed.
+        '''
+        for attr in list(t.attrs):
+            if attr not in plan.acceptable_attributes:
+                del t[attr] ## strip all tag attributes except acceptable_attributes
+
+        # remove script tags cross the board.
+        # epub readers (Moon+, FBReader & Aldiko at least)
+        # don't like <style> tags in body.
+        if t.name in plan.remove_tags:
+            t.decompose()
+            return False
+
+        # these are not acceptable strict XHTML.  But we
+        # do already have CSS classes of the same names
+        # defined
+        if t.name in plan.replace_tags_with_spans:
+            t['class']=t.name
+            t.name='span'
+        elif t.name == 'center':
+            t['class']=t.name
+            t.name='div'
+        elif plan.remove_class_chapter and 'chapter' in t.get('class',[]):
+            self.remove_chapter_class(t)
+
+        if t.name == 'img':
+            if plan.include_images == 'true': # not false or coveronly
                 try:
                     # some pre-existing epubs have img tags that had src stripped off.
-                    if img.has_attr('src'):
-                        (img['src'],img['longdesc'])=self.story.addImgUrl(url,self.img_url_trans(img['src']),fetch,
-                                                                          coverexclusion=self.getConfig('cover_exclusion_regexp'))
+                    if t.has_attr('src'):
+                        (t['src'],t['longdesc'])=self.story.addImgUrl(url,self.img_url_trans(t['src']),fetch,
+                                                                      coverexclusion=plan.cover_exclusion_regexp)
                 except AttributeError as ae:
-                    logger.info("Parsing for img tags failed--probably poor input HTML.  Skipping img(%s)"%img)
-        else:
-            ## remove all img tags entirely
-            for img in soup.find_all('img'):
-                img.decompose()
+                    logger.info("Parsing for img tags failed--probably poor input HTML.  Skipping img(%s)"%t)
+            else:
+                ## remove all img tags entirely
+                t.decompose()
+                return False
+        return True
+
+    def is_empty_tag(self,t,plan,removed_child):
+        '''
+        Paired, but empty non paragraph tags, checked after t's
+        children.  Also when removing children left only whitespace,
+        unless t has an id--it may be a link target.  Tags that never
+        had contents (<br>, <hr>, <a id=...>) are kept.
+        '''
+        if t.name in plan.keep_empty_tags:
+            return False
+        if t.string != None and len(t.string.strip()) == 0:
+            return True
+        return ( removed_child and not t.has_attr('id') and
+                 not any( isinstance(c,Tag) or c.strip() for c in t.contents ) )
+
+    def clean_soup(self,url,soup,fetch):
+        '''
+        Strips attributes, removes and renames tags, fixes images and
+        links and removes empty tags, all in one walk of the tree.
+        Children are done before their parent so a parent left empty
+        is removed too without parsing the HTML again.
+        '''
+        plan = self.get_soup_cleanup_plan()
+        if plan.decode_emails:
+            self.decode_cf_emails(soup)
 
         for attr in self.get_attr_keys(soup):
-            if attr not in acceptable_attributes:
+            if attr not in plan.acceptable_attributes:
                 del soup[attr] ## strip all tag attributes except configured
-
         ## some tags, notable chapter div from Base eFiction have
         ## class='chapter', which causes calibre convert to id it as a
         ## chapter and 'pagebreak' - AKA split the file.  Remove by
-        ## default, but only if class otherwise allowed (minor perf opt).
-        if 'class' in acceptable_attributes and self.getConfig('remove_class_chapter',True):
-            self.remove_class_chapter(soup)
-
-        ## Make relative links in text into absolute links using page
-        ## URL.
-        if self.getConfig('fix_relative_text_links'):
-            for alink in soup.find_all('a'):
-                if alink.has_attr('href') and alink['href']: # Saw some links with href=""
-                    ## hrefurl now also the flag for been-handled / needs-handled
-                    hrefurl = None
-                    toppath=""
-                    href = alink['href']
-                    ## Mistakenly ended up with some // in image urls, like:
-                    ## https://forums.spacebattles.com//styles/default/xenforo/clear.png
-                    ## Removing one /, but not ://
-                    if not href.startswith("file:"): # keep file:///
-                        href = re.sub(r"([^:])//",r"\1/",href)
-                    ## Link to an #anchor tag, keep if target tag also
-                    ## in chapter text--any tag's id, not just <a>s
-                    ## Came up in issue #952
-                    ## Somebody put a '.' in the ID; this should
-                    ## handle identifiers that otherwise appear to be
-                    ## selectors themselves.  #966
-                    try:
-                        if href[0] == "#" and soup.select_one("[id='%s']"%href[1:]):
-                            hrefurl = href
-                    except Exception as e:
-                        logger.debug("Search for internal link anchor failed href:(%s)"%href)
-
-                    if href.startswith("http") or href.startswith("file:") or url == None:
-                        hrefurl = href
-
-                    ## make link absolute if not one of the above.
-                    if not hrefurl:
-                        parsedUrl = urlparse(url)
-                        if href.startswith("//") :
-                            hrefurl = urlunparse(
-                                (parsedUrl.scheme,
-                                 '',
-                                 href,
-                                 '','',''))
-                        elif href.startswith("/") :
-                            hrefurl = urlunparse(
-                                (parsedUrl.scheme,
-                                 parsedUrl.netloc,
-                                 href,
-                                 '','',''))
-                        else:
-                            if parsedUrl.path.endswith("/"):
-                                toppath = parsedUrl.path
-                            else:
-                                toppath = parsedUrl.path[:parsedUrl.path.rindex('/')+1]
-                            hrefurl = urlunparse(
-                                (parsedUrl.scheme,
-                                 parsedUrl.netloc,
-                                 toppath + href,
-                                 '','',''))
-                    alink['href'] = hrefurl
-                    # logger.debug("\n===========\nparsedUrl.path:%s\ntoppath:%s\nhrefurl:%s\n\n"%(parsedUrl.path,toppath,hrefurl))
+        ## default, but only if class otherwise allowed.
+        if plan.remove_class_chapter and soup.has_attr('class') and 'chapter' in soup['class']:
+            self.remove_chapter_class(soup)
+
+        ids = set() # of all tags, before attrs stripped.
+        anchor_links = [] # <a href="#..."> to do after.
+        ## [tag, remaining children, any child removed]
+        stack = [[soup, list(soup.contents)[::-1], False]]
+        while stack:
+            frame = stack[-1]
+            (t, children, removed_child) = frame
+            if children:
+                c = children.pop()
+                if not isinstance(c,Tag):
+                    continue
+                if c.has_attr('id'):
+                    ids.add(c['id'])
+                if not self.clean_tag(url,c,fetch,plan):
+                    frame[2] = True
+                    continue
+                if c.name == 'a' and c.has_attr('href') and plan.fix_text_links:
+                    if not self.fix_text_link(url,c,plan):
+                        anchor_links.append(c)
+                stack.append([c, list(c.contents)[::-1], False])
+                continue
+            stack.pop()
+            if stack and self.is_empty_tag(t,plan,removed_child):
+                t.decompose()
+                stack[-1][2] = True
+
+        for alink in anchor_links:
+            if alink.parent is not None: # not removed
+                self.fix_text_link(url,alink,plan,ids)
 
-        ## apply adapter's normalize_chapterurls to all links in
-        ## chapter texts, if they match chapter URLs.  While this will
-        ## be occasionally helpful by itself, it's really for the next
-        ## feature: internal text links.
-        if self.getConfig('normalize_text_links'):
-            for alink in soup.find_all('a'):
-                # try:
-                if alink.has_attr('href'):
-                    # logger.debug("normalize_text_links %s -> %s"%(alink['href'],self.normalize_chapterurl(alink['href'])))
-                    alink['href'] = self.normalize_chapterurl(alink['href'])
-                # except AttributeError as ae:
-                #     logger.info("Parsing for normalize_text_links failed...")
+    def _do_utf8FromSoup(self,url,soup,fetch=None,allow_replace_br_with_p=True):
+        if not fetch:
+            fetch=self.get_request_raw
 
         try:
-            # python doesn't have a do-while loop.
-            found_empty=True
-            do_resoup=False
-            while found_empty==True:
-                found_empty=False
-                if do_resoup:
-                    # re-soup when empty tags removed before looking
-                    # for more because multiple 'whitespace' strings
-                    # show up differently and doing stripHTML() also
-                    # catches <br> etc.
-                    soup = BeautifulSoup(unicode(soup),'html5lib')
-                for t in soup.findAll(recursive=True):
-                    for attr in self.get_attr_keys(t):
-                        if attr not in acceptable_attributes:
-                            del t[attr] ## strip all tag attributes except acceptable_attributes
-
-                    if t and hasattr(t,'name') and t.name is not None:
-                        # remove script tags cross the board.
-                        # epub readers (Moon+, FBReader & Aldiko at least)
-                        # don't like <style> tags in body.
-                        if t.name in self.getConfigList('remove_tags',['script','style']):
-                            t.decompose()
-                            continue
-
-                        # these are not acceptable strict XHTML.  But we
-                        # do already have CSS classes of the same names
-                        # defined
-                        if t.name in self.getConfigList('replace_tags_with_spans',['u']):
-                            t['class']=t.name
-                            t.name='span'
-                        if t.name in ('center'):
-                            t['class']=t.name
-                            t.name='div'
-
-                        # Removes paired, but empty non paragraph
-                        # tags.  Make another pass if any are found in
-                        # case parent is now empty.  Could add
-                        # significant time if deeply nested empty
-                        # tags.
-                        tmp = t
-                        if tmp.name not in self.getConfigList('keep_empty_tags',['p','td','th']) and t.string != None and len(t.string.strip()) == 0:
-                            found_empty==True
-                            do_resoup=True
-                            tmp.decompose()
-
+            self.clean_soup(url,soup,fetch)
         except AttributeError as ae:
-            if "%s"%ae != "'NoneType' object has no attribute 'next_element'":
-                logger.error("Error parsing HTML, probably poor input HTML. %s"%ae)
+            logger.error("Error parsing HTML, probably poor input HTML. %s"%ae)
 
         retval = unicode(soup)
 
@@ -891,10 +1047,9 @@ class BaseSiteAdapter(Requestable):
         ## re.sub() in simple test
         data = data.replace("<noscript","<fff_hide_noscript").replace("</noscript","</fff_hide_noscript")
 
-        ## soup and re-soup because BS4/html5lib is more forgiving of
-        ## incorrectly nested tags that way.
-        soup = BeautifulSoup(data,'html5lib')
-        soup = BeautifulSoup(unicode(soup),'html5lib')
+        ## html5lib gives the same soup as soup and re-soup, see
+        ## parse_html().
+        soup = parse_html(data,self.getConfig('html_parser') or DEFAULT_SOUP_PARSER)
 
         for ns in soup.find_all('fff_hide_noscript'):
             ns.name = 'noscript'
@@ -906,9 +1061,9 @@ class BaseSiteAdapter(Requestable):
     def normalize_chapterurl(self,url):
         return url
 
-def cachedfetch(realfetch,cache,url,referer=None):
+def cachedfetch(realfetch,cache,url,referer=None,image=False):
     if url in cache:
         return cache[url]
     else:
-        return realfetch(url,referer=referer)
+        return realfetch(url,referer=referer,image=image)
 
@@ -16,6 +16,7 @@
 #
 
 import os
+import threading
 from ..exceptions import BrowserCacheException
 from .base_browsercache import BaseBrowserCache, CACHE_DIR_CONFIG
 ## SimpleCache and BlockfileCache are both flavors of cache used by Chrome.
@@ -43,8 +44,73 @@ class BrowserCache(object):
         if self.browser_cache_impl is None:
             raise BrowserCacheException("%s is not set, or directory does not contain a known browser cache type: '%s'"%
                                         (CACHE_DIR_CONFIG,getConfig_fn(CACHE_DIR_CONFIG)))
+        ## url -> (entryid, encoding, raw data) found by preload(),
+        ## given out once by get_data()
+        self.preloaded = {}
+        ## urls preload() didn't find, in order, for
+        ## open_pages_in_browser_window.
+        self.missing = []
+        ## impls keep indexes that aren't safe to update from more
+        ## than one thread.
+        self.lock = threading.RLock()
 
     def get_data(self, url):
         # logger.debug("get_data:%s"%url)
-        d = self.browser_cache_impl.get_data(url)
-        return d
+        with self.lock:
+            raw = self.preloaded.pop(url,None)
+            if raw:
+                logger.debug("Preloaded:%s"%url)
+                return self.browser_cache_impl.decompress_entry(*raw)
+            d = self.browser_cache_impl.get_data(url)
+            return d
+
+    def get_data_many(self, urls):
+        with self.lock:
+            return self.browser_cache_impl.get_data_many(urls)
+
+    def preload(self, urls):
+        """
+        Look up all of urls (a story's chapters) in one pass and keep
+        the ones found for get_data().  Kept compressed as stored by
+        the browser, each is decompressed when get_data() takes it.
+        Not found is left for get_data() to look up again, which also
+        does open_pages_in_browser.  Returns the number found.
+        """
+        with self.lock:
+            results = self.browser_cache_impl.get_raw_data_many(urls)
+            found = dict( (url,raw) for (url,raw) in results.items() if raw and raw[2] )
+            self.preloaded.update(found)
+            self.missing = [ url for url in urls if url not in found ]
+        logger.debug("BrowserCache preloaded %s of %s"%(len(found),len(urls)))
+        return len(found)
+
+    def add_preloaded(self, url, d):
+        with self.lock:
+            ## already decompressed.
+            self.preloaded[url] = (None,'',d)
+            if url in self.missing:
+                self.missing.remove(url)
+
+    def take_missing(self, count, exclude=None):
+        """
+        Remove and return up to count urls preload() didn't find,
+        other than exclude, which is removed but not returned.
+        """
+        with self.lock:
+            taken = [ url for url in self.missing if url != exclude ][:max(0,count)]
+            self.missing = [ url for url in self.missing if url not in taken and url != exclude ]
+            return taken
+
+    def clear_preloaded(self):
+        with self.lock:
+            self.preloaded = {}
+            self.missing = []
+
+    def close(self):
+        """
+        Done reading for now: close the browser's cache files and drop
+        preloaded pages.  Later reads open the files again.
+        """
+        with self.lock:
+            self.clear_preloaded()
+            self.browser_cache_impl.close()
@@ -17,6 +17,8 @@
 
 import os
 import time, datetime
+import threading
+from collections import OrderedDict
 import gzip
 import zlib
 import re
@@ -47,6 +49,66 @@ from ..exceptions import BrowserCacheException
 
 CACHE_DIR_CONFIG="browser_cache_path"
 AGE_LIMIT_CONFIG="browser_cache_age_limit"
+MEMORY_LIMIT_CONFIG="browser_cache_memory_limit"
+## MB
+DEFAULT_MEMORY_LIMIT=50
+
+class DecompressedCache(object):
+    """
+    LRU of decompressed entry bodies keyed by entry identity (file
+    path, mtime, size or similar, from get_data_key_impl()) and
+    encoding, so a page read more than once is only decompressed
+    once.  Matters most for brotli in calibre, where the pure python
+    brotlidecpy can take seconds per page.
+
+    Shared by all browser cache instances in the process so the
+    update check and the download that follows it both use it.
+    """
+    def __init__(self, size_limit=DEFAULT_MEMORY_LIMIT*1024*1024):
+        self.lock = threading.Lock()
+        self.size_limit = size_limit
+        # (entryid, encoding) -> data
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def set_size_limit(self, size_limit):
+        with self.lock:
+            self.size_limit = size_limit
+            self.evict()
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        with self.lock:
+            if key in self.entries or len(data) > self.size_limit:
+                return
+            self.entries[key] = data
+            self.size += len(data)
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until under size_limit"""
+        while self.size > self.size_limit and self.entries:
+            (key, data) = self.entries.popitem(last=False)
+            self.size -= len(data)
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.size = 0
+
+## shared by all browser caches in the process.
+decompressed_cache = DecompressedCache()
 
 class BaseBrowserCache(object):
     """Base class to read various formats of web browser cache file"""
@@ -66,6 +128,13 @@ class BaseBrowserCache(object):
             # set in hours, recorded in seconds
             self.age_limit = float(age_limit) * 3600
 
+        memory_limit = self.getConfig(MEMORY_LIMIT_CONFIG)
+        if memory_limit is not None and memory_limit != '':
+            try:
+                decompressed_cache.set_size_limit(int(float(memory_limit)*1024*1024))
+            except ValueError:
+                logger.warning("Ignoring non-number %s(%s)"%(MEMORY_LIMIT_CONFIG,memory_limit))
+
     @classmethod
     def new_browser_cache(cls, site, getConfig_fn, getConfigList_fn):
         """Return new instance of this BrowserCache class, or None if supplied directory not the correct cache type"""
@@ -90,44 +159,96 @@ class BaseBrowserCache(object):
     def get_data(self, url):
         """Return cached value for URL if found."""
         # logger.debug("get_data:%s"%url)
+        return self.get_data_many([url]).get(url)
+
+    def get_data_many(self, urls):
+        """
+        Return dict of url -> cached value (None if not found) for all
+        of urls.  The cache dir/index is only checked for changes once
+        for the whole list instead of once per key tried.
+        """
+        return dict( (url, self.decompress_entry(*raw) if raw else None)
+                     for (url, raw) in self.get_raw_data_many(urls).items() )
+
+    def get_raw_data_many(self, urls):
+        """
+        get_data_many(), but not decompressed yet: dict of url ->
+        (entryid, encoding, raw data) or None.  Pass to
+        decompress_entry() for the data.
+        """
+        self.update_index()
+        results = {}
+        redirects = {}
+        for url in urls:
+            if url in results or url in redirects:
+                continue
+            results[url] = None
+            ## allow for a list of keys specifically for finding WebToEpub
+            ## cached entries.
+            rettuple = None
+            for key in self.make_keys(url):
+                logger.debug("Cache Key:%s"%key)
+                entrytuple = self.get_data_key_impl(url, key)
+                # use newest
+                if entrytuple and (not rettuple or rettuple[1] < entrytuple[1]):
+                    rettuple = entrytuple
+
+            if rettuple is None:
+                continue
+
+            (location,
+             age,
+             encoding,
+             rawdata) = rettuple[:4]
+            entryid = rettuple[4] if len(rettuple) > 4 else None
 
-        ## allow for a list of keys specifically for finding WebToEpub
-        ## cached entries.
-        rettuple = None
-        for key in self.make_keys(url):
-            logger.debug("Cache Key:%s"%key)
-            entrytuple = self.get_data_key_impl(url, key)
-            # use newest
-            if entrytuple and (not rettuple or rettuple[1] < entrytuple[1]):
-                rettuple = entrytuple
-
-        if rettuple is None:
-            return None
-
-        (location,
-         age,
-         encoding,
-         rawdata) = rettuple
-
-        # age check
-        logger.debug("age:%s"%datetime.datetime.fromtimestamp(age))
-        logger.debug("now:%s"%datetime.datetime.fromtimestamp(time.time()))
-        if not (self.age_limit is None or age > time.time()-self.age_limit):
-            logger.debug("Cache entry found, rejected, past age limit")
-            return None
+            # age check
+            logger.debug("age:%s"%datetime.datetime.fromtimestamp(age))
+            logger.debug("now:%s"%datetime.datetime.fromtimestamp(time.time()))
+            if self.past_age_limit(age):
+                logger.debug("Cache entry found, rejected, past age limit")
+                continue
+
+            # follow location redirects, all together below.
+            if location:
+                logger.debug("Do Redirect(%s)"%location)
+                redirects[url] = self.make_redirect_url(location,url)
+                continue
+
+            results[url] = (entryid,encoding,rawdata)
 
         # recurse on location redirects
-        if location:
-            logger.debug("Do Redirect(%s)"%location)
-            return self.get_data(self.make_redirect_url(location,url))
+        if redirects:
+            redirected = self.get_raw_data_many(list(redirects.values()))
+            for url, location in redirects.items():
+                results[url] = redirected.get(location)
+        return results
 
-        # decompress
-        return self.decompress(encoding,rawdata)
+    def past_age_limit(self, age):
+        """True if age (seconds since epoch) is older than browser_cache_age_limit"""
+        return not (self.age_limit is None or age > time.time()-self.age_limit)
+
+    def update_index(self):
+        """
+        Called once before each batch of get_data_key_impl() calls
+        for subclasses that keep an index of the cache to re-read it
+        if the browser has changed it.
+        """
+        pass
+
+    def close(self):
+        """
+        Release any files subclasses keep open.  Reading again after
+        is allowed and re-opens them.
+        """
+        pass
 
     def get_data_key_impl(self, url, key):
         """
         returns location, entry age, content-encoding and
-        raw(compressed) data
+        raw(compressed) data.  May also return a fifth value that
+        identifies this version of the entry (file path, mtime, size
+        for example), used as key for caching the decompressed data.
         """
         raise NotImplementedError()
 
@@ -182,6 +303,20 @@ class BaseBrowserCache(object):
                            location.strip(),
                            '','',''))
 
+    def decompress_entry(self, entryid, encoding, data):
+        """decompress(), using decompressed_cache when entryid given"""
+        encoding = ensure_text(encoding)
+        if entryid is None or encoding not in ('gzip','br','deflate'):
+            return self.decompress(encoding,data)
+        key = (entryid, encoding)
+        d = decompressed_cache.get(key)
+        if d is None:
+            d = self.decompress(encoding,data)
+            decompressed_cache.set(key,d)
+        else:
+            logger.debug("Already decompressed")
+        return d
+
     def decompress(self, encoding, data):
         encoding = ensure_text(encoding)
         if encoding == 'gzip':
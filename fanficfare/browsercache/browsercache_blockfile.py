@@ -17,8 +17,11 @@
 
 from __future__ import absolute_import
 import os
+import mmap
 import struct
+import threading
 import time, datetime
+from contextlib import contextmanager
 
 # note share_open (on windows CLI) is implicitly readonly.
 from .share_open import share_open
@@ -27,7 +30,6 @@ from .chromagnon.cacheAddress import CacheAddress
 from .chromagnon.cacheBlock import CacheBlock
 from .chromagnon.cacheData import CacheData
 from .chromagnon.cacheEntry import CacheEntry
-from .chromagnon.cacheParse import parse
 from ..six.moves import range
 from ..six import ensure_text
 
@@ -39,6 +41,118 @@ logger = logging.getLogger(__name__)
 INDEX_MAGIC_NUMBER = 0xC103CAC3
 BLOCK_MAGIC_NUMBER = 0xC104CAC3
 
+## bytes before the first block in data_N files.
+BLOCK_HEADER_SIZE = 8192
+## index header size and offset of table_len in it.
+INDEX_HEADER_SIZE = 92*4
+INDEX_TABLE_LEN_OFFSET = 28
+
+class BlockFiles(object):
+    """
+    The index and data_N block files of one cache dir, each opened and
+    mmapped once and then read by slicing instead of open/seek/close
+    for every entry, header, key and bucket chain hop.
+
+    Chrome only appends blocks to data_N files, so they're remapped
+    when a read runs past the end of the current map.  The index is
+    checked once per batch of lookups (check_index()) because Chrome replaces
+    it when the table grows or the cache is cleared, and everything is
+    remapped if it has.
+
+    f_XXXXXX separate files hold one body each, read once per lookup,
+    so they are just read, not kept open.
+
+    Replaced maps are closed as soon as no read is using them, and
+    close() closes them all.  On Windows an open map keeps Chrome
+    from truncating or replacing the file.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.index_stat = None
+        # file name -> mmap
+        self.maps = {}
+        # replaced maps waiting for readers to finish.
+        self.retired = []
+        # number of reads using maps right now.
+        self.readers = 0
+
+    def map_file(self, name):
+        with share_open(os.path.join(self.cache_dir, name), 'rb') as f:
+            try:
+                ## mmap keeps its own handle, file can be closed.
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                ## can't map empty files.
+                m = b''
+        self.retire([self.maps.get(name)])
+        self.maps[name] = m
+        return m
+
+    def retire(self, maps):
+        """Close maps now or after the last current read.  Call with lock held"""
+        self.retired.extend( m for m in maps if isinstance(m, mmap.mmap) )
+        if not self.readers:
+            for m in self.retired:
+                m.close()
+            self.retired = []
+
+    @contextmanager
+    def reading(self):
+        """Maps returned by get() inside this stay open"""
+        with self.lock:
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.readers -= 1
+                self.retire([])
+
+    def get(self, name, size=0):
+        """Return map of file name at least size long, if it is"""
+        with self.lock:
+            m = self.maps.get(name)
+            if m is None or len(m) < size:
+                m = self.map_file(name)
+            return m
+
+    def check_index(self):
+        """Drop all maps if the index file has been replaced or resized"""
+        st = os.stat(os.path.join(self.cache_dir, "index"))
+        with self.lock:
+            if self.index_stat != (st.st_ino, st.st_size):
+                if self.index_stat:
+                    logger.debug("BlockfileCache index changed, remapping")
+                self.index_stat = (st.st_ino, st.st_size)
+                self.retire(self.maps.values())
+                self.maps = {}
+
+    def close(self):
+        """Close all maps, files are mapped again if read after"""
+        with self.lock:
+            self.index_stat = None
+            self.retire(self.maps.values())
+            self.maps = {}
+
+    def read_block(self, address, size, offset=0):
+        start = BLOCK_HEADER_SIZE + address.blockNumber*address.entrySize + offset
+        with self.reading():
+            m = self.get(address.fileSelector, start+size)
+            return m[start:start+size]
+
+    def read_file(self, name):
+        with share_open(os.path.join(self.cache_dir, name), 'rb') as infile:
+            return infile.read()
+
+    def bucket_address(self, hash):
+        """Return the uint32 address at the head of hash's bucket"""
+        with self.reading():
+            index = self.get("index")
+            tableSize = struct.unpack_from('I', index, INDEX_TABLE_LEN_OFFSET)[0]
+            offset = INDEX_HEADER_SIZE + (hash & (tableSize - 1))*4
+            return struct.unpack_from('I', self.get("index", offset+4), offset)[0]
+
 class BlockfileCache(BaseChromiumCache):
     """Class to access data stream in Chrome Disk Blockfile Cache format cache files"""
 
@@ -50,41 +164,8 @@ class BlockfileCache(BaseChromiumCache):
         # Checking type
         if self.cacheBlock.type != CacheBlock.INDEX:
             raise Exception("Invalid Index File")
+        self.files = BlockFiles(self.cache_dir)
         logger.debug("Using BlockfileCache")
-        # self.scan_cache_keys()
-        # 1/0
-
-    def scan_cache_keys(self):
-        """
-        Scan index file and cache entries to save entries in this cache.
-        Saving uint32 address as key--hashing to find key later proved
-        unreliable.
-        """
-        logger.debug("scan_cache_keys")
-        with share_open(os.path.join(self.cache_dir, "index"), 'rb') as index:
-            # Skipping Header
-            index.seek(92*4)
-            self.cache_keys = set()
-            for key in range(self.cacheBlock.tableSize):
-                raw = struct.unpack('I', index.read(4))[0]
-                if raw != 0:
-                    ## 0 == unused hash index slot.  I think.
-                    cacheaddr = CacheAddress(raw, path=self.cache_dir)
-                    # logger.debug("cacheaddr? %s"%cacheaddr)
-                    entry = CacheEntry(cacheaddr)
-                    # Checking if there is a next item in the bucket because
-                    # such entries are not stored in the Index File so they will
-                    # be ignored during iterative lookup in the hash table
-                    while entry.next != 0:
-                        # logger.debug("spinning on entry linked list?")
-                        self.add_key_mapping_entry(entry)
-                        cacheaddr = CacheAddress(entry.next, path=self.cache_dir)
-                        # logger.debug("cacheaddr? %s"%cacheaddr)
-                        entry = CacheEntry(cacheaddr)
-                    self.add_key_mapping_entry(entry)
-    def add_key_mapping_entry(self,entry):
-        if '/s/14295569/' in entry.keyToStr():
-            logger.debug(entry)
 
     @staticmethod
     def is_cache_dir(cache_dir):
@@ -107,7 +188,7 @@ class BlockfileCache(BaseChromiumCache):
 
     def get_data_key_impl(self, url, key):
         entry = None
-        entrys = parse(self.cache_dir,[key])
+        entrys = self.find_entries(key)
         logger.debug(entrys)
         for entry in entrys:
             entry_name = entry.keyToStr()
@@ -127,9 +208,39 @@ class BlockfileCache(BaseChromiumCache):
                     location,
                     self.make_age(entry.creationTime),
                     ensure_text(entry.httpHeader.headers.get(b'content-encoding','')),
-                    rawdata)
+                    rawdata,
+                    ## entry's address and creation time are unique
+                    ## to this version of the entry.
+                    (self.cache_dir, entry.address.addr, entry.creationTime,
+                     len(rawdata) if rawdata else 0))
         return None
 
+    def update_index(self):
+        self.files.check_index()
+
+    def close(self):
+        self.files.close()
+
+    def find_entries(self, key):
+        """
+        Same hash-bucket lookup as chromagnon cacheParse.parse(), but
+        against the mapped files.
+        """
+        hash = SuperFastHash.superFastHash(key)
+        addr = self.files.bucket_address(hash)
+        # Checking if the address is initialized (i.e. used)
+        if addr & 0x80000000 == 0:
+            return []
+        # Follow the chained list in the bucket
+        seen = set([addr])
+        entry = CacheEntry(CacheAddress(addr, self.cache_dir, self.files))
+        while entry.hash != hash and entry.next != 0 and entry.next not in seen:
+            seen.add(entry.next)
+            entry = CacheEntry(CacheAddress(entry.next, self.cache_dir, self.files))
+        if entry.hash == hash:
+            return [entry]
+        return []
+
     def get_raw_data(self,entry):
         for i in range(len(entry.data)):
             # logger.debug("data loop i:%s"%i)
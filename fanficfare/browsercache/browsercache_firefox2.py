@@ -26,6 +26,7 @@ import hashlib
 import glob
 import datetime
 import time
+import binascii
 
 from . import BaseBrowserCache
 from ..six import ensure_text
@@ -47,21 +48,63 @@ class FirefoxCache2(BaseBrowserCache):
         ## now timezone agnostic to make py3 deprecation happy
         self.utc_offset = datetime.datetime.now() - utcnow().replace(tzinfo=None)
 
-        # self.scan_cache_keys()
-        # logger.debug("cache site:%s"%self.site)
-        # 1/0
-
-    def scan_cache_keys(self):
-        """Scan cache entries to save entries in this cache"""
-        ## scandir and checking age *before* parsing saves a ton of
-        ## hits and time.
-        logger.debug("using scandir")
-        for entry in os.scandir(os.path.join(self.cache_dir,'entries')):
-            if entry.stat().st_mtime > time.time() - 3600: # last hour only
-                with share_open(entry.path, "rb") as entry_file:
-                    metadata = _read_entry_headers(entry_file)
-                    if 'Battle_of_Antarctica_9' in metadata['key']:
-                        logger.debug("%s->%s"%(metadata['key'],metadata['key_hash']))
+        ## cache2/index, re-read when it changes.
+        self.index = None
+        self.index_stamp = None
+
+    def load_index(self):
+        """
+        (Re-)read Firefox's cache2/index file if it's changed since
+        last read.  self.index is None if there isn't one or it can't
+        be read.
+        """
+        index_path = os.path.join(self.cache_dir,'index')
+        try:
+            st = os.stat(index_path)
+        except OSError:
+            self.index = None
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self.index_stamp:
+            return
+        self.index_stamp = stamp
+        try:
+            with share_open(index_path, "rb") as index_file:
+                self.index = _read_index(index_file.read())
+            self.index['mtime'] = st.st_mtime_ns
+            logger.debug("FirefoxCache2 index: %s entries"%len(self.index['entries']))
+        except Exception as e:
+            logger.debug("FirefoxCache2 index not used: %s"%e)
+            self.index = None
+
+    def update_index(self):
+        self.load_index()
+
+    def in_index(self, hashkey, st=None):
+        """
+        False only if the index says there's no usable entry for
+        hashkey, or, given the entry file's os.stat() st, the file
+        hasn't been written since before browser_cache_age_limit--the
+        response it holds can't be any newer.  The index is only
+        written now and then, so an entry not in it may still be newer
+        than the index.
+        """
+        if st is not None and self.past_age_limit(st.st_mtime):
+            return False
+        if self.index is None:
+            return True
+        flags = self.index['entries'].get(hashkey)
+        if flags is not None:
+            return bool(flags & INDEX_INITIALIZED) and not (flags & INDEX_REMOVED)
+        ## not in index, trust that only if the index is clean (Firefox
+        ## not running), has no journal waiting and is newer than the
+        ## entries dir.
+        if self.index['dirty'] or os.path.exists(os.path.join(self.cache_dir,'index.log')):
+            return True
+        try:
+            return os.stat(os.path.join(self.cache_dir,'entries')).st_mtime_ns > self.index['mtime']
+        except OSError:
+            return True
 
     @staticmethod
     def is_cache_dir(cache_dir):
@@ -85,18 +128,27 @@ class FirefoxCache2(BaseBrowserCache):
         return [ 'O^partitionKey=%28'+scheme+'%2C'+d+'%29,:'+url for d in domains ] + \
             [ ':'+url, '~FETCH,:'+url ]
 
+    def make_key_hash(self,key):
+        return hashlib.sha1(key.encode('utf8')).hexdigest().upper()
+
     def make_key_path(self,key):
         logger.debug(key)
-        hashkey = hashlib.sha1(key.encode('utf8')).hexdigest().upper()
-        # logger.debug(hashkey)
-        fullkey = os.path.join(self.cache_dir, 'entries', hashkey)
+        fullkey = os.path.join(self.cache_dir, 'entries', self.make_key_hash(key))
         logger.debug(fullkey)
         return fullkey
 
     def get_data_key_impl(self, url, key):
+        hashkey = self.make_key_hash(key)
+        if not self.in_index(hashkey):
+            return None
         key_path = self.make_key_path(key)
         if os.path.isfile(key_path): # share_open()'s failure for non-existent is some win error.
             logger.debug("found cache: %s"%key_path)
+            st = os.stat(key_path)
+            ## not opened and read when too old anyway.
+            if not self.in_index(hashkey, st):
+                logger.debug("Cache entry found, rejected, past age limit")
+                return None
             with share_open(key_path, "rb") as entry_file:
                 metadata = _read_entry_headers(entry_file)
                 # import json
@@ -117,9 +169,43 @@ class FirefoxCache2(BaseBrowserCache):
                     time.mktime((makeDate(metadata.get('response-headers',{}).get('date', 'Wed, 31 Dec 1980 18:00:00 GMT')[5:],
                                           "%d %b %Y %H:%M:%S GMT")+self.utc_offset).timetuple()),
                     metadata.get('response-headers',{}).get('content-encoding', '').strip().lower(),
-                    rawdata)
+                    rawdata,
+                    (key_path, st.st_mtime_ns, st.st_size))
         return None
 
+## cache2/index format from Firefox's netwerk/cache2/CacheIndex.h.
+## Big endian header: version, timestamp, isDirty, kBWritten.  Then
+## one record per entry, then a 4 byte hash.
+INDEX_HEADER = struct.Struct('>IIII')
+## hash, frecency, originAttrsHash, onStartTime, onStopTime,
+## contentType, flags
+INDEX_RECORD_V10 = struct.Struct('>20sIQHHBI')
+## version 9 also has expirationTime after originAttrsHash.
+INDEX_RECORD_V9 = struct.Struct('>20sIQIHHBI')
+INDEX_INITIALIZED = 0x80000000
+INDEX_REMOVED = 0x20000000
+
+def _read_index(data):
+    """
+    Returns dict with 'dirty' and 'entries' (hash -> flags) from
+    cache2/index contents.  Raises if not a version understood.
+    """
+    (version, timestamp, dirty, kbwritten) = INDEX_HEADER.unpack_from(data)
+    if version == 0xA:
+        record = INDEX_RECORD_V10
+    elif version == 0x9:
+        record = INDEX_RECORD_V9
+    else:
+        raise BrowserCacheException("Unknown cache2 index version %s"%version)
+    records_size = len(data) - INDEX_HEADER.size - 4
+    if records_size < 0 or records_size % record.size:
+        raise BrowserCacheException("cache2 index size doesn't match version %s"%version)
+    entries = {}
+    for rec in record.iter_unpack(data[INDEX_HEADER.size:INDEX_HEADER.size+records_size]):
+        entries[binascii.hexlify(rec[0]).decode('ascii').upper()] = rec[-1]
+    return {'dirty':dirty,
+            'entries':entries}
+
 def _validate_entry_file(path):
     with share_open(path, "rb") as entry_file:
         metadata = _read_entry_headers(entry_file)
@@ -41,6 +41,8 @@ FLAG_HAS_SHA256 = 2
 ENTRY_MAGIC_NUMBER = 0xfcfb6d1ba7725c30
 EOF_MAGIC_NUMBER = 0xf4fa6f45970d41d8
 THE_REAL_INDEX_MAGIC_NUMBER = 0x656e74657220796f
+## <16 hex digit hash>_<stream file>, same as glob hashkey+'_?' before.
+ENTRY_FILE_RE = re.compile(r'^([0-9a-fA-F]{16})_.$')
 
 class SimpleCache(BaseChromiumCache):
     """Class to access data stream in Chrome Simple Cache format cache files"""
@@ -49,28 +51,55 @@ class SimpleCache(BaseChromiumCache):
         """Constructor for SimpleCache"""
         super(SimpleCache,self).__init__(*args, **kargs)
         logger.debug("Using SimpleCache")
-
-        # self.scan_cache_keys()
-        # 1/0
+        ## entry hash -> [entry file paths], from file names only.
+        self.index = {}
+        self.index_mtime = None
+        ## path -> ((mtime,size), key, response_time), read from the
+        ## file the first time it's looked at.
+        self.entry_info = {}
 
     def scan_cache_keys(self):
-        """Scan cache entries to save entries in this cache"""
-        ## scandir and checking age *before* parsing saves a ton of
-        ## hits and time.
-        logger.debug("using scandir")
+        """
+        (Re)build the entry hash -> file paths index if the cache dir
+        has changed (files added or removed) since the last scan.
+        Only the names are read here, saving a glob of a possibly huge
+        cache dir for every key tried.
+        """
+        mtime = os.stat(self.cache_dir).st_mtime_ns
+        if mtime == self.index_mtime:
+            return
+        # logger.debug("using scandir")
+        index = {}
         for entry in os.scandir(self.cache_dir):
-            if re.match(r'^[0-9a-fA-F]{16}_[0-9]+$',os.path.basename(entry.path)):
-                with share_open(entry.path, "rb") as entry_file:
-                    try:
-                        file_key = _read_entry_file(entry.path,entry_file)
-                        if '/s/14347189/1/' in file_key:
-                            (request_time, response_time, header_size) = _read_meta_headers(entry_file)
-                            logger.debug("file_key:%s"%file_key)
-                            logger.debug("request_time:  %s (%s)"%(datetime.datetime.fromtimestamp(self.make_age(request_time)),request_time))
-                            logger.debug("response_time: %s (%s)"%(datetime.datetime.fromtimestamp(self.make_age(response_time)),response_time))
-                    except Exception as e:
-                        raise e
-                        pass
+            m = ENTRY_FILE_RE.match(entry.name)
+            if m:
+                index.setdefault(m.group(1).lower(),[]).append(entry.path)
+        ## forget info for files that are gone, keep the rest.
+        paths = set( p for l in index.values() for p in l )
+        self.entry_info = dict( (p,i) for (p,i) in self.entry_info.items() if p in paths )
+        self.index = index
+        self.index_mtime = mtime
+        logger.debug("SimpleCache indexed %s entry files"%len(paths))
+
+    def update_index(self):
+        self.scan_cache_keys()
+
+    def get_entry_info(self, path):
+        """
+        Return (key, response_time) of entry file, only reading the
+        file again if it's changed.  key is None if not a valid entry.
+        """
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        info = self.entry_info.get(path)
+        if info is None or info[0] != stamp:
+            response_time = None
+            with share_open(path, "rb") as entry_file:
+                file_key = _read_entry_file(path,entry_file)
+                if file_key is not None:
+                    (request_time, response_time, header_size) = _read_meta_headers(entry_file)
+            info = self.entry_info[path] = (stamp, file_key, response_time)
+        return info[1:]
 
     @staticmethod
     def is_cache_dir(cache_dir):
@@ -103,23 +132,23 @@ class SimpleCache(BaseChromiumCache):
         raw(compressed) data
         """
         hashkey = _key_hash(key)
-        glob_pattern = os.path.join(self.cache_dir, hashkey + '_?')
-        # because hash collisions are so rare, this will usually only find zero or one file,
-        # so there is no real savings to be had by reading the index file instead of going straight to the entry files
-        # logger.debug(glob_pattern)
-
-        ## glob'ing for the collisions avoids ever trying to open
-        ## non-existent files.
-        for en_fl in glob.glob(glob_pattern):
+        # because hash collisions are so rare, this will usually only find zero or one file.
+        for en_fl in self.index.get(hashkey,[]):
             try:
                 ## --- need to check vs full key due to possible hash
                 ## --- collision--can't just do url in key
+                (file_key, response_time) = self.get_entry_info(en_fl)
+                if file_key != key:
+                    # theoretically, there can be hash collision.
+                    continue
+                logger.debug("en_fl:%s"%en_fl)
+                ## reject by age before reading headers or data.
+                ## get_data() checks again, after redirects.
+                age = self.make_age(response_time)
+                if not (self.age_limit is None or age > time.time()-self.age_limit):
+                    logger.debug("Cache entry found, rejected, past age limit")
+                    continue
                 with share_open(en_fl, "rb") as entry_file:
-                    file_key = _read_entry_file(en_fl,entry_file)
-                    if file_key != key:
-                        # theoretically, there can be hash collision.
-                        continue
-                    logger.debug("en_fl:%s"%en_fl)
                     (request_time, response_time, header_size) = _read_meta_headers(entry_file)
                     logger.debug("request_time:  %s (%s)"%(datetime.datetime.fromtimestamp(self.make_age(request_time)),request_time))
                     logger.debug("response_time: %s (%s)"%(datetime.datetime.fromtimestamp(self.make_age(response_time)),response_time))
@@ -133,8 +162,10 @@ class SimpleCache(BaseChromiumCache):
                         location,
                         self.make_age(response_time),
                         headers.get('content-encoding', '').strip().lower(),
-                        rawdata)
-            except SimpleCacheException:
+                        rawdata,
+                        (en_fl,)+self.entry_info[en_fl][0])
+            except (SimpleCacheException, OSError):
+                ## OSError when browser removed file since scan.
                 pass
         return None
 
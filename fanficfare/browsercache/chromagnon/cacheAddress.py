@@ -53,9 +53,13 @@ class CacheAddress():
                  ("1k bytes block file", 1024),
                  ("4k bytes block file", 4096)]
 
-    def __init__(self, uint_32, path):
+    def __init__(self, uint_32, path, files=None):
         """
         Parse the 32 bits of the uint_32
+
+        files, if given, is an object with read_block(address, size,
+        offset) and read_file(name) used instead of opening the files
+        under path for every read.
         """
         if uint_32 == 0:
             raise CacheAddressError("Null Address")
@@ -63,6 +67,7 @@ class CacheAddress():
         #XXX Is self.binary useful ??
         self.addr = uint_32
         self.path = path
+        self.files = files
 
         # Checking that the MSB is set
         self.binary = bin(uint_32)
@@ -42,6 +42,24 @@ from six.moves import range
 
 from ..share_open import share_open
 
+def read_block(address, size, offset=0):
+    """
+    Returns size bytes starting offset bytes into the block at address,
+    from address.files if set.
+    """
+    if address.files is not None:
+        return address.files.read_block(address, size, offset)
+    with share_open(os.path.join(address.path,address.fileSelector), 'rb') as block:
+        block.seek(8192 + address.blockNumber*address.entrySize + offset)
+        return block.read(size)
+
+def read_file(address):
+    """Returns the whole separate file at address"""
+    if address.files is not None:
+        return address.files.read_file(address.fileSelector)
+    with share_open(os.path.join(address.path,address.fileSelector), 'rb') as infile:
+        return infile.read()
+
 class CacheData():
     """
     Retrieve data at the given address
@@ -65,11 +83,7 @@ class CacheData():
         if isHTTPHeader and\
            self.address.blockType != cacheAddress.CacheAddress.SEPARATE_FILE:
             # Getting raw data
-            string = b""
-            with share_open(os.path.join(self.address.path,self.address.fileSelector), 'rb') as block:
-                block.seek(8192 + self.address.blockNumber*self.address.entrySize)
-                for _ in range(self.size):
-                    string += struct.unpack('c', block.read(1))[0]
+            string = read_block(self.address, self.size)
             # Finding the beginning of the request
             start = re.search(b"HTTP", string)
             if start == None:
@@ -106,12 +120,9 @@ class CacheData():
     def data(self):
         """Returns a string representing the data"""
         if self.address.blockType == cacheAddress.CacheAddress.SEPARATE_FILE:
-            with share_open(os.path.join(self.address.path,self.address.fileSelector), 'rb') as infile:
-                data = infile.read()
+            data = read_file(self.address)
         else:
-            with share_open(os.path.join(self.address.path,self.address.fileSelector), 'rb') as block:
-                block.seek(8192 + self.address.blockNumber*self.address.entrySize)
-                data = block.read(self.size)#.decode('utf-8',errors='ignore')
+            data = read_block(self.address, self.size)#.decode('utf-8',errors='ignore')
         return data
 
     def __str__(self):
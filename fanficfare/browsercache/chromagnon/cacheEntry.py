@@ -55,82 +55,80 @@ class CacheEntry():
              "Evicted (data were deleted)",
              "Doomed (shit happened)"]
 
+    # Fixed fields before a local key
+    HEADER_SIZE = 96
+
     def __init__(self, address):
         """
         Parse a Chrome Cache Entry at the given address
         """
         self.httpHeader = None
         self.address = address
-        with share_open(os.path.join(address.path,address.fileSelector), 'rb') as block:
-
-            # Going to the right entry
-            block.seek(8192 + address.blockNumber*address.entrySize)
-
-            # Parsing basic fields
-            self.hash = struct.unpack('I', block.read(4))[0]
-            self.next = struct.unpack('I', block.read(4))[0]
-            self.rankingNode = struct.unpack('I', block.read(4))[0]
-            self.usageCounter = struct.unpack('I', block.read(4))[0]
-            self.reuseCounter = struct.unpack('I', block.read(4))[0]
-            self.state = struct.unpack('I', block.read(4))[0]
-            ## don't need actual date, just the number for comparison
-            self.creationTime = struct.unpack('Q', block.read(8))[0]
-            # self.creationTime = datetime.datetime(1601, 1, 1) + \
-            #                     datetime.timedelta(microseconds=\
-            #                         struct.unpack('Q', block.read(8))[0])
-            self.keyLength = struct.unpack('I', block.read(4))[0]
-            self.keyAddress = struct.unpack('I', block.read(4))[0]
-
-
-            dataSize = []
-            for _ in range(4):
-                dataSize.append(struct.unpack('I', block.read(4))[0])
-
-            self.data = []
-            for index in range(4):
-                addr = struct.unpack('I', block.read(4))[0]
-                try:
-                    addr = cacheAddress.CacheAddress(addr, address.path)
-                    self.data.append(cacheData.CacheData(addr, dataSize[index],
-                                                         True))
-                except cacheAddress.CacheAddressError as e:
-                    # this happens tons? unused slots probably?
-                    # logger.debug("CacheEntry CacheAddressError:%s %s"%(address,e))
-                    pass
-
-            # Find the HTTP header if there is one
-            for data in self.data:
-                if data.type == cacheData.CacheData.HTTP_HEADER:
-                    self.httpHeader = data
-                    break
-
-            self.flags = struct.unpack('I', block.read(4))[0]
-
-            # Skipping pad
-            block.seek(5*4, 1)
-
-            # Reading local key
-            if self.keyAddress == 0:
-                self.key = block.read(self.keyLength).decode('ascii')
-            # Key stored elsewhere
-            else:
-                addr = cacheAddress.CacheAddress(self.keyAddress, address.path)
-
-                # It is probably an HTTP header
-                self.key = cacheData.CacheData(addr, self.keyLength, True)
-            # print("cacheEntry key:%s"%self.key)
-            # try:
-            #     # Some keys seem to be '_dk_http://example.com https://example.com https://www.example.com/full/url/path'
-            #     # fix those up so the actual URL will work as a hash key
-            #     # in our table if key has whitespace followed by final
-            #     # http[s]://something, substitute, otherwise this leaves
-            #     # it unchanged
-            #     self.key = re.sub(r'^.*\s(https?://\S+)$', r'\1', self.key)
-            # except TypeError:
-            #     ## Some 'keys' are not bytes or text types.  No idea why
-            #     ## not.
-            #     # print(self.key)
-            #     pass
+        # Going to the right entry, everything up to the local key
+        block = cacheData.read_block(address, CacheEntry.HEADER_SIZE)
+
+        # Parsing basic fields
+        (self.hash,
+         self.next,
+         self.rankingNode,
+         self.usageCounter,
+         self.reuseCounter,
+         self.state,
+         ## don't need actual date, just the number for comparison
+         self.creationTime,
+         # self.creationTime = datetime.datetime(1601, 1, 1) + \
+         #                     datetime.timedelta(microseconds=\
+         #                         struct.unpack('Q', block.read(8))[0])
+         self.keyLength,
+         self.keyAddress) = struct.unpack_from('IIIIIIQII', block, 0)
+
+        dataSize = struct.unpack_from('4I', block, 40)
+
+        self.data = []
+        for index, addr in enumerate(struct.unpack_from('4I', block, 56)):
+            try:
+                addr = cacheAddress.CacheAddress(addr, address.path,
+                                                 address.files)
+                self.data.append(cacheData.CacheData(addr, dataSize[index],
+                                                     True))
+            except cacheAddress.CacheAddressError as e:
+                # this happens tons? unused slots probably?
+                # logger.debug("CacheEntry CacheAddressError:%s %s"%(address,e))
+                pass
+
+        # Find the HTTP header if there is one
+        for data in self.data:
+            if data.type == cacheData.CacheData.HTTP_HEADER:
+                self.httpHeader = data
+                break
+
+        self.flags = struct.unpack_from('I', block, 72)[0]
+
+        # Skipping pad, key starts after HEADER_SIZE
+        # Reading local key
+        if self.keyAddress == 0:
+            self.key = cacheData.read_block(address, self.keyLength,
+                                            CacheEntry.HEADER_SIZE).decode('ascii')
+        # Key stored elsewhere
+        else:
+            addr = cacheAddress.CacheAddress(self.keyAddress, address.path,
+                                             address.files)
+
+            # It is probably an HTTP header
+            self.key = cacheData.CacheData(addr, self.keyLength, True)
+        # print("cacheEntry key:%s"%self.key)
+        # try:
+        #     # Some keys seem to be '_dk_http://example.com https://example.com https://www.example.com/full/url/path'
+        #     # fix those up so the actual URL will work as a hash key
+        #     # in our table if key has whitespace followed by final
+        #     # http[s]://something, substitute, otherwise this leaves
+        #     # it unchanged
+        #     self.key = re.sub(r'^.*\s(https?://\S+)$', r'\1', self.key)
+        # except TypeError:
+        #     ## Some 'keys' are not bytes or text types.  No idea why
+        #     ## not.
+        #     # print(self.key)
+        #     pass
 
     def keyToStr(self):
         """
@@ -32,6 +32,7 @@ version="4.42.13"
 os.environ['CURRENT_VERSION_ID']=version
 
 global_cache = 'global_cache'
+global_cache_db = 'global_cache.sqlite'
 global_cookies = 'global_cookies'
 
 if sys.version_info >= (2, 7):
@@ -43,7 +44,7 @@ if sys.version_info >= (2, 7):
 
 logger = logging.getLogger('fanficfare')
 
-from fanficfare import adapters, writers, exceptions
+from fanficfare import adapters, writers, exceptions, fetchers
 from fanficfare.configurable import Configuration
 from fanficfare.epubutils import (
     get_dcsource_chaptercount, get_update_data, reset_orig_chapters_epub)
@@ -160,6 +161,9 @@ def mkParser(calibre, parser=None):
     parser.add_option('-p', '--progressbar',
                       action='store_true', dest='progressbar',
                       help='Display a simple progress bar while downloading--one dot(.) per network fetch.', )
+    parser.add_option('--stats',
+                      action='store_true', dest='stats',
+                      help='Print counts, bytes, timings and cache hits for page fetches as JSON at the end of the run.', )
     parser.add_option('--color',
                       action='store_true', dest='color',
                       help='Display a errors and warnings in a contrasting color.  Requires package colorama on Windows.', )
@@ -329,6 +333,9 @@ def dispatch(options, urls,
                     if len(urls) == 1:
                         raise
                     fail("URL(%s) Failed: Exception (%s). Run URL individually for more detail."%(url,e))
+            coalesced = fetchers.request_coalescer.get_coalesced_count()
+            if coalesced:
+                logger.debug("%s requests shared an identical request already in flight"%coalesced)
 
 def main(argv=None,
          parser=None,
@@ -343,7 +350,14 @@ def main(argv=None,
     validateOptions(parser, options, args)
     warn, fail = setup(options)
     urls=args
-    dispatch(options, urls, passed_defaultsini, passed_personalini, warn, fail)
+    try:
+        dispatch(options, urls, passed_defaultsini, passed_personalini, warn, fail)
+    finally:
+        ## shared by all the downloads, see do_download().
+        if hasattr(options,'browser_cache'):
+            options.browser_cache.close()
+        if options.stats:
+            print(fetchers.fetch_metrics.to_json())
 
 # make rest a function and loop on it.
 def do_download(arg,
@@ -618,6 +632,7 @@ def get_configuration(url,
 
     if options.force:
         configuration.set('overrides', 'always_overwrite', 'true')
+        configuration.set('overrides', 'use_negative_cache', 'false')
 
     if options.update and chaptercount and output_filename:
         configuration.set('overrides', 'output_filename', output_filename)
@@ -653,13 +668,26 @@ def get_configuration(url,
 
     ## Share basic_cache between multiple downloads.
     if not hasattr(options,'basic_cache'):
-        options.basic_cache = configuration.get_basic_cache()
         if options.save_cache:
-            try:
-                options.basic_cache.load_cache(global_cache)
-            except Exception as e:
-                logger.warning("Didn't load --save-cache %s\nContinue without loading BasicCache"%e)
-            options.basic_cache.set_autosave(True,filename=global_cache)
+            ## --save-cache uses a sqlite file that's written one
+            ## page at a time instead of re-pickling the whole cache.
+            size_limit = None
+            if configuration.getConfig('basic_cache_size_limit'):
+                try:
+                    size_limit = int(float(configuration.getConfig('basic_cache_size_limit'))*1024*1024)
+                except ValueError:
+                    logger.warning("Ignoring non-number basic_cache_size_limit(%s)"%configuration.getConfig('basic_cache_size_limit'))
+            options.basic_cache = fetchers.SqliteCache(global_cache_db,
+                                                       size_limit=size_limit)
+            configuration.set_basic_cache(options.basic_cache)
+            ## one-time import of older pickled global_cache
+            if os.path.exists(global_cache):
+                try:
+                    options.basic_cache.load_cache(global_cache)
+                except Exception as e:
+                    logger.warning("Didn't import old --save-cache %s\nContinue without it"%e)
+        else:
+            options.basic_cache = configuration.get_basic_cache()
     else:
         configuration.set_basic_cache(options.basic_cache)
     # logger.debug(options.basic_cache.basic_cache.keys())
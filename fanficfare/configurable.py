@@ -211,8 +211,10 @@ def get_valid_set_options():
                'use_ssl_default_seclevelone':(None,None,boollist),
                'use_cloudscraper':(None,None,boollist),
                'use_basic_cache':(None,None,boollist),
+               'use_negative_cache':(None,None,boollist),
                'use_nsapa_proxy':(None,None,boollist),
                'use_flaresolverr_proxy':(None,None,boollist+['withimages','directimages']),
+               'html_parser':(None,None,['html5lib','lxml','html.parser']),
 
                ## currently, browser_cache_path is assumed to be
                ## shared and only ffnet uses it so far
@@ -431,6 +433,7 @@ def get_valid_keywords():
                  'generate_cover_settings',
                  'grayscale_images',
                  'image_max_size',
+                 'max_image_bytes',
                  'include_images',
                  'jpg_quality',
                  'additional_images',
@@ -487,6 +490,10 @@ def get_valid_keywords():
                  'replace_xbr_with_hr',
                  'replace_metadata',
                  'slow_down_sleep_time',
+                 'prefetch_chapters',
+                 'html_parser',
+                 'rate_limit_requests_per_second',
+                 'rate_limit_burst',
                  'sort_ships',
                  'sort_ships_splits',
                  'strip_chapter_numbers',
@@ -520,11 +527,19 @@ def get_valid_keywords():
                  'use_ssl_default_seclevelone',
                  'http_proxy',
                  'https_proxy',
+                 'connection_pool_size',
                  'use_cloudscraper',
                  'use_basic_cache',
+                 'basic_cache_age_limit',
+                 'basic_cache_size_limit',
+                 'use_negative_cache',
+                 'negative_cache_dns_ttl',
+                 'negative_cache_timeout_ttl',
+                 'negative_cache_notfound_ttl',
                  'use_browser_cache',
                  'use_browser_cache_only',
                  'open_pages_in_browser',
+                 'open_pages_in_browser_window',
                  'use_nsapa_proxy',
                  'nsapa_proxy_address',
                  'nsapa_proxy_port',
@@ -533,8 +548,10 @@ def get_valid_keywords():
                  'flaresolverr_proxy_port',
                  'flaresolverr_proxy_protocol',
                  'flaresolverr_proxy_timeout',
+                 'flaresolverr_proxy_sessions',
                  'browser_cache_path',
                  'browser_cache_age_limit',
+                 'browser_cache_memory_limit',
                  'user_agent',
                  'username',
                  'website_encodings',
@@ -1081,6 +1098,12 @@ class Configuration(ConfigParser):
             ## first called.  If ProgressBarDecorator is added before
             ## Cache, it's never called for cache hits, for example.
 
+            ## Below BrowserCache so browser cache hits never wait on
+            ## the rate limit.  Doesn't count fromcache==True.
+            ## saved for set_sleep
+            self.sleeper = fetchers.SleepDecorator()
+            self.sleeper.decorate_fetcher(self.fetcher)
+
             ## cache decorator terminates the chain when found.
             logger.debug("use_browser_cache:%s"%self.getConfig('use_browser_cache'))
             if self.getConfig('use_browser_cache'):
@@ -1097,10 +1120,13 @@ class Configuration(ConfigParser):
                     logger.warning("Failed to setup BrowserCache(%s)"%e)
                     raise
 
-            ## doesn't sleep when fromcache==True
-            ## saved for set_sleep
-            self.sleeper = fetchers.SleepDecorator()
-            self.sleeper.decorate_fetcher(self.fetcher)
+            ## identical GETs at the same time share one request.
+            ## Below BasicCache so hits never wait on it.
+            fetchers.CoalescingDecorator().decorate_fetcher(self.fetcher)
+
+            ## recently failed URLs (DNS, connect timeout, 404) fail
+            ## again without waiting.
+            fetchers.NegativeCacheDecorator().decorate_fetcher(self.fetcher)
 
             ## cache decorator terminates the chain when found.
             logger.debug("use_basic_cache:%s"%self.getConfig('use_basic_cache'))
@@ -22,6 +22,8 @@ from io import BytesIO
 
 import bs4
 
+from .souputils import parse_html, DEFAULT_SOUP_PARSER
+
 def get_dcsource(inputio):
     return get_update_data(inputio,getfilecount=False,getsoups=False)[0]
 
@@ -449,7 +451,7 @@ def _replace_navxhtml(navxhtmldom,zf,chaptertoctitle):
             # logger.debug("a href=%s label:%s"%(zf,atag.toxml()))
             continue
 
-def make_soup(data):
+def make_soup(data,parser=DEFAULT_SOUP_PARSER):
     '''
     Convenience method for getting a bs4 soup.  bs3 has been removed.
     '''
@@ -459,12 +461,11 @@ def make_soup(data):
     ## This should 'hide' and restore <noscript> tags.
     data = data.replace("noscript>","fff_hide_noscript>")
 
-    ## soup and re-soup because BS4/html5lib is more forgiving of
-    ## incorrectly nested tags that way.
+    ## html5lib gives the same soup as soup and re-soup, see
+    ## parse_html().
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        soup = bs4.BeautifulSoup(data,'html5lib')
-        soup = bs4.BeautifulSoup(unicode(soup),'html5lib')
+        soup = parse_html(data,parser)
 
     for ns in soup.find_all('fff_hide_noscript'):
         ns.name = 'noscript'
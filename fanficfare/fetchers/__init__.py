@@ -19,7 +19,18 @@ from .fetcher_requests import RequestsFetcher
 from .fetcher_cloudscraper import CloudScraperFetcher
 
 from .decorators import ( ProgressBarDecorator,
-                          SleepDecorator )
+                          SleepDecorator,
+                          HostRateLimiter,
+                          host_rate_limiter,
+                          HostBackoff,
+                          host_backoff,
+                          CoalescingDecorator,
+                          RequestCoalescer,
+                          request_coalescer )
 
 from .cache_basic import BasicCache, BasicCacheDecorator
+from .cache_sqlite import SqliteCache
+from .cache_negative import NegativeCache, NegativeCacheDecorator, negative_cache
 from .cache_browser import BrowserCacheDecorator
+from .prefetch import Prefetcher
+from .metrics import FetchMetrics, fetch_metrics
@@ -16,6 +16,10 @@
 #
 
 from __future__ import absolute_import
+import os
+import time
+import atexit
+import threading
 import logging
 logger = logging.getLogger(__name__)
 
@@ -25,12 +29,47 @@ from ..six.moves.http_cookiejar import LWPCookieJar, MozillaCookieJar
 from ..six import text_type as unicode
 from ..six import ensure_binary
 
+## response headers kept for cache revalidation.
+VALIDATOR_HEADERS = ('ETag','Last-Modified')
+
+## autosave cookie jar is written at most this often (seconds), and
+## at exit.
+COOKIE_SAVE_INTERVAL = 30
+
+def replace_file(src,dst):
+    try:
+        os.replace(src,dst)
+    except AttributeError:
+        ## py2 has no os.replace, rename fails on Windows if dst exists.
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src,dst)
+
 class FetcherResponse(object):
-    def __init__(self,content,redirecturl=None,fromcache=False,json=None):
+    def __init__(self,content,redirecturl=None,fromcache=False,json=None,
+                 headers=None,status_code=None,revalidated=False):
         self.content = content
         self.redirecturl = redirecturl
+        ## fromcache is True for any response that didn't need a full
+        ## page from the site.  revalidated is also True when the site
+        ## was asked and answered 304 Not Modified.  Decorators
+        ## *below* the cache (SleepDecorator) see that as a normal,
+        ## non-cached network response.
         self.fromcache = fromcache
+        self.revalidated = revalidated
         self.json = json
+        self.headers = headers or {}
+        self.status_code = status_code
+
+    def get_validators(self):
+        '''
+        dict of ETag/Last-Modified response headers, if any.
+        '''
+        return dict( (k,self.headers[k]) for k in VALIDATOR_HEADERS
+                     if self.headers.get(k) )
+
+    def is_not_modified(self):
+        return self.status_code == 304
 
 class Fetcher(object):
     def __init__(self,getConfig_fn,getConfigList_fn):
@@ -52,27 +91,95 @@ class Fetcher(object):
                     super(BasicCookieJar,self).__init__(*args,**kargs)
                     self.autosave = False
                     # self.filename from parent(s)
+                    ## cookies changed since last save.
+                    self.dirty = False
+                    self.last_save = 0
+                    self.save_timer = None
+                    self.save_lock = threading.Lock()
 
                 ## used by CLI --save-cache dev debugging feature
                 def set_autosave(self,autosave=False,filename=None):
+                    if autosave and not self.autosave:
+                        atexit.register(self.flush_cookiejar)
                     self.autosave = autosave
                     self.filename = filename
 
+                def set_cookie(self,cookie):
+                    ## sites resend the same cookies on most responses,
+                    ## only a new or different cookie needs saving.
+                    try:
+                        old = self._cookies[cookie.domain][cookie.path][cookie.name]
+                        same = (old.value,old.expires,old.secure) == (cookie.value,cookie.expires,cookie.secure)
+                    except KeyError:
+                        same = False
+                    super(BasicCookieJar,self).set_cookie(cookie)
+                    if not same:
+                        self.dirty = True
+
+                def clear(self,*args,**kargs):
+                    super(BasicCookieJar,self).clear(*args,**kargs)
+                    self.dirty = True
+
                 def load_cookiejar(self,filename=None):
                     self.load(self.filename or filename,
                               ignore_discard=True,
                               ignore_expires=True)
+                    self.dirty = False
 
                 def save_cookiejar(self,filename=None):
-                    self.save(filename or self.filename,
-                              ignore_discard=True,
-                              ignore_expires=True)
+                    filename = filename or self.filename
+                    ## write and rename so an interrupted save doesn't
+                    ## leave a truncated cookie file.
+                    tmpfilename = filename+'.tmp'
+                    with self.save_lock:
+                        try:
+                            ## cleared while locked so changes during
+                            ## the write are saved next time.
+                            with self._cookies_lock:
+                                self.dirty = False
+                                self.save(tmpfilename,
+                                          ignore_discard=True,
+                                          ignore_expires=True)
+                            replace_file(tmpfilename,filename)
+                        except:
+                            ## nothing saved after all.
+                            self.dirty = True
+                            raise
+                        self.last_save = time.time()
+
+                def autosave_cookiejar(self):
+                    '''
+                    Called after each request.  Saves if cookies have
+                    changed, at most every COOKIE_SAVE_INTERVAL
+                    seconds--a timer saves the rest.
+                    '''
+                    if not (self.autosave and self.filename and self.dirty):
+                        return
+                    wait = self.last_save + COOKIE_SAVE_INTERVAL - time.time()
+                    if wait <= 0:
+                        self.save_cookiejar()
+                    elif self.save_timer is None:
+                        self.save_timer = threading.Timer(wait,self.timer_save)
+                        self.save_timer.daemon = True
+                        self.save_timer.start()
+
+                def timer_save(self):
+                    self.save_timer = None
+                    self.flush_cookiejar()
+
+                def flush_cookiejar(self):
+                    if self.autosave and self.filename and self.dirty:
+                        try:
+                            self.save_cookiejar()
+                        except Exception as e:
+                            logger.warning("Failed to save cookiejar(%s): %s"%(self.filename,e))
 
 
             self.cookiejar = BasicCookieJar(filename=filename)
             if filename:
                 try:
                     self.cookiejar.load(ignore_discard=True, ignore_expires=True)
+                    self.cookiejar.dirty = False
                 except:
                     logger.debug("Failed to load cookiejar(%s), going on without."%filename)
         return self.cookiejar
@@ -99,16 +206,24 @@ class Fetcher(object):
     def do_request(self, method, url,
                     parameters=None,
                     referer=None,
-                    usecache=True):
+                    usecache=True,
+                    validators=None,
+                    image=False):
         # logger.debug("fetcher do_request")
         # logger.debug(self.get_cookiejar())
         headers = self.make_headers(url,referer=referer)
+        ## validators from a stale cache entry--site can answer 304
+        if validators:
+            if validators.get('ETag'):
+                headers['If-None-Match'] = validators['ETag']
+            if validators.get('Last-Modified'):
+                headers['If-Modified-Since'] = validators['Last-Modified']
         fetchresp = self.request(method,url,
                                  headers=headers,
-                                 parameters=parameters)
+                                 parameters=parameters,
+                                 image=image)
         data = fetchresp.content
-        if self.get_cookiejar().autosave and self.get_cookiejar().filename:
-            self.get_cookiejar().save_cookiejar()
+        self.get_cookiejar().autosave_cookiejar()
         return fetchresp
 
     def condition_url(self, url):
@@ -129,10 +244,12 @@ class Fetcher(object):
 
     def get_request_redirected(self, url,
                                referer=None,
-                               usecache=True):
+                               usecache=True,
+                               image=False):
         fetchresp = self.do_request('GET',
                                      self.condition_url(url),
                                      referer=referer,
-                                     usecache=usecache)
+                                     usecache=usecache,
+                                     image=image)
         return (fetchresp.content,fetchresp.redirecturl)
 
@@ -17,6 +17,7 @@
 
 from __future__ import absolute_import
 import sys
+import time
 import threading
 import logging
 logger = logging.getLogger(__name__)
@@ -27,6 +28,7 @@ from ..six import ensure_text
 from .base_fetcher import FetcherResponse
 from .decorators import FetcherDecorator
 from .log import make_log
+from .metrics import fetch_metrics
 
 import pickle
 if sys.version_info < (2, 7):
@@ -76,7 +78,9 @@ class BasicCache(object):
                 keylist.append('&'.join('{0}={1}'.format(key, val) for key, val in sorted(parameters.items())))
             return unicode('?'.join(keylist))
 
-    def has_cachekey(self,cachekey):
+    ## age_limit(seconds) is only used by persistent caches,
+    ## in-memory BasicCache only lasts for the session anyway.
+    def has_cachekey(self,cachekey,age_limit=None):
         with self.cache_lock:
             return cachekey in self.basic_cache
 
@@ -84,7 +88,16 @@ class BasicCache(object):
         with self.cache_lock:
             return self.basic_cache.get(cachekey,None)
 
-    def set_to_cache(self,cachekey,data,redirectedurl):
+    ## Revalidation (ETag/Last-Modified) is only used by persistent
+    ## caches with basic_cache_age_limit, in-memory entries never go
+    ## stale.
+    def get_validators(self,cachekey):
+        return None
+
+    def touch_cachekey(self,cachekey):
+        pass
+
+    def set_to_cache(self,cachekey,data,redirectedurl,validators=None):
         with self.cache_lock:
             self.basic_cache[cachekey] = (data,ensure_text(redirectedurl))
             # logger.debug("set_to_cache %s->%s"%(cachekey,ensure_text(redirectedurl)))
@@ -96,6 +109,20 @@ class BasicCacheDecorator(FetcherDecorator):
         super(BasicCacheDecorator,self).__init__()
         self.cache = cache
 
+    def get_age_limit(self,fetcher):
+        '''
+        basic_cache_age_limit in hours -> seconds, None for no limit.
+        Per site in INI like other settings.
+        '''
+        try:
+            age_limit = float(fetcher.getConfig('basic_cache_age_limit') or -1)
+        except ValueError:
+            logger.warning("Ignoring non-number basic_cache_age_limit(%s)"%fetcher.getConfig('basic_cache_age_limit'))
+            return None
+        if age_limit < 0:
+            return None
+        return age_limit*3600
+
     def fetcher_do_request(self,
                            fetcher,
                            chainfn,
@@ -103,20 +130,36 @@ class BasicCacheDecorator(FetcherDecorator):
                            url,
                            parameters=None,
                            referer=None,
-                           usecache=True):
+                           usecache=True,
+                           validators=None,
+                           image=False):
         '''
         When should cache be cleared or not used? logins, primarily
         Note that usecache=False prevents lookup, but cache still saves
         result
         '''
         # logger.debug("BasicCacheDecorator fetcher_do_request")
+        start = time.time()
         cachekey=self.cache.make_cachekey(url, parameters)
 
-        hit = usecache and self.cache.has_cachekey(cachekey) and not cachekey.startswith('file:')
-        logger.debug(make_log('BasicCache',method,url,hit=hit))
+        cached = None
+        if usecache and not cachekey.startswith('file:'):
+            if self.cache.has_cachekey(cachekey,self.get_age_limit(fetcher)):
+                ## can be gone already if cache is shared with another
+                ## process.
+                cached = self.cache.get_from_cache(cachekey)
+            elif method == 'GET' and not validators:
+                ## stale (or missing) entry--if the site gave
+                ## ETag/Last-Modified, ask it if the page changed
+                ## instead of always fetching the whole page.
+                validators = self.cache.get_validators(cachekey)
+        hit = cached is not None
+        logger.debug(make_log('BasicCache',method,url,hit='REVALIDATE' if validators and not hit else hit))
         if hit:
-            data,redirecturl = self.cache.get_from_cache(cachekey)
+            data,redirecturl = cached
             # logger.debug("from_cache %s->%s"%(cachekey,redirecturl))
+            fetch_metrics.record('BasicCache',url,hit=True,nbytes=len(data),
+                                 latency=time.time()-start)
             return FetcherResponse(data,redirecturl=redirecturl,fromcache=True)
 
         fetchresp = chainfn(
@@ -124,7 +167,31 @@ class BasicCacheDecorator(FetcherDecorator):
             url,
             parameters=parameters,
             referer=referer,
-            usecache=usecache)
+            usecache=usecache,
+            validators=validators,
+            image=image)
+
+        if validators and fetchresp.is_not_modified():
+            cached = self.cache.get_from_cache(cachekey)
+            if cached is not None:
+                logger.debug(make_log('BasicCache',method,url,hit='NOT MODIFIED'))
+                self.cache.touch_cachekey(cachekey)
+                data,redirecturl = cached
+                fetch_metrics.record('BasicCache',url,hit=True,nbytes=len(data),
+                                     latency=time.time()-start)
+                ## network was used, but the page is from cache.
+                return FetcherResponse(data,redirecturl=redirecturl,
+                                       fromcache=True,revalidated=True,
+                                       headers=fetchresp.headers,
+                                       status_code=fetchresp.status_code)
+            ## gone between asking and answer, ask again without.
+            fetchresp = chainfn(
+                method,
+                url,
+                parameters=parameters,
+                referer=referer,
+                usecache=usecache,
+                image=image)
 
         data = fetchresp.content
 
@@ -133,6 +200,9 @@ class BasicCacheDecorator(FetcherDecorator):
         ## saved-cache and wondering why file changes aren't showing
         ## up.
         if not fetchresp.fromcache:
-            self.cache.set_to_cache(cachekey,data,fetchresp.redirecturl)
+            self.cache.set_to_cache(cachekey,data,fetchresp.redirecturl,
+                                    validators=fetchresp.get_validators())
+        fetch_metrics.record('BasicCache',url,hit=False,
+                             latency=time.time()-start)
         return fetchresp
 
@@ -29,6 +29,7 @@ from .. import exceptions
 from .base_fetcher import FetcherResponse
 from .decorators import FetcherDecorator
 from .log import make_log
+from .metrics import fetch_metrics
 
 try: # just a way to switch between CLI and PI
     ## webbrowser.open doesn't work on some linux flavors.
@@ -54,11 +55,18 @@ class BrowserCacheDecorator(FetcherDecorator):
                            url,
                            parameters=None,
                            referer=None,
-                           usecache=True):
+                           usecache=True,
+                           validators=None,
+                           image=False):
+        if( self.get_window(fetcher) > 1 and
+            fetcher.getConfig("use_browser_cache_only") and
+            fetcher.getConfig("open_pages_in_browser",False) ):
+            return self.window_do_request(fetcher,method,url)
         with self.cache_lock:
             # logger.debug("BrowserCacheDecorator fetcher_do_request")
             fromcache=True
             # if usecache: # Ignore usecache flag--it's for BasicCache.
+            start = time.time()
             try:
                 d = self.cache.get_data(url)
                 parsedUrl = urlparse(url)
@@ -68,7 +76,7 @@ class BrowserCacheDecorator(FetcherDecorator):
                 while( fetcher.getConfig("use_browser_cache_only") and
                        fetcher.getConfig("open_pages_in_browser",False) and
                        not d and open_tries
-                       and domain_open_tries.get(parsedUrl.netloc,0) < fetcher.getConfig("open_pages_in_browser_tries_limit",6) ):
+                       and domain_open_tries.get(parsedUrl.netloc,0) < int(fetcher.getConfig("open_pages_in_browser_tries_limit",6)) ):
                     logger.debug("\n\nopen page in browser: %s\ntries:%s\n"%(url,domain_open_tries.get(parsedUrl.netloc,None)))
                     open_url(url)
                     # logger.debug("domain_open_tries:%s:"%domain_open_tries)
@@ -97,28 +105,131 @@ class BrowserCacheDecorator(FetcherDecorator):
                 logger.debug(traceback.format_exc())
                 raise exceptions.BrowserCacheException("Browser Cache Failed to Load with error '%s'"%e)
 
-            # had a d = b'' which showed HIT, but failed.
-            logger.debug(make_log('BrowserCache',method,url,True if d else False))
+            self.record_result(method,url,d,start)
             # logger.debug(d)
             if d:
-                domain_open_tries[parsedUrl.netloc] = 0
-                logger.debug("domain_open_tries:%s:"%domain_open_tries)
                 logger.debug("fromcache:%s"%fromcache)
                 return FetcherResponse(d,redirecturl=url,fromcache=fromcache)
 
             if fetcher.getConfig("use_browser_cache_only"):
-                raise exceptions.HTTPErrorFFF(
-                    url,
-                    428, # 404 & 410 trip StoryDoesNotExist
-                         # 428 ('Precondition Required') gets the
-                         # error_msg through to the user.
-                    "Page not found or expired in Browser Cache (see FFF setting browser_cache_age_limit)",# error_msg
-                    None # data
-                    )
+                raise self.not_found_error(url)
             return chainfn(
                 method,
                 url,
                 parameters=parameters,
                 referer=referer,
-                usecache=usecache)
+                usecache=usecache,
+                validators=validators,
+                image=image)
 
+    def record_result(self,method,url,d,start):
+        # had a d = b'' which showed HIT, but failed.
+        logger.debug(make_log('BrowserCache',method,url,True if d else False))
+        ## latency includes any open_pages_in_browser waiting.
+        fetch_metrics.record('BrowserCache',url,hit=bool(d),
+                             nbytes=len(d) if d else None,
+                             latency=time.time()-start)
+        if d:
+            domain_open_tries[urlparse(url).netloc] = 0
+            logger.debug("domain_open_tries:%s:"%domain_open_tries)
+
+    def not_found_error(self,url):
+        return exceptions.HTTPErrorFFF(
+            url,
+            428, # 404 & 410 trip StoryDoesNotExist
+                 # 428 ('Precondition Required') gets the
+                 # error_msg through to the user.
+            "Page not found or expired in Browser Cache (see FFF setting browser_cache_age_limit)",# error_msg
+            None # data
+            )
+
+    def get_window(self,fetcher):
+        try:
+            return int(fetcher.getConfig("open_pages_in_browser_window",1))
+        except ValueError:
+            logger.warning("Ignoring non-int open_pages_in_browser_window(%s)"%fetcher.getConfig("open_pages_in_browser_window"))
+            return 1
+
+    def open_urls(self,fetcher,urls):
+        """
+        Open those of urls whose domain is still under
+        open_pages_in_browser_tries_limit, counting each one.  Returns
+        the urls opened.
+        """
+        limit = int(fetcher.getConfig("open_pages_in_browser_tries_limit",6))
+        opened = []
+        with self.cache_lock:
+            for url in urls:
+                netloc = urlparse(url).netloc
+                if domain_open_tries.get(netloc,0) >= limit:
+                    continue
+                logger.debug("\n\nopen page in browser: %s\ntries:%s\n"%(url,domain_open_tries.get(netloc,None)))
+                open_url(url)
+                domain_open_tries[netloc] = domain_open_tries.get(netloc,0) + 1
+                opened.append(url)
+        return opened
+
+    def window_do_request(self,fetcher,method,url):
+        """
+        open_pages_in_browser_window:N mode.  On a miss, url and up to
+        N-1 more of the chapters BrowserCache.preload() didn't find are
+        opened in the browser together, then all of them are checked
+        with one get_data_many() (one cache index refresh) per poll,
+        until url is found.  Pages found for the other urls by then are
+        kept for when they're requested.
+
+        Sleeping between polls is done without holding cache_lock, so
+        other threads can still read the cache meanwhile.
+        """
+        start = time.time()
+        fromcache = True
+        try:
+            d = self.cache.get_data(url)
+            open_tries = 2
+            if not d:
+                batch = [url] + self.cache.take_missing(self.get_window(fetcher)-1,exclude=url)
+            while not d and open_tries:
+                opened = self.open_urls(fetcher,batch)
+                if not opened:
+                    break
+                fromcache = False
+                read_try_sleeps = [2, 2, 4, 10, 20]
+                while opened and read_try_sleeps:
+                    time.sleep(read_try_sleeps.pop(0))
+                    logger.debug("Checking for cache... (%s pages)"%len(opened))
+                    try:
+                        found = self.cache.get_data_many(opened)
+                    except Exception as e:
+                        ## catch exception while retrying, but
+                        ## re-raise if out of retries.
+                        logger.debug("Exception reading cache after open_pages_in_browser %s"%e)
+                        if not read_try_sleeps:
+                            raise
+                        continue
+                    for (u,data) in found.items():
+                        if not data:
+                            continue
+                        if u == url:
+                            d = data
+                        else:
+                            self.cache.add_preloaded(u,data)
+                        with self.cache_lock:
+                            domain_open_tries[urlparse(u).netloc] = 0
+                    ## done as soon as url is found, others not in
+                    ## yet are looked up again when requested.
+                    if d:
+                        break
+                    opened = [ u for u in opened if not found.get(u) ]
+                ## only url itself is opened again.
+                batch = [url]
+                open_tries -= 1
+        except Exception as e:
+            logger.debug(traceback.format_exc())
+            raise exceptions.BrowserCacheException("Browser Cache Failed to Load with error '%s'"%e)
+
+        with self.cache_lock:
+            self.record_result(method,url,d,start)
+        if d:
+            logger.debug("fromcache:%s"%fromcache)
+            return FetcherResponse(d,redirecturl=url,fromcache=fromcache)
+        raise self.not_found_error(url)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+import time
+import socket
+import threading
+from functools import partial
+import logging
+logger = logging.getLogger(__name__)
+
+from ..six.moves.urllib.parse import urlparse
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout as RequestsConnectTimeout
+
+from .. import exceptions
+from .decorators import FetcherDecorator
+from .log import make_log
+from .metrics import fetch_metrics
+
+## failure class -> (setting, default TTL seconds)
+FAILURE_TTLS = {
+    'dns':('negative_cache_dns_ttl',300),
+    'timeout':('negative_cache_timeout_ttl',300),
+    'notfound':('negative_cache_notfound_ttl',1800),
+    }
+
+DNS_ERROR_STRINGS = ('Name or service not known',
+                     'getaddrinfo failed',
+                     'nodename nor servname',
+                     'Temporary failure in name resolution',
+                     'No address associated with hostname')
+
+def failure_class(e):
+    '''
+    Returns the FAILURE_TTLS key for exception e, or None if it's not
+    a failure worth remembering.
+    '''
+    if isinstance(e, exceptions.HTTPErrorFFF):
+        if e.status_code in (404, 410):
+            return 'notfound'
+        return None
+    if isinstance(e, RequestsConnectTimeout):
+        return 'timeout'
+    if isinstance(e, RequestsConnectionError):
+        ## requests->urllib3 MaxRetryError->reason.  urllib3 2 has
+        ## NameResolutionError, 1.26 only the message.
+        reason = getattr(e.args[0],'reason',None) if e.args else None
+        if( isinstance(reason, socket.gaierror) or
+            type(reason).__name__ == 'NameResolutionError' or
+            any( s in str(e) for s in DNS_ERROR_STRINGS ) ):
+            return 'dns'
+    return None
+
+def failure_args(e):
+    '''
+    Returns args to make a new exception like e with.  The message,
+    and status and page for HTTPErrorFFF, are kept, not the
+    traceback.  Adapters read the page of a 404 to check for login
+    or adult prompts.
+    '''
+    if isinstance(e, exceptions.HTTPErrorFFF):
+        return (e.url, e.status_code, e.error_msg, e.data)
+    return (str(e),)
+
+class NegativeCache(object):
+    '''
+    Requests that recently failed in ways unlikely to change
+    soon--DNS failure, connect timeout or 404/410--with the exception
+    class and message.  Kept for the whole process so a dead image
+    host is only waited on once per batch instead of once per image.
+
+    Keyed like RequestCoalescer, by cookiejar, url and parameters, so
+    a failure for one login isn't given to another.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (expires, failure class, exception class, args)
+        self.failures = {}
+        # failure class -> number of requests not made
+        self.hits = {}
+
+    def get_failure(self,key):
+        '''
+        Returns (failure class, new exception) or None.
+        '''
+        with self.lock:
+            entry = self.failures.get(key)
+            if entry is None:
+                return None
+            (expires,fclass,exc_class,args) = entry
+            if expires < time.time():
+                del self.failures[key]
+                return None
+            self.hits[fclass] = self.hits.get(fclass,0) + 1
+        return (fclass,exc_class(*args))
+
+    def set_failure(self,key,fclass,exc,ttl):
+        with self.lock:
+            self.failures[key] = (time.time()+ttl,fclass,type(exc),failure_args(exc))
+
+    def discard(self,key):
+        with self.lock:
+            self.failures.pop(key,None)
+
+    def clear(self):
+        with self.lock:
+            self.failures = {}
+
+    def get_hits(self):
+        with self.lock:
+            return dict(self.hits)
+
+## shared by all fetchers in the process, like host_rate_limiter.
+negative_cache = NegativeCache()
+
+class NegativeCacheDecorator(FetcherDecorator):
+    '''
+    Re-raises a remembered failure instead of fetching again.  GETs
+    only, not when usecache=False, and not at all when
+    use_negative_cache:false (CLI --force, plugin Overwrite Always
+    and Update Always).  usecache=False (adapters re-fetching after
+    login, for example) and any successful fetch forget the failure.
+    '''
+    def __init__(self,cache=None):
+        super(NegativeCacheDecorator,self).__init__()
+        self.cache = cache or negative_cache
+
+    def get_ttl(self,fetcher,fclass):
+        (setting,default) = FAILURE_TTLS[fclass]
+        try:
+            return float(fetcher.getConfig(setting,default))
+        except ValueError:
+            logger.warning("Ignoring non-number %s(%s)"%(setting,fetcher.getConfig(setting)))
+            return default
+
+    def make_key(self,fetcher,url,parameters=None):
+        ## same as CoalescingDecorator.make_key()
+        jar = fetcher.cookiejar if fetcher.cookiejar is not None else fetcher
+        return (id(jar),
+                url,
+                tuple(sorted(parameters.items())) if parameters else None)
+
+    def fetcher_do_request(self,
+                           fetcher,
+                           chainfn,
+                           method,
+                           url,
+                           parameters=None,
+                           referer=None,
+                           usecache=True,
+                           validators=None,
+                           image=False):
+        fn = partial(chainfn,
+                     method,
+                     url,
+                     parameters=parameters,
+                     referer=referer,
+                     usecache=usecache,
+                     validators=validators,
+                     image=image)
+        if method != 'GET' or url.startswith('file:'):
+            return fn()
+        key = self.make_key(fetcher,url,parameters)
+        use = fetcher.getConfig('use_negative_cache',True)
+        if not usecache:
+            ## cookies may have changed (login) without the cookiejar
+            ## changing, don't leave the old failure for later fetches.
+            self.cache.discard(key)
+        elif use:
+            failure = self.cache.get_failure(key)
+            fetch_metrics.record('NegativeCache',url,hit=failure is not None)
+            if failure:
+                (fclass,exc) = failure
+                logger.debug(make_log('NegativeCache',method,url,hit='HIT(%s)'%fclass))
+                raise exc
+        try:
+            fetchresp = fn()
+        except Exception as e:
+            fclass = failure_class(e) if use else None
+            if fclass:
+                ttl = self.get_ttl(fetcher,fclass)
+                if ttl > 0:
+                    logger.debug("NegativeCache remember %s for %ss: %s"%(fclass,ttl,urlparse(url).netloc))
+                    self.cache.set_failure(key,fclass,e,ttl)
+            raise
+        self.cache.discard(key)
+        return fetchresp
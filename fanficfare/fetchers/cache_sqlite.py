@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+import os
+import time
+import pickle
+import sqlite3
+import logging
+logger = logging.getLogger(__name__)
+
+from ..six import ensure_text, ensure_binary
+
+from .cache_basic import BasicCache, pickle_load
+
+## evict() removes down to this fraction of size_limit so it isn't
+## needed again on the very next insert.
+EVICT_TO = 0.9
+## rows read per eviction query.
+EVICT_BATCH = 100
+
+class SqliteCache(BasicCache):
+    '''
+    Disk backed drop-in for BasicCache.  Each set_to_cache() writes
+    only the one new entry, so unlike BasicCache with autosave, cost
+    doesn't grow with the number of pages already saved.
+
+    Entries older than the age_limit passed to has_cachekey() are
+    ignored (and later replaced).  If size_limit (bytes) is set, least
+    recently used entries are removed to keep the total below it.
+    The total is kept as entries are written and only re-summed from
+    the file (which other processes may also write) when it's over.
+
+    SQLite's own file locking makes it safe for more than one CLI
+    process to share the same file.
+    '''
+    def __init__(self,filename,size_limit=None):
+        super(SqliteCache,self).__init__()
+        self.filename = filename
+        self.size_limit = size_limit
+        ## running total of entry sizes, None until first summed.
+        self.total = None
+        self.conn = sqlite3.connect(filename,
+                                    timeout=30,
+                                    check_same_thread=False,
+                                    isolation_level=None) # autocommit
+        with self.cache_lock:
+            try:
+                ## WAL lets readers in other processes work while
+                ## another writes.  Not available everywhere (network
+                ## drives), default journal still works, just slower.
+                self.conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.Error as e:
+                logger.debug("SqliteCache WAL not available: %s"%e)
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS basic_cache (
+                                 cachekey TEXT PRIMARY KEY,
+                                 data BLOB,
+                                 redirecturl TEXT,
+                                 size INTEGER,
+                                 created REAL,
+                                 last_access REAL,
+                                 etag TEXT,
+                                 last_modified TEXT)''')
+            ## files from before revalidation was added.
+            columns = [ r[1] for r in self.conn.execute('PRAGMA table_info(basic_cache)') ]
+            for col in ('etag','last_modified'):
+                if col not in columns:
+                    self.conn.execute('ALTER TABLE basic_cache ADD COLUMN %s TEXT'%col)
+            ## covering index so LRU eviction and SUM(size) don't
+            ## need to read the data pages.
+            self.conn.execute('''CREATE INDEX IF NOT EXISTS basic_cache_lru
+                                 ON basic_cache (last_access, size)''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS imported (
+                                 filename TEXT PRIMARY KEY,
+                                 mtime REAL)''')
+
+    ## Always saved, nothing for autosave to do.
+    def set_autosave(self,autosave=False,filename=None):
+        pass
+
+    def load_cache(self,filename=None):
+        '''
+        One-time import of a pickled BasicCache file (CLI
+        global_cache or plugin basic_cache).  The file name and mtime
+        are remembered so the same file isn't imported twice.
+        '''
+        mtime = os.path.getmtime(filename)
+        with self.cache_lock:
+            row = self.conn.execute('SELECT mtime FROM imported WHERE filename=?',
+                                    (filename,)).fetchone()
+            if row and row[0] == mtime:
+                logger.debug("SqliteCache already imported %s"%filename)
+                return
+            with open(filename,'rb') as jin:
+                pickled = pickle_load(jin)
+            now = time.time()
+            with self.conn:
+                self.conn.execute('BEGIN')
+                for cachekey, (data,redirecturl) in pickled.items():
+                    self._insert(ensure_text(cachekey),data,redirecturl,created=mtime,now=now)
+                self.conn.execute('INSERT OR REPLACE INTO imported VALUES (?,?)',
+                                  (filename,mtime))
+            logger.debug("SqliteCache imported %s entries from %s"%(len(pickled),filename))
+            self.evict()
+
+    def save_cache(self,filename=None):
+        '''
+        Writes a pickled BasicCache compatible file, for handing to
+        code that expects one.  The sqlite file itself is always up to
+        date.
+        '''
+        with self.cache_lock, open(filename,'wb') as jout:
+            rows = self.conn.execute('SELECT cachekey, data, redirecturl FROM basic_cache')
+            pickle.dump(dict( (k,(d,r)) for (k,d,r) in rows ),jout,protocol=2)
+
+    def has_cachekey(self,cachekey,age_limit=None):
+        with self.cache_lock:
+            if age_limit is None:
+                row = self.conn.execute('SELECT 1 FROM basic_cache WHERE cachekey=?',
+                                        (cachekey,)).fetchone()
+            else:
+                row = self.conn.execute('SELECT 1 FROM basic_cache WHERE cachekey=? AND created>=?',
+                                        (cachekey,time.time()-age_limit)).fetchone()
+            return row is not None
+
+    def get_from_cache(self,cachekey):
+        with self.cache_lock:
+            row = self.conn.execute('SELECT data, redirecturl FROM basic_cache WHERE cachekey=?',
+                                    (cachekey,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE basic_cache SET last_access=? WHERE cachekey=?',
+                              (time.time(),cachekey))
+            return (row[0],row[1])
+
+    def get_validators(self,cachekey):
+        with self.cache_lock:
+            row = self.conn.execute('SELECT etag, last_modified FROM basic_cache WHERE cachekey=?',
+                                    (cachekey,)).fetchone()
+        if not row or not (row[0] or row[1]):
+            return None
+        validators = {}
+        if row[0]:
+            validators['ETag'] = row[0]
+        if row[1]:
+            validators['Last-Modified'] = row[1]
+        return validators
+
+    def touch_cachekey(self,cachekey):
+        '''
+        Site says entry hasn't changed, make it fresh again.
+        '''
+        with self.cache_lock:
+            now = time.time()
+            self.conn.execute('UPDATE basic_cache SET created=?, last_access=? WHERE cachekey=?',
+                              (now,now,cachekey))
+
+    def _insert(self,cachekey,data,redirecturl,created=None,now=None,validators=None):
+        now = now or time.time()
+        data = ensure_binary(data)
+        redirecturl = ensure_text(redirecturl) if redirecturl else redirecturl
+        validators = validators or {}
+        size = len(data)+len(redirecturl or '')
+        if self.total is not None:
+            row = self.conn.execute('SELECT size FROM basic_cache WHERE cachekey=?',
+                                    (cachekey,)).fetchone()
+            self.total += size - (row[0] if row else 0)
+        self.conn.execute('''INSERT OR REPLACE INTO basic_cache
+                             (cachekey, data, redirecturl, size, created, last_access, etag, last_modified)
+                             VALUES (?,?,?,?,?,?,?,?)''',
+                          (cachekey,
+                           sqlite3.Binary(data),
+                           redirecturl,
+                           size,
+                           created or now,
+                           now,
+                           validators.get('ETag'),
+                           validators.get('Last-Modified')))
+
+    def set_to_cache(self,cachekey,data,redirectedurl,validators=None):
+        with self.cache_lock:
+            self._insert(cachekey,data,redirectedurl,validators=validators)
+            # logger.debug("set_to_cache %s->%s"%(cachekey,ensure_text(redirectedurl)))
+        self.evict()
+
+    def total_size(self):
+        with self.cache_lock:
+            return self.conn.execute('SELECT COALESCE(SUM(size),0) FROM basic_cache').fetchone()[0]
+
+    def evict(self):
+        '''
+        Remove least recently used entries until under size_limit,
+        EVICT_BATCH at a time.
+        '''
+        if not self.size_limit:
+            return
+        with self.cache_lock:
+            if self.total is not None and self.total <= self.size_limit:
+                return
+            ## other processes sharing the file change it too.
+            self.total = self.total_size()
+            if self.total <= self.size_limit:
+                return
+            target = self.size_limit * EVICT_TO
+            removed = 0
+            with self.conn:
+                self.conn.execute('BEGIN IMMEDIATE')
+                while self.total > target:
+                    rows = self.conn.execute('SELECT rowid, size FROM basic_cache ORDER BY last_access LIMIT ?',
+                                             (EVICT_BATCH,)).fetchall()
+                    if not rows:
+                        break
+                    for (rowid,size) in rows:
+                        if self.total <= target:
+                            break
+                        self.conn.execute('DELETE FROM basic_cache WHERE rowid=?',(rowid,))
+                        self.total -= size
+                        removed += 1
+            logger.debug("SqliteCache evicted %s entries, now %s bytes"%(removed,self.total))
+
+    def __del__(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
@@ -19,9 +19,13 @@ from __future__ import absolute_import
 import sys
 import random
 import time
+import threading
 from functools import partial
 
+from ..six.moves.urllib.parse import urlparse
+
 from .log import make_log
+from .metrics import fetch_metrics
 
 import logging
 logger = logging.getLogger(__name__)
@@ -44,14 +48,18 @@ class FetcherDecorator(object):
                            url,
                            parameters=None,
                            referer=None,
-                           usecache=True):
+                           usecache=True,
+                           validators=None,
+                           image=False):
         ## can use fetcher.getConfig()/getConfigList().
         fetchresp = chainfn(
             method,
             url,
             parameters=parameters,
             referer=referer,
-            usecache=usecache)
+            usecache=usecache,
+            validators=validators,
+            image=image)
 
         return fetchresp
 
@@ -63,24 +71,169 @@ class ProgressBarDecorator(FetcherDecorator):
                            url,
                            parameters=None,
                            referer=None,
-                           usecache=True):
+                           usecache=True,
+                           validators=None,
+                           image=False):
         # logger.debug("ProgressBarDecorator fetcher_do_request")
         fetchresp = chainfn(
             method,
             url,
             parameters=parameters,
             referer=referer,
-            usecache=usecache)
+            usecache=usecache,
+            validators=validators,
+            image=image)
         ## added ages ago for CLI to give a line of dots showing it's
         ## doing something.
         sys.stdout.write('.')
         sys.stdout.flush()
         return fetchresp
 
-class SleepDecorator(FetcherDecorator):
+class HostRateLimiter(object):
+    '''
+    Process wide request scheduler keyed by host (netloc).  Works as
+    a token bucket: each host may have up to 'burst' requests back to
+    back, after which requests are spaced 'interval' seconds apart
+    (randomized 0.5-1.5x, same as the old post-request sleep).
+
+    Rather than sleeping *after* a response, the send time for the
+    next request is reserved before it's made.  The calling thread is
+    free to parse the previous page in the meantime and several
+    Configurations/fetchers hitting the same host share one schedule.
+    '''
     def __init__(self):
+        self.lock = threading.Lock()
+        # netloc -> 'theoretical arrival time' of the next request
+        # after the burst allowance is used up.
+        self.next_send = {}
+        # netloc -> dict(requests=,throttled=,refunded=)
+        self.stats = {}
+
+    def _host_stats(self,host):
+        if host not in self.stats:
+            self.stats[host] = {'requests':0,
+                                'throttled_requests':0,
+                                'throttled_time':0.0}
+        return self.stats[host]
+
+    def reserve(self,host,interval,burst=1):
+        '''
+        Reserve a send slot for host.  Returns (wait,step): the
+        seconds caller should wait before sending and the step
+        reserved, to be passed back to refund() if no request to the
+        site was made after all.
+        '''
+        burst = max(1,int(burst))
+        step = random.uniform(interval*0.5, interval*1.5)
+        with self.lock:
+            now = time.time()
+            tat = max(self.next_send.get(host,now),now)
+            ## allowed to be up to (burst-1) intervals ahead.
+            send_at = max(now, tat - (burst-1)*interval)
+            self.next_send[host] = tat + step
+            wait = send_at - now
+            st = self._host_stats(host)
+            st['requests'] += 1
+            if wait > 0:
+                st['throttled_requests'] += 1
+                st['throttled_time'] += wait
+        return (wait,step)
+
+    def refund(self,host,step):
+        with self.lock:
+            if host in self.next_send:
+                self.next_send[host] -= step
+
+    def get_stats(self):
+        with self.lock:
+            return dict( (k,dict(v)) for k,v in self.stats.items() )
+
+    def get_throttled_time(self,host=None):
+        with self.lock:
+            if host:
+                return self.stats.get(host,{}).get('throttled_time',0.0)
+            return sum( v['throttled_time'] for v in self.stats.values() )
+
+    def defer(self,host,seconds):
+        '''
+        No request to host for at least seconds from now.
+        '''
+        with self.lock:
+            now = time.time()
+            self.next_send[host] = max(self.next_send.get(host,now),now+seconds)
+
+## kept here, shared by all fetchers in the process, like
+## domain_open_tries in cache_browser.
+host_rate_limiter = HostRateLimiter()
+
+## site telling us to slow down.
+THROTTLE_STATUS_CODES = frozenset((429, 503))
+
+class HostBackoff(object):
+    '''
+    Process wide extra delay per host after the site throttles us
+    (429/503).  Each throttle doubles the host's delay (starting at
+    'initial', at least the Retry-After given, at most 'maximum') and
+    holds all requests to the host until Retry-After has passed.  Each
+    successful request after that reduces the delay by 'decay' until
+    it's gone.
+
+    SleepDecorator uses the delay as the minimum interval for the
+    host, so after the first throttle the whole batch slows down
+    instead of each story using up its own retries.
+    '''
+    def __init__(self,limiter=None,initial=2.0,maximum=300.0,decay=0.9):
+        self.lock = threading.Lock()
+        self.limiter = limiter or host_rate_limiter
+        self.initial = initial
+        self.maximum = maximum
+        self.decay = decay
+        # netloc -> seconds
+        self.delay = {}
+        # netloc -> number of throttled responses
+        self.throttles = {}
+
+    def throttled(self,host,retry_after=None,count=1):
+        with self.lock:
+            d = self.delay.get(host,0.0)
+            for i in range(count):
+                d = min(self.maximum,max(d*2 or self.initial, retry_after or 0.0))
+            self.delay[host] = d
+            self.throttles[host] = self.throttles.get(host,0) + count
+        logger.warning("%s throttled requests, delay now %0.1fs"%(host,d))
+        if retry_after:
+            self.limiter.defer(host,retry_after)
+        return d
+
+    def succeeded(self,host):
+        with self.lock:
+            if host in self.delay:
+                d = self.delay[host]*self.decay
+                if d < self.initial/4:
+                    del self.delay[host]
+                else:
+                    self.delay[host] = d
+
+    def get_delay(self,host):
+        with self.lock:
+            return self.delay.get(host,0.0)
+
+    def get_stats(self):
+        with self.lock:
+            return dict( (host,{'throttles':n,
+                                'delay':self.delay.get(host,0.0)})
+                         for host,n in self.throttles.items() )
+
+host_backoff = HostBackoff()
+
+class SleepDecorator(FetcherDecorator):
+    def __init__(self,limiter=None,backoff=None):
         super(SleepDecorator,self).__init__()
         self.sleep_override = None
+        self.limiter = limiter or host_rate_limiter
+        self.backoff = backoff or host_backoff
+        ## seconds this decorator spent waiting, for stats.
+        self.throttled_time = 0.0
 
     def decorate_fetcher(self,fetcher):
         super(SleepDecorator,self).decorate_fetcher(fetcher)
@@ -90,6 +243,35 @@ class SleepDecorator(FetcherDecorator):
         # logger.debug("\n===========\n set sleep time %s\n==========="%val)
         self.sleep_override = val
 
+    def get_interval(self,fetcher,host=None):
+        '''
+        Seconds between requests to one host.  sleep_override, if
+        set, wins.  Otherwise the slower of slow_down_sleep_time and
+        1/rate_limit_requests_per_second.  Either way, at least the
+        host's current backoff delay.
+        '''
+        backoff = self.backoff.get_delay(host) if host else 0.0
+        if self.sleep_override:
+            return max(float(self.sleep_override),backoff)
+        t = 0.0
+        if fetcher.getConfig('slow_down_sleep_time'):
+            t = float(fetcher.getConfig('slow_down_sleep_time'))
+        try:
+            rps = float(fetcher.getConfig('rate_limit_requests_per_second') or 0)
+        except ValueError:
+            logger.warning("Ignoring non-number rate_limit_requests_per_second(%s)"%fetcher.getConfig('rate_limit_requests_per_second'))
+            rps = 0
+        if rps > 0:
+            t = max(t,1.0/rps)
+        return max(t,backoff)
+
+    def get_burst(self,fetcher):
+        try:
+            return max(1,int(fetcher.getConfig('rate_limit_burst') or 1))
+        except ValueError:
+            logger.warning("Ignoring non-int rate_limit_burst(%s)"%fetcher.getConfig('rate_limit_burst'))
+            return 1
+
     def fetcher_do_request(self,
                            fetcher,
                            chainfn,
@@ -97,30 +279,151 @@ class SleepDecorator(FetcherDecorator):
                            url,
                            parameters=None,
                            referer=None,
-                           usecache=True):
+                           usecache=True,
+                           validators=None,
+                           image=False):
         # logger.debug("SleepDecorator fetcher_do_request")
+        t = None
+        host = urlparse(url).netloc
+        if not url.startswith('file:'):
+            t = self.get_interval(fetcher,host)
+        step = None
+        if t:
+            (wait,step) = self.limiter.reserve(host,t,self.get_burst(fetcher))
+            if wait > 0:
+                logger.debug("rate limit %s wait(%0.2f-%0.2f):%0.2f"%(host,t*0.5,t*1.5,wait))
+                self.throttled_time += wait
+                time.sleep(wait)
+            fetch_metrics.record('Sleep',url,sleep=max(wait,0))
+
         fetchresp = chainfn(
             method,
             url,
             parameters=parameters,
             referer=referer,
-            usecache=usecache)
+            usecache=usecache,
+            validators=validators,
+            image=image)
 
-        # don't sleep cached results.  Usually MemCache results will
-        # be before sleep, but check fetchresp.fromcache for file://
-        # and other intermediate caches.
+        # don't count cached results.  BasicCache and BrowserCache
+        # hits never get here--both are above this decorator--but
+        # check fetchresp.fromcache for any other cache below it.
+        # Any wait already done isn't given back, only the slot.
         logger.debug("fromcache:%s"%fetchresp.fromcache)
-        if not fetchresp.fromcache:
-            t = None
-            if self.sleep_override:
-                t = float(self.sleep_override)
-            elif fetcher.getConfig('slow_down_sleep_time'):
-                t = float(fetcher.getConfig('slow_down_sleep_time'))
-            ## sleep randomly between 0.5 time and 1.5 time.
-            ## So 8 would be between 4 and 12.
-            if t:
-                rt = random.uniform(t*0.5, t*1.5)
-                logger.debug("random sleep(%0.2f-%0.2f):%0.2f"%(t*0.5, t*1.5,rt))
-                time.sleep(rt)
+        if step and fetchresp.fromcache:
+            self.limiter.refund(host,step)
 
         return fetchresp
+
+class InFlightRequest(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.fetchresp = None
+        self.exception = None
+        self.waiters = 0
+
+class RequestCoalescer(object):
+    '''
+    Process wide table of GET requests currently in flight.  The
+    first thread to ask for a key does the request, any others asking
+    for the same key while it's running wait for and get the same
+    FetcherResponse (or exception) instead of making their own.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        # netloc -> number of requests that didn't go out because
+        # they were coalesced.
+        self.coalesced = {}
+
+    def do_request(self,key,url,fn):
+        host = urlparse(url).netloc
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = InFlightRequest()
+            else:
+                call.waiters += 1
+                self.coalesced[host] = self.coalesced.get(host,0) + 1
+        if leader:
+            fetch_metrics.record('Coalescer',url,hit=False)
+            try:
+                call.fetchresp = fn()
+            except Exception as e:
+                call.exception = e
+                raise
+            finally:
+                with self.lock:
+                    del self.inflight[key]
+                call.event.set()
+        else:
+            logger.debug(make_log('Coalescer','GET',url,hit='COALESCED'))
+            fetch_metrics.record('Coalescer',url,hit=True)
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+        return call.fetchresp
+
+    def get_coalesced_count(self,host=None):
+        with self.lock:
+            if host:
+                return self.coalesced.get(host,0)
+            return sum(self.coalesced.values())
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.coalesced)
+
+## shared by all fetchers in the process, like host_rate_limiter.
+request_coalescer = RequestCoalescer()
+
+class CoalescingDecorator(FetcherDecorator):
+    '''
+    Identical GET requests made at the same time (prefetch, series
+    and anthology downloads, several stories with the same author
+    page or cover image) share one trip to the site.
+
+    Added below BasicCacheDecorator, so cache hits don't come here,
+    and above SleepDecorator, so coalesced requests don't use up a
+    rate limit slot.  Only fetchers using the same cookiejar share
+    requests, so a logged in page is never handed to another login.
+    '''
+    def __init__(self,coalescer=None):
+        super(CoalescingDecorator,self).__init__()
+        self.coalescer = coalescer or request_coalescer
+
+    def make_key(self,fetcher,url,validators=None,image=False):
+        ## jar is None until set, then the fetcher's own session jar
+        ## is used.
+        jar = fetcher.cookiejar if fetcher.cookiejar is not None else fetcher
+        return (id(jar),
+                url,
+                tuple(sorted(validators.items())) if validators else None,
+                image)
+
+    def fetcher_do_request(self,
+                           fetcher,
+                           chainfn,
+                           method,
+                           url,
+                           parameters=None,
+                           referer=None,
+                           usecache=True,
+                           validators=None,
+                           image=False):
+        fn = partial(chainfn,
+                     method,
+                     url,
+                     parameters=parameters,
+                     referer=referer,
+                     usecache=usecache,
+                     validators=validators,
+                     image=image)
+        ## POSTs have side effects and usecache=False callers want
+        ## their own fresh copy.
+        if method != 'GET' or parameters or not usecache:
+            return fn()
+        return self.coalescer.do_request(self.make_key(fetcher,url,validators,image),
+                                         url,
+                                         fn)
@@ -26,7 +26,7 @@ from cloudscraper.exceptions import CloudflareException
 from ..six import text_type as unicode
 from .. import exceptions
 
-from .fetcher_requests import RequestsFetcher
+from .fetcher_requests import RequestsFetcher, get_shared_adapter
 
 ## makes requests/cloudscraper dump req/resp headers.
 # import http.client as http_client
@@ -45,14 +45,20 @@ class CloudScraperFetcher(RequestsFetcher):
                 'desktop': True,
                 })
 
-    def do_mounts(self,session):
-        super(CloudScraperFetcher,self).do_mounts(session)
-        ## CipherSuiteAdapter adapter replaces HTTPAdapter
-        session.mount('https://',cloudscraper.CipherSuiteAdapter(
-                cipherSuite=session.cipherSuite,
-                ssl_context=session.ssl_context,
-                source_address=session.source_address,
-                max_retries=self.retries))
+    def get_https_adapter(self,session):
+        ## CipherSuiteAdapter adapter instead of HTTPAdapter.  Shared
+        ## like the others, but only by sessions with the same TLS
+        ## settings.
+        return get_shared_adapter(
+                self.get_adapter_key('https-ciphersuite')+(session.cipherSuite,
+                                                           session.ssl_context,
+                                                           session.source_address),
+                lambda : cloudscraper.CipherSuiteAdapter(
+                    cipherSuite=session.cipherSuite,
+                    ssl_context=session.ssl_context,
+                    source_address=session.source_address,
+                    max_retries=self.retries,
+                    pool_maxsize=self.get_pool_size()))
 
     def make_headers(self,url,referer=None):
         headers = super(CloudScraperFetcher,self).make_headers(url,
@@ -70,9 +76,9 @@ class CloudScraperFetcher(RequestsFetcher):
             logger.warning("use_ssl_unverified_context:true ignored when use_cloudscraper:true")
         return True
 
-    def request(self,method,url,headers=None,parameters=None):
+    def request(self,method,url,headers=None,parameters=None,image=False):
         try:
-            return super(CloudScraperFetcher,self).request(method,url,headers,parameters)
+            return super(CloudScraperFetcher,self).request(method,url,headers,parameters,image=image)
         except CloudflareException as cfe:
             ## cloudscraper exception messages can appear to
             ## come from FFF and cause confusion.
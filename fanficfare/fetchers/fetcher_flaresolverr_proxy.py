@@ -15,9 +15,14 @@
 # limitations under the License.
 #
 
+import os
 import base64
 import time
 import json
+import atexit
+import threading
+import itertools
+import weakref
 import logging
 logger = logging.getLogger(__name__)
 
@@ -29,13 +34,160 @@ from .base_fetcher import FetcherResponse
 from .fetcher_requests import RequestsFetcher
 
 from ..six.moves.http_cookiejar import Cookie
-from ..six.moves.urllib.parse import urlencode
+from ..six.moves.urllib.parse import urlencode, urlparse
 from ..six import string_types as basestring, text_type, binary_type
 from ..six import ensure_binary, ensure_text
 
 FLARESOLVERR_SESSION="FanFicFareSession"
-## no convinced this is a good idea yet.
-USE_FS_SESSION=False
+## numbers sessions made by this process.
+session_counter = itertools.count(1)
+
+def is_session_gone(message):
+    ## FlareSolverr v2 'This session does not exist.'  v3 makes a
+    ## new session for an unknown id instead.
+    message = (message or '').lower()
+    return 'session' in message and 'exist' in message
+
+class FlareSolverrSessionPool(object):
+    '''
+    FlareSolverr sessions, each a browser context that keeps the
+    solved challenge's cookies, so only the first request in a session
+    waits for the challenge.  Each request takes one session to
+    itself; concurrent requests (prefetch_chapters) are spread across
+    up to size sessions and wait when all are busy.
+
+    Shared by all fetchers in the process using the same FlareSolverr
+    server, cookiejar and site so a batch of stories doesn't re-solve
+    for each story.
+    '''
+    def __init__(self,fs_url,size=1):
+        self.fs_url = fs_url
+        self.size = size
+        self.cond = threading.Condition()
+        self.idle = []
+        self.busy = set()
+
+    def create_session(self,post_fn):
+        ## manually setting the session causes FS to use that string
+        ## as the session id.  pid keeps separate CLI processes using
+        ## the same FS apart, the counter is for all pools.
+        session = "%s-%s-%s"%(FLARESOLVERR_SESSION,os.getpid(),next(session_counter))
+        resp = post_fn(self.fs_url,{'cmd':'sessions.create',
+                                    'session':session})
+        if resp.json.get('status') != 'ok':
+            raise exceptions.FailedToDownload("FlareSolverr sessions.create failed: %s"%resp.json.get('message'))
+        logger.debug("FlareSolverr session created:%s"%resp.json['session'])
+        return resp.json['session']
+
+    def acquire(self,post_fn):
+        with self.cond:
+            while not self.idle and len(self.busy) >= self.size:
+                self.cond.wait()
+            if self.idle:
+                session = self.idle.pop()
+                self.busy.add(session)
+                return session
+            ## reserve the slot while creating outside the lock.
+            placeholder = object()
+            self.busy.add(placeholder)
+        session = None
+        try:
+            session = self.create_session(post_fn)
+        finally:
+            with self.cond:
+                self.busy.discard(placeholder)
+                if session is None:
+                    self.cond.notify()
+                else:
+                    self.busy.add(session)
+        return session
+
+    def release(self,session,post_fn=None,discard=False):
+        '''
+        Return session to the pool.  discard=True forgets it instead
+        and destroys it if post_fn is given.
+        '''
+        with self.cond:
+            self.busy.discard(session)
+            if not discard and len(self.idle) + len(self.busy) < self.size:
+                self.idle.append(session)
+                session = None
+            self.cond.notify()
+        if session is not None and post_fn is not None:
+            self.destroy_session(session,post_fn)
+
+    def forget_idle(self):
+        '''
+        Sessions gone on the FS side, usually because FS was
+        restarted, which takes all of them.  In use ones are discarded
+        when released.
+        '''
+        with self.cond:
+            self.idle = []
+            self.cond.notify_all()
+
+    def destroy_session(self,session,post_fn):
+        try:
+            post_fn(self.fs_url,{'cmd':'sessions.destroy',
+                                 'session':session})
+            logger.debug("FlareSolverr session destroyed:%s"%session)
+        except Exception as e:
+            logger.debug("FlareSolverr sessions.destroy %s failed: %s"%(session,e))
+
+    def destroy_all(self,post_fn):
+        with self.cond:
+            sessions = self.idle
+            self.idle = []
+        for session in sessions:
+            self.destroy_session(session,post_fn)
+
+## (FS url, id(cookiejar), site) -> FlareSolverrSessionPool
+session_pools = {}
+session_pools_lock = threading.Lock()
+## ids of garbage collected cookiejars whose pools are still in
+## session_pools.  Only appended to by weakref.finalize, which can
+## run anywhere, even with session_pools_lock held.
+dropped_jar_ids = []
+
+def get_session_pool(fs_url,cookiejar,site,size):
+    '''
+    Sessions keep the cookies of whoever used them, so only fetchers
+    sharing a cookiejar share sessions, and only for the same site.
+    '''
+    key = (fs_url,id(cookiejar),site)
+    with session_pools_lock:
+        ## before looking up, a new jar can have a dropped one's id.
+        dropped = []
+        while dropped_jar_ids:
+            jar_id = dropped_jar_ids.pop()
+            dropped.extend( session_pools.pop(k) for k in list(session_pools) if k[1] == jar_id )
+        if key not in session_pools:
+            if not any( k[1] == key[1] for k in session_pools ):
+                weakref.finalize(cookiejar,dropped_jar_ids.append,key[1])
+            session_pools[key] = FlareSolverrSessionPool(fs_url,size)
+        pool = session_pools[key]
+    pool.size = size
+    destroy_pools(dropped)
+    return pool
+
+def destroy_pools(pools):
+    for pool in pools:
+        pool.destroy_all(post_fs_json)
+
+def post_fs_json(fs_url,data):
+    ## for use at exit, when there may not be a fetcher anymore.
+    resp = requests.post(fs_url,json=data,timeout=10)
+    return FetcherResponse(resp.content,fs_url,json=resp.json())
+
+@atexit.register
+def destroy_flaresolverr_sessions():
+    '''
+    Sessions stay open in FlareSolverr (a browser context each) until
+    destroyed.  Only idle sessions, any in use at exit are left.
+    '''
+    with session_pools_lock:
+        pools = list(session_pools.values())
+    destroy_pools(pools)
 
 class FlareSolverr_ProxyFetcher(RequestsFetcher):
     def __init__(self, getConfig_fn, getConfigList_fn):
@@ -43,7 +195,6 @@ class FlareSolverr_ProxyFetcher(RequestsFetcher):
         super(FlareSolverr_ProxyFetcher, self).__init__(getConfig_fn,
                                                  getConfigList_fn)
         self.super_request = super(FlareSolverr_ProxyFetcher,self).request
-        self.fs_session = None
 
     def make_retries(self):
         retry = super(FlareSolverr_ProxyFetcher, self).make_retries()
@@ -52,23 +203,32 @@ class FlareSolverr_ProxyFetcher(RequestsFetcher):
         retry.total = 0
         return retry
 
-    def do_fs_request(self, cmd, url=None, headers=None, parameters=None):
-        if USE_FS_SESSION and not self.fs_session:
-            # manually setting the session causes FS to use that
-            # string as the session id.
-            resp = self.super_request('POST',
-                                      self.getConfig("flaresolverr_proxy_protocol", "http")+'://'+\
-                                      self.getConfig("flaresolverr_proxy_address", "localhost")+\
-                                          ':'+self.getConfig("flaresolverr_proxy_port", '8191')+'/v1',
-                                      headers={'Content-Type':'application/json'},
-                                      json={'cmd':'sessions.create',
-                                            'session':FLARESOLVERR_SESSION}
-                                      )
-            # XXX check resp for error?  What errors could occur?
-            # logger.debug(json.dumps(resp.json, sort_keys=True,
-            #                         indent=2, separators=(',', ':')))
-            self.fs_session = resp.json['session']
+    def get_fs_url(self):
+        return self.getConfig("flaresolverr_proxy_protocol", "http")+'://'+\
+            self.getConfig("flaresolverr_proxy_address", "localhost")+\
+            ':'+self.getConfig("flaresolverr_proxy_port", '8191')+'/v1'
+
+    def post_fs(self, fs_url, fs_data):
+        return self.super_request('POST',
+                                  fs_url,
+                                  headers={'Content-Type':'application/json'},
+                                  json=fs_data,
+                                  )
+
+    def get_session_pool(self,url):
+        try:
+            size = int(self.getConfig("flaresolverr_proxy_sessions",0))
+        except ValueError:
+            logger.warning("Ignoring non-number flaresolverr_proxy_sessions(%s)"%self.getConfig("flaresolverr_proxy_sessions"))
+            size = 0
+        if size < 1:
+            return None
+        return get_session_pool(self.get_fs_url(),
+                                self.get_cookiejar(),
+                                urlparse(url).netloc,
+                                size)
 
+    def do_fs_request(self, cmd, url=None, headers=None, parameters=None, fs_session=None):
         fs_data = {'cmd': cmd,
                    'url':url,
                    #'userAgent': 'Mozilla/5.0',
@@ -82,18 +242,43 @@ class FlareSolverr_ProxyFetcher(RequestsFetcher):
             # download param removed in FlareSolverr v2+, but optional
             # for FFF users still on FlareSolver v1.
             fs_data['download'] = True
-        if self.fs_session:
-            fs_data['session']=self.fs_session
+        if fs_session:
+            fs_data['session']=fs_session
 
-        return self.super_request('POST',
-                                  self.getConfig("flaresolverr_proxy_protocol", "http")+'://'+\
-                                  self.getConfig("flaresolverr_proxy_address", "localhost")+\
-                                      ':'+self.getConfig("flaresolverr_proxy_port", '8191')+'/v1',
-                                  headers={'Content-Type':'application/json'},
-                                  json=fs_data,
-                                  )
+        return self.post_fs(self.get_fs_url(), fs_data)
+
+    def do_fs_session_request(self, cmd, url=None, headers=None, parameters=None):
+        pool = self.get_session_pool(url)
+        if pool is None:
+            return self.do_fs_request(cmd, url, headers, parameters)
+        for attempt in (1,2):
+            fs_session = pool.acquire(self.post_fs)
+            discard = False
+            try:
+                resp = self.do_fs_request(cmd, url, headers, parameters, fs_session)
+                discard = resp.json.get('status') != 'ok' and is_session_gone(resp.json.get('message'))
+            except exceptions.HTTPErrorFFF as he:
+                try:
+                    discard = is_session_gone(json.loads(he.data)['message'])
+                except Exception:
+                    pass
+                if not discard or attempt == 2:
+                    raise
+            finally:
+                if discard:
+                    pool.forget_idle()
+                    pool.release(fs_session,discard=True)
+                else:
+                    pool.release(fs_session,self.post_fs)
+            if not discard:
+                return resp
+            ## restarted FS, once more with a new session.
+            logger.debug("FlareSolverr session %s gone, retrying with a new one"%fs_session)
+        return resp
 
-    def request(self, method, url, headers=None, parameters=None):
+    ## image accepted for the fetcher chain, the whole page comes
+    ## back in the proxy's response either way.
+    def request(self, method, url, headers=None, parameters=None, image=False):
         '''Returns a FetcherResponse regardless of mechanism'''
         if method not in ('GET','POST'):
             raise NotImplementedError()
@@ -103,7 +288,7 @@ class FlareSolverr_ProxyFetcher(RequestsFetcher):
         cmd = ('request.'+method).lower()
 
         try:
-            resp = self.do_fs_request(cmd, url, headers, parameters)
+            resp = self.do_fs_session_request(cmd, url, headers, parameters)
         except requests.exceptions.ConnectionError as ce:
             raise exceptions.FailedToDownload("Connection to flaresolverr proxy server failed.  Is flaresolverr started?")
         except exceptions.HTTPErrorFFF as he:
@@ -16,6 +16,8 @@
 #
 
 import base64
+import binascii
+import threading
 import time
 import logging
 
@@ -28,40 +30,151 @@ from .fetcher_requests import RequestsFetcher
 
 import socket
 
+END_OF_HEADER = b'$END_OF_HEADER$'
+## the header is '<size>||<type>' and comes before the payload.
+MAX_HEADER_SIZE = 1024
+
 class NSAPA_ProxyFetcher(RequestsFetcher):
 
     def __init__(self, getConfig_fn, getConfigList_fn):
         super(NSAPA_ProxyFetcher, self).__init__(getConfig_fn,
                                                  getConfigList_fn)
-
-    def proxy_request(self, url, timeout=5):
+        ## One connection to the proxy kept open for all requests.
+        ## The proxy drives a single browser, so requests are sent
+        ## one at a time.
+        self.proxy_socket = None
+        self.proxy_lock = threading.Lock()
+        self.header_buffer = bytearray(MAX_HEADER_SIZE)
+
+    def get_proxy_address(self):
+        return (self.getConfig("nsapa_proxy_address", "127.0.0.1"),
+                int(self.getConfig("nsapa_proxy_port", 8888)))
+
+    def connect_proxy(self):
+        if self.proxy_socket is not None:
+            return self.proxy_socket
+        address = self.get_proxy_address()
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setblocking(True)
         s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
-
         try:
-            s.connect((self.getConfig("nsapa_proxy_address", "127.0.0.1"),
-                       int(self.getConfig("nsapa_proxy_port", 8888))))
-
+            s.connect(address)
         except socket.error as e:
+            s.close()
             logger.error("proxy unavailable, socket error: %s", str(e))
             raise ConnectionError(
-                "nsapa_proxy: proxy %s:%i unavailable" %
-                (self.getConfig("nsapa_proxy_address", "127.0.0.1"),
-                 int(self.getConfig("nsapa_proxy_port", 8888))))
+                "nsapa_proxy: proxy %s:%i unavailable" % address)
+        self.proxy_socket = s
+        return s
+
+    def close_proxy(self):
+        if self.proxy_socket is not None:
+            try:
+                self.proxy_socket.close()
+            except socket.error:
+                pass
+            self.proxy_socket = None
+
+    def recv_header(self, s, timeout):
+        '''
+        Returns (header text, bytes of payload received with it), or
+        None if the proxy closed the connection before sending
+        anything.
+        '''
+        buf = self.header_buffer
+        view = memoryview(buf)
+        received = 0
+        s.settimeout(timeout)
+        while True:
+            if received == len(buf):
+                raise exceptions.FailedToDownload(
+                    'nsapa_proxy: proxy protocol violation; header too long')
+            n = s.recv_into(view[received:])
+            if n == 0:
+                if received == 0:
+                    return None
+                raise exceptions.FailedToDownload(
+                    'nsapa_proxy: proxy closed connection in header')
+            ## only search the new bytes plus enough before them to
+            ## find a marker split across reads.
+            start = max(0, received - len(END_OF_HEADER) + 1)
+            received += n
+            end_header = buf.find(END_OF_HEADER, start, received)
+            if end_header >= 0:
+                return (bytes(view[:end_header]).decode('utf-8'),
+                        view[end_header + len(END_OF_HEADER):received])
+
+    def recv_payload(self, s, pre_data, size_expected, timeout):
+        '''
+        Returns bytes received, payload is filled in place.
+        '''
+        payload = bytearray(size_expected)
+        view = memoryview(payload)
+        bytes_recd = len(pre_data)
+        if bytes_recd > size_expected:
+            raise exceptions.FailedToDownload(
+                'nsapa_proxy: proxy sent more than %i bytes' % size_expected)
+        if bytes_recd:
+            view[:bytes_recd] = pre_data
+            logger.debug("injecting %i bytes from the header recv()",
+                         bytes_recd)
+        s.settimeout(timeout)
+        try:
+            while bytes_recd < size_expected:
+                ## only ask for what's left of this reply.
+                n = s.recv_into(view[bytes_recd:])
+                if n == 0:
+                    logger.debug("proxy closed connection")
+                    break
+                bytes_recd += n
+        except socket.timeout:
+            logger.debug("socket timeout (%i seconds)", timeout)
+        logger.debug('leaving receive loop after %i bytes', bytes_recd)
+        return (payload, bytes_recd)
 
-        sent = s.sendall(url.encode('utf-8'))
-        if sent == 0:
-            logger.debug('connection lost while sending command')
+    def proxy_request(self, url, timeout=5):
+        with self.proxy_lock:
+            for attempt in range(2):
+                ## An open connection may have been closed by the
+                ## proxy since the last request, try again once on a
+                ## new one.
+                reused = self.proxy_socket is not None
+                s = self.connect_proxy()
+                try:
+                    result = self.proxy_request_conn(s, url, timeout)
+                except socket.timeout as e:
+                    self.close_proxy()
+                    raise exceptions.FailedToDownload(
+                        'nsapa_proxy: socket timeout (%i seconds)' % timeout)
+                except socket.error as e:
+                    self.close_proxy()
+                    if reused:
+                        logger.debug('proxy connection lost (%s), reconnecting', e)
+                        continue
+                    raise exceptions.FailedToDownload(
+                        'nsapa_proxy: socket error: %s' % e)
+                except:
+                    ## the rest of a partial reply would be read as
+                    ## the next one.
+                    self.close_proxy()
+                    raise
+                if result is not None:
+                    return result
+                self.close_proxy()
+                if not reused:
+                    break
+                logger.debug('proxy connection closed, reconnecting')
+            raise exceptions.FailedToDownload(
+                'nsapa_proxy: proxy closed connection')
 
-        header_raw = s.recv(1024)
-        header = header_raw.split(b'$END_OF_HEADER$')[0].decode('utf-8')
+    def proxy_request_conn(self, s, url, timeout):
+        s.settimeout(timeout)
+        s.sendall(url.encode('utf-8'))
 
-        # If we received a part of the payload here, save it
-        # so we can inject it before the payload receive loop
-        pre_data = None
-        if len(header_raw.split(b'$END_OF_HEADER$')) > 1:
-            pre_data = header_raw.split(b'$END_OF_HEADER$')[1]
+        ## the browser loads the page before the header is sent.
+        header_recd = self.recv_header(s, timeout * 2)
+        if header_recd is None:
+            return None
+        (header, pre_data) = header_recd
 
         header_splited = header.split('||')
         if len(header_splited) < 2:
@@ -87,50 +200,7 @@ class NSAPA_ProxyFetcher(RequestsFetcher):
 
         logger.debug('expecting %i bytes of %s', size_expected, type_expected)
 
-        # Payload receive loop
-        bytes_recd = 0
-
-        #Based on code from https://code.activestate.com/recipes/408859/
-        #Licenced under PSF by John Nielsen
-        s.setblocking(False)
-        total_data = []
-        data = ''
-        begin = time.time()
-
-        if pre_data is not None:
-            if len(pre_data) > 0:
-                total_data.append(pre_data)
-                bytes_recd += len(pre_data)
-                logger.debug("injecting %i bytes from the first recv()",
-                             bytes_recd)
-
-        while True:
-            # We received everything we expected
-            if bytes_recd == size_expected:
-                logger.debug('exiting receive loop after %i bytes', bytes_recd)
-                break
-            #if you got some data, then break after wait sec
-            if total_data and time.time() - begin > timeout:
-                logger.debug("timeout while receiving data")
-                break
-            #if you got no data at all, wait a little longer
-            elif time.time() - begin > timeout * 2:
-                logger.debug("socket timeout (%i seconds)", timeout)
-                break
-            try:
-                data = s.recv(8192)
-                if data:
-                    total_data.append(data)
-                    bytes_recd += len(data)
-                    begin = time.time()
-                else:
-                    time.sleep(0.1)
-            except:
-                pass
-        #End of Code from https://code.activestate.com/recipes/408859/
-        logger.debug('leaving receive loop after %i bytes', bytes_recd)
-
-        s.close()
+        (payload, bytes_recd) = self.recv_payload(s, pre_data, size_expected, timeout)
 
         if bytes_recd != size_expected:
             # Truncated reply, log the issue
@@ -141,18 +211,17 @@ class NSAPA_ProxyFetcher(RequestsFetcher):
                 'nsapa_proxy: truncated reply from proxy')
 
         if type_expected == 'text':
-            content = b''.join(total_data).decode("utf-8")
+            content = payload.decode("utf-8")
 
         if type_expected == 'text-b64':
-            content = b''.join(total_data).decode("utf-8")
             try:
-                content = base64.standard_b64decode(content)
+                content = base64.standard_b64decode(bytes(payload))
             except binascii.Error:
                 raise exceptions.FailedToDownload(
                     'nsapa_proxy: base64 decoding failed')
 
         if type_expected == 'image':
-            content = b''.join(total_data)
+            content = bytes(payload)
             #logger.debug('Got %i bytes of image', len(content))
 
         if type_expected == 'binary':
@@ -161,7 +230,9 @@ class NSAPA_ProxyFetcher(RequestsFetcher):
 
         return (type_expected, content)
 
-    def request(self, method, url, headers=None, parameters=None):
+    ## image accepted for the fetcher chain, the whole page comes
+    ## back in the proxy's response either way.
+    def request(self, method, url, headers=None, parameters=None, image=False):
         if method != 'GET':
             raise NotImplementedError
 
@@ -204,3 +275,7 @@ class NSAPA_ProxyFetcher(RequestsFetcher):
                 retry_count)
 
         return FetcherResponse(content, url, False)
+
+    def __del__(self):
+        self.close_proxy()
+        super(NSAPA_ProxyFetcher, self).__del__()
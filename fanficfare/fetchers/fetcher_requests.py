@@ -16,11 +16,15 @@
 #
 
 from __future__ import absolute_import
+import time
+import atexit
+import threading
 import logging
 logger = logging.getLogger(__name__)
 
 # py2 vs py3 transition
 from ..six import text_type as unicode
+from ..six.moves.urllib.parse import urlparse
 from .. import exceptions
 
 from urllib3.util.retry import Retry
@@ -34,7 +38,42 @@ from requests_file import FileAdapter
 # http_client.HTTPConnection.debuglevel = 5
 
 from .log import make_log
-from .base_fetcher import FetcherResponse, Fetcher
+from .metrics import fetch_metrics
+from .decorators import host_backoff, THROTTLE_STATUS_CODES
+from .base_fetcher import FetcherResponse, Fetcher, VALIDATOR_HEADERS
+
+## Sent by some image hosts for images.
+GENERIC_CONTENT_TYPES = ('application/octet-stream','binary/octet-stream')
+
+class TLSAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        import ssl
+        ctx = ssl.create_default_context()
+        ctx.set_ciphers('DEFAULT@SECLEVEL=1')
+        kwargs['ssl_context'] = ctx
+        return super(TLSAdapter, self).init_poolmanager(*args, **kwargs)
+
+## Connection pools (requests transport adapters) are shared by all
+## fetchers in the process so a batch of stories reuses warm
+## keep-alive connections instead of a new TCP+TLS handshake for each
+## story.  Sessions--and so cookies--are still one per fetcher.
+shared_adapters = {}
+shared_adapters_lock = threading.Lock()
+
+def get_shared_adapter(key,make_adapter):
+    with shared_adapters_lock:
+        if key not in shared_adapters:
+            logger.debug("New shared connection pool:%s"%(key,))
+            shared_adapters[key] = make_adapter()
+        return shared_adapters[key]
+
+## sockets closed cleanly at exit, not left to the OS.
+@atexit.register
+def close_shared_adapters():
+    with shared_adapters_lock:
+        for adapter in shared_adapters.values():
+            adapter.close()
+        shared_adapters.clear()
 
 class RequestsFetcher(Fetcher):
     def __init__(self,getConfig_fn,getConfigList_fn):
@@ -59,19 +98,45 @@ class RequestsFetcher(Fetcher):
     def make_sesssion(self):
         return requests.Session()
 
-    def do_mounts(self,session):
+    def get_pool_size(self):
+        try:
+            return int(self.getConfig('connection_pool_size',10))
+        except ValueError:
+            logger.warning("Ignoring non-int connection_pool_size(%s)"%self.getConfig('connection_pool_size'))
+            return 10
+
+    def get_adapter_key(self,scheme):
+        '''
+        Fetchers with the same key can share a connection pool.
+        Fetcher class because subclasses differ in retries and
+        transport adapter.
+        '''
+        return (self.__class__.__name__,
+                scheme,
+                bool(self.getConfig('use_ssl_default_seclevelone',False)),
+                self.getConfig('http_proxy'),
+                self.getConfig('https_proxy'),
+                self.get_pool_size())
+
+    def get_https_adapter(self,session):
+        '''
+        Shared transport adapter for https://, subclasses replace it.
+        '''
+        pool_size = self.get_pool_size()
         if self.getConfig('use_ssl_default_seclevelone',False):
-            import ssl
-            class TLSAdapter(HTTPAdapter):
-                def init_poolmanager(self, *args, **kwargs):
-                    ctx = ssl.create_default_context()
-                    ctx.set_ciphers('DEFAULT@SECLEVEL=1')
-                    kwargs['ssl_context'] = ctx
-                    return super(TLSAdapter, self).init_poolmanager(*args, **kwargs)
-            session.mount('https://', TLSAdapter(max_retries=self.retries))
+            adaptercls = TLSAdapter
         else:
-            session.mount('https://', HTTPAdapter(max_retries=self.retries))
-        session.mount('http://', HTTPAdapter(max_retries=self.retries))
+            adaptercls = HTTPAdapter
+        return get_shared_adapter(self.get_adapter_key('https'),
+                                  lambda : adaptercls(max_retries=self.retries,
+                                                      pool_maxsize=pool_size))
+
+    def do_mounts(self,session):
+        pool_size = self.get_pool_size()
+        session.mount('https://', self.get_https_adapter(session))
+        session.mount('http://', get_shared_adapter(self.get_adapter_key('http'),
+                                                    lambda : HTTPAdapter(max_retries=self.retries,
+                                                                         pool_maxsize=pool_size)))
         session.mount('file://', FileAdapter())
         # logger.debug("Session Proxies Before:%s"%session.proxies)
         ## try to get OS proxy settings via Calibre
@@ -106,10 +171,73 @@ class RequestsFetcher(Fetcher):
     def use_verify(self):
         return not self.getConfig('use_ssl_unverified_context',False)
 
-    def request(self,method,url,headers=None,parameters=None,json=None):
+    def report_throttling(self,url,resp):
+        '''
+        Tell host_backoff about 429/503s, both the final response and
+        any already retried inside urllib3, so other stories/fetchers
+        to the same site slow down too.
+        '''
+        host = urlparse(url).netloc
+        retries = getattr(resp.raw,'retries',None)
+        count = 0
+        if retries is not None:
+            count = len([ h for h in retries.history
+                          if h.status in THROTTLE_STATUS_CODES ])
+        if resp.status_code in THROTTLE_STATUS_CODES:
+            count += 1
+        if not count:
+            host_backoff.succeeded(host)
+            return
+        retry_after = None
+        if resp.headers.get('Retry-After'):
+            try:
+                retry_after = self.retries.parse_retry_after(resp.headers['Retry-After'])
+            except Exception as e:
+                logger.debug("Bad Retry-After(%s): %s"%(resp.headers['Retry-After'],e))
+        host_backoff.throttled(host,retry_after,count)
+
+    def get_max_image_bytes(self):
+        try:
+            return int(self.getConfig('max_image_bytes') or 0)
+        except ValueError:
+            logger.warning("Ignoring non-int max_image_bytes(%s)"%self.getConfig('max_image_bytes'))
+            return 0
+
+    def read_image_content(self,url,resp):
+        '''
+        Read a streamed image response, giving up before the body is
+        read if Content-Type isn't an image or Content-Length is over
+        max_image_bytes and part way through if the body turns out
+        to be over anyway.  RejectImage ends as 'failedtoload' in
+        Story.addImgUrl like other image failures.
+        '''
+        ctype = resp.headers.get('Content-Type','').split(';')[0].strip().lower()
+        if ctype and not ctype.startswith('image/') and ctype not in GENERIC_CONTENT_TYPES:
+            resp.close()
+            raise exceptions.RejectImage("Not an image (Content-Type:%s): %s"%(ctype,url))
+        max_bytes = self.get_max_image_bytes()
+        if not max_bytes:
+            return resp.content
+        length = resp.headers.get('Content-Length','')
+        if length.isdigit() and int(length) > max_bytes:
+            resp.close()
+            raise exceptions.RejectImage("Image Content-Length %s over max_image_bytes(%s): %s"%(length,max_bytes,url))
+        chunks = []
+        total = 0
+        for chunk in resp.iter_content(64*1024):
+            total += len(chunk)
+            if total > max_bytes:
+                resp.close()
+                raise exceptions.RejectImage("Image over max_image_bytes(%s): %s"%(max_bytes,url))
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def request(self,method,url,headers=None,parameters=None,json=None,image=False):
         '''Returns a FetcherResponse regardless of mechanism'''
         if method not in ('GET','POST'):
             raise NotImplementedError()
+        layer = self.__class__.__name__
+        start = time.time()
         try:
             logger.debug(make_log('RequestsFetcher',method,url,hit='REQ',bar='-'))
             ## resp = requests Response object
@@ -123,8 +251,18 @@ class RequestsFetcher(Fetcher):
                                                        data=parameters,
                                                        json=json,
                                                        verify=self.use_verify(),
-                                                       timeout=timeout)
+                                                       timeout=timeout,
+                                                       stream=image)
             logger.debug("response code:%s"%resp.status_code)
+            if image and resp.status_code < 400:
+                content = self.read_image_content(url,resp)
+            else:
+                content = resp.content
+            fetch_metrics.record(layer,url,
+                                 nbytes=len(content),
+                                 latency=time.time()-start,
+                                 error=resp.status_code >= 400)
+            self.report_throttling(url,resp)
             resp.raise_for_status() # raises RequestsHTTPError if error code.
             # consider 'cached' if from file.
             fromcache = resp.url.startswith('file:')
@@ -137,10 +275,13 @@ class RequestsFetcher(Fetcher):
                 except:
                     pass
             # logger.debug(resp_json)
-            return FetcherResponse(resp.content,
+            return FetcherResponse(content,
                                    resp.url,
                                    fromcache,
-                                   resp_json)
+                                   resp_json,
+                                   headers=dict( (k,resp.headers[k]) for k in VALIDATOR_HEADERS
+                                                 if k in resp.headers ),
+                                   status_code=resp.status_code)
         except RequestsHTTPError as e:
             ## not RequestsHTTPError(requests.exceptions.HTTPError) or
             ## .six.moves.urllib.error import HTTPError because we
@@ -152,7 +293,13 @@ class RequestsFetcher(Fetcher):
                 e.args[0],# error_msg
                 e.response.content # data
                 )
+        except Exception:
+            ## no response at all: DNS, connection, timeout, etc.
+            fetch_metrics.record(layer,url,latency=time.time()-start,error=True)
+            raise
 
     def __del__(self):
         if self.requests_session is not None:
+            ## don't close shared connection pools with the session.
+            self.requests_session.adapters.clear()
             self.requests_session.close()
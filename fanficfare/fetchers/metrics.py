@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+import json
+import threading
+
+from ..six.moves.urllib.parse import urlparse
+
+import logging
+logger = logging.getLogger(__name__)
+
+## upper bounds (seconds) of latency histogram buckets, last bucket
+## is everything slower.
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def new_counters():
+    return {'requests':0,
+            'hits':0,
+            'misses':0,
+            'errors':0,
+            'bytes':0,
+            'sleep_time':0.0,
+            'latency_total':0.0,
+            'latency_max':0.0,
+            'latency_buckets':[0]*(len(LATENCY_BUCKETS)+1)}
+
+class FetchMetrics(object):
+    '''
+    Process wide counters reported into by the fetcher chain, kept
+    by layer (decorator or fetcher name) and host (netloc).
+
+    latency is the time spent in that layer *including* the layers
+    below it, so for a cache miss it's the whole fetch.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # layer -> host -> counters
+            self.layers = {}
+
+    def record(self,layer,url,
+               hit=None,
+               nbytes=None,
+               latency=None,
+               sleep=None,
+               error=False):
+        host = urlparse(url).netloc
+        with self.lock:
+            c = self.layers.setdefault(layer,{}).get(host)
+            if c is None:
+                c = self.layers[layer][host] = new_counters()
+            c['requests'] += 1
+            if hit == True:
+                c['hits'] += 1
+            elif hit == False:
+                c['misses'] += 1
+            if error:
+                c['errors'] += 1
+            if nbytes:
+                c['bytes'] += nbytes
+            if sleep:
+                c['sleep_time'] += sleep
+            if latency is not None:
+                c['latency_total'] += latency
+                c['latency_max'] = max(c['latency_max'],latency)
+                i = 0
+                while i < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[i]:
+                    i += 1
+                c['latency_buckets'][i] += 1
+
+    def get_stats(self):
+        '''
+        Returns a JSON-able dict of layer -> host -> counters, with a
+        '*' host per layer that totals all hosts.  Latency buckets are
+        labeled by upper bound.
+        '''
+        labels = [ '<=%s'%b for b in LATENCY_BUCKETS ] + [ '>%s'%LATENCY_BUCKETS[-1] ]
+        def export(c):
+            d = dict(c)
+            d['latency_buckets'] = dict(zip(labels,c['latency_buckets']))
+            lookups = c['hits'] + c['misses']
+            d['hit_ratio'] = round(float(c['hits'])/lookups,3) if lookups else None
+            return d
+        stats = {}
+        with self.lock:
+            for layer, hosts in self.layers.items():
+                total = new_counters()
+                for c in hosts.values():
+                    for k, v in c.items():
+                        if k == 'latency_max':
+                            total[k] = max(total[k],v)
+                        elif k == 'latency_buckets':
+                            total[k] = [ a+b for a,b in zip(total[k],v) ]
+                        else:
+                            total[k] += v
+                stats[layer] = dict( (host,export(c)) for host,c in hosts.items() )
+                stats[layer]['*'] = export(total)
+        return stats
+
+    def to_json(self):
+        return json.dumps(self.get_stats(), sort_keys=True,
+                          indent=2, separators=(',', ':'))
+
+## shared by all fetchers in the process, like host_rate_limiter.
+fetch_metrics = FetchMetrics()
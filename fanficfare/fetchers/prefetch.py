@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .log import safe_url
+
+class Prefetcher(object):
+    '''
+    Fetches a list of URLs ahead of when they are needed using a small
+    thread pool.  Results are *not* returned--prefetch only warms the
+    BasicCache so the normal (main thread) fetch for the same URL is a
+    cache hit.  Failures are ignored here; the main thread's own fetch
+    will re-raise them in the normal place.
+
+    At most 'window' URLs are in flight or done-but-unclaimed at once.
+
+    Adapters don't always fetch a chapter from the URL it's listed
+    under (printable versions, mobile site, APIs).  So only the first
+    URL is prefetched until fetched(url) sees the main thread request
+    it too; if it didn't, prefetching stops after one wasted page
+    instead of fetching every chapter twice.
+    '''
+    def __init__(self, fetcher, urls, window=4, workers=None):
+        self.fetcher = fetcher
+        self.pending = list(urls)
+        self.window = max(1,int(window))
+        self.futures = {}
+        self.lock = threading.Lock()
+        ## set once the main thread is seen requesting a prefetched
+        ## url.
+        self.confirmed = False
+        ## urls the main thread requested since the last fetched().
+        self.requested = set()
+        self.worker = threading.local()
+        self.chain_do_request = fetcher.do_request
+        fetcher.do_request = self.watch_do_request
+        self.executor = ThreadPoolExecutor(max_workers=max(1,int(workers or self.window)))
+        self.fill()
+
+    def watch_do_request(self, method, url, *args, **kargs):
+        if not getattr(self.worker,'prefetching',False):
+            with self.lock:
+                self.requested.add(url)
+        return self.chain_do_request(method, url, *args, **kargs)
+
+    def _fetch(self,url):
+        self.worker.prefetching = True
+        try:
+            self.fetcher.get_request_redirected(url)
+        except Exception as e:
+            logger.debug("Prefetch failed, will retry in sequence (%s): %s"%(safe_url(url),e))
+        finally:
+            self.worker.prefetching = False
+
+    def fill(self):
+        with self.lock:
+            window = self.window if self.confirmed else 1
+            while self.pending and len(self.futures) < window:
+                url = self.pending.pop(0)
+                if url not in self.futures:
+                    self.futures[url] = self.executor.submit(self._fetch,url)
+
+    def wait(self,url):
+        '''
+        Block until url's prefetch (if any) is done, then queue more.
+        Called right before the main thread fetches url itself so the
+        same page isn't requested twice at once.
+        '''
+        with self.lock:
+            future = self.futures.pop(url,None)
+        if future is not None:
+            future.result()
+        if self.confirmed:
+            self.fill()
+
+    def fetched(self,url):
+        '''
+        Called after the main thread has fetched url.  The first time,
+        checks the page it fetched was url and either prefetches the
+        whole window from then on or stops.
+        '''
+        with self.lock:
+            requested = self.fetcher.condition_url(url) in self.requested
+            self.requested = set()
+            check = not self.confirmed
+        if check:
+            if requested:
+                self.confirmed = True
+                self.fill()
+            else:
+                logger.info("Chapter not fetched from its own URL, not prefetching chapters (%s)"%safe_url(url))
+                self.shutdown()
+
+    def shutdown(self):
+        with self.lock:
+            self.pending = []
+            for future in self.futures.values():
+                future.cancel()
+            self.futures = {}
+            if self.fetcher.do_request == self.watch_do_request:
+                self.fetcher.do_request = self.chain_do_request
+        ## don't wait on in-flight requests, results only go to cache.
+        self.executor.shutdown(wait=False)
@@ -35,6 +35,7 @@ from bs4 import BeautifulSoup, Tag
 from . import adapters
 from .configurable import Configuration
 from .exceptions import UnknownSite, FetchEmailFailed
+from .souputils import parse_html, DEFAULT_SOUP_PARSER
 
 def get_urls_from_page(url,configuration=None,normalize=False):
     if not configuration:
@@ -66,10 +67,9 @@ def get_urls_from_html(data,url=None,configuration=None,normalize=False,foremail
         # logger.debug("Using pre-made soup")
         soup = data
     else:
-        ## soup and re-soup because BS4/html5lib is more forgiving of
-        ## incorrectly nested tags that way.
-        # logger.debug("dbl souping")
-        soup = BeautifulSoup(unicode(BeautifulSoup(data,"html5lib")),"html5lib")
+        ## html5lib gives the same soup as soup and re-soup, see
+        ## parse_html().
+        soup = parse_html(data,configuration.getConfig('html_parser') or DEFAULT_SOUP_PARSER)
 
     for a in soup.findAll('a'):
         if a.has_attr('href'):
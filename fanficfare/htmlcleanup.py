@@ -62,6 +62,56 @@ def _replaceNumberEntities(data):
     p = re.compile(r'&#(x[0-9a-fA-F]{,4}|[0-9]{,5})([0-9a-fA-F]*?);')
     return p.sub(_unirepl, data)
 
+_numeric_amp_lt_gt_re = re.compile(r'&#0*(38|60|62);')
+_numeric_amp_lt_gt = { '38':'&amp;', '60':'&lt;', '62':'&gt;' }
+def _numeric_amp_lt_gt_repl(match):
+    return _numeric_amp_lt_gt[match.group(1)]
+
+def _findEntityName(data, start, order, after):
+    # longest name in order, after index after, at data[start:].  In
+    # the reverse sorted order, that's the first to match.
+    match = _entity_name_re.match(data, start)
+    if not match:
+        return None
+    (name, semi) = match.groups()
+    if semi and order.get(name+semi, -1) > after:
+        return name+semi
+    for end in range(len(name), 0, -1):
+        if order.get(name[:end], -1) > after:
+            return name[:end]
+    return None
+
+def _replaceNamedEntities(data, space_only=False):
+    # This was a text.replace() for each of entities in reverse
+    # sorted order, ~350 passes over the whole text.  Reverse sorted
+    # puts entities with ; before the same one without, and longer
+    # before shorter, so that's the longest matching name at each &.
+    # &amp; etc. make a new & that names replaced after it can still
+    # match: &amp;lt; -> &lt; -> <, but &amp;amp; -> &amp -> &;
+    if space_only:
+        order = _space_entity_order
+    else:
+        order = _entity_order
+    retval = []
+    pos = 0
+    amp = data.find('&')
+    while amp >= 0:
+        retval.append(data[pos:amp])
+        pos = amp+1
+        value = '&'
+        after = -1
+        while value == '&':
+            name = _findEntityName(data, pos, order, after)
+            if name is None:
+                break
+            value = _entity_values[name]
+            pos += len(name)
+            after = order[name]
+        retval.append(value)
+        amp = data.find('&', pos)
+    retval.append(data[pos:])
+    return u''.join(retval)
+
 def _replaceNotEntities(data):
     # not just \w or \S.  regexp from c:\Python25\lib\sgmllib.py
     # (or equiv), SGMLParser, entityref
@@ -113,25 +163,13 @@ def removeEntities(text, space_only=False, remove_all_entities=False):
     text = t
     # replace numeric versions of [&<>] with named versions,
     # then replace named versions with actual characters,
-    text = re.sub(r'&#0*38;','&amp;',text)
-    text = re.sub(r'&#0*60;','&lt;',text)
-    text = re.sub(r'&#0*62;','&gt;',text)
+    text = _numeric_amp_lt_gt_re.sub(_numeric_amp_lt_gt_repl,text)
 
     # replace remaining &#000; entities with unicode value, such as &#039; -> '
     text = _replaceNumberEntities(text)
 
     # replace several named entities with character, such as &mdash; -> -
-    # reverse sort will put entities with ; before the same one without, when valid.
-    for e in reversed(sorted(entities.keys())):
-        v = entities[e]
-        if space_only and re.match(r"^[^\s]$", v, re.UNICODE | re.S):
-            # if not space
-            continue
-        try:
-            text = text.replace(e, v)
-        except UnicodeDecodeError as ex:
-            # for the pound symbol
-            text = text.replace(e, v.decode('utf-8'))
+    text = _replaceNamedEntities(text, space_only)
 
     # SGMLParser, and in turn, BeautifulStoneSoup doesn't parse
     # entities terribly well and inserts (;) after something that
@@ -562,3 +600,18 @@ entities = { '&aacute;' : 'á',
          '&zwj;' : '‍',  # strange spacing control character, not just a space
          '&zwnj;' : '‌',  # strange spacing control character, not just a space
          }
+
+def _entity_value(value):
+    if not isinstance(value,unicode):
+        # for the pound symbol
+        value = value.decode('utf-8')
+    return value
+# without the &
+_entity_values = dict( (e[1:], _entity_value(v)) for (e, v) in entities.items() )
+_entity_name_re = re.compile(r'([a-zA-Z0-9]{1,%d})(;?)'%max( len(e) for e in _entity_values ))
+
+# name -> place in reverse sorted order.
+_entity_order = dict( (e, i) for (i, e) in enumerate(sorted(_entity_values.keys(), reverse=True)) )
+# space_only
+_space_entity_order = dict( (e, i) for (e, i) in _entity_order.items()
+                            if not re.match(r"^[^\s]$", _entity_values[e], re.UNICODE | re.S) )
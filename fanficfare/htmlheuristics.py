@@ -25,7 +25,8 @@ import bs4 as bs
 from .six import text_type as unicode
 from .six.moves import range
 
-from . import HtmlTagStack as stack
+from .HtmlTagStack import HtmlTagStack, get_tag_name
+from .souputils import is_unstable_tag, is_unstable_string
 
 def logdebug(s):
     # uncomment for debug output
@@ -34,6 +35,11 @@ def logdebug(s):
 
 was_run_marker=u'FFF_replace_br_with_p_has_been_run'
 def replace_br_with_p(body):
+    '''
+    Returns chapter HTML body with <br> paragraph breaks replaced
+    by <p> tags.  Keeps no state between calls, so it can be called
+    from several threads or processes at once.
+    '''
     if was_run_marker in body:
         # logger.debug("replace_br_with_p previously applied, skipping.")
         return body
@@ -80,15 +86,16 @@ def replace_br_with_p(body):
         # body = re.sub(r'<blockquote([^>]*)>(.+?)</blockquote>', r'<blockquote\1><p>\2</p></blockquote>', body, re.DOTALL)
     # end aggressive mode
 
-    blocks = blocksRegex.finditer(body)
-    # For our replacements to work, we need to work backwards, so we reverse the iterator.
-    blocksList = []
-    for match in blocks:
-        blocksList.insert(0, match)
-
-    for match in blocksList:
-        group4 =  match.group(4).replace(u'<br />', u'{br /}')
-        body = body[:match.start(4)] + group4 + body[match.end(4):]
+    # shield the break tags inside the blocks, joining the pieces
+    # once instead of copying body for each block.
+    parts = []
+    pos = 0
+    for match in blocksRegex.finditer(body):
+        parts.append(body[pos:match.start(4)])
+        parts.append(match.group(4).replace(u'<br />', u'{br /}'))
+        pos = match.end(4)
+    parts.append(body[pos:])
+    body = u''.join(parts)
 
     # change surrounding div to a p and remove attrs Top surrounding
     # tag in all cases now should be div, to just strip the first and
@@ -269,9 +276,6 @@ def is_valid_block(block):
     return unicode(block).find('<') == 0 and unicode(block).find('<!') != 0
 
 def soup_up_div(body):
-    blockTags = ['address', 'aside', 'blockquote', 'del', 'div', 'dl', 'fieldset', 'form', 'ins', 'noscript', 'ol', 'p', 'pre', 'table', 'ul']
-    recurseTags = ['blockquote', 'div', 'noscript']
-
     tag = body[:body.index('>')+1]
     tagend = body[body.rindex('<'):]
 
@@ -281,42 +285,97 @@ def soup_up_div(body):
     # don't already have them.  This way we have just the div.
     soup = bs.BeautifulSoup('<div id="soup_up_div">'+body+'</div>','html5lib').find('div',id="soup_up_div")
 
+    return tag + soup_up_contents(soup.contents[0], find_unstable_blocks(soup)) + tagend
+
+def find_unstable_blocks(soup):
+    '''
+    ids of the tags in soup that parsing their HTML again could give
+    different contents, see souputils.needs_resoup().  Also tags
+    around where the next_element/previous_element links don't follow
+    .contents, which bs4's html5lib builder can leave after moving
+    misnested formatting tags.  unicode() of tags there follows the
+    links and can lose text, the same as it did before the parse.
+    '''
+    unstable = set()
+    def add_parents(node):
+        parent = node.parent
+        while parent is not None and id(parent) not in unstable:
+            unstable.add(id(parent))
+            parent = parent.parent
+    # walk by .contents, not find_all(), which follows the links.
+    prev_element = soup
+    stack = [iter(soup.contents)]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+        if node.previous_element is not prev_element or prev_element.next_element is not node:
+            add_parents(node)
+            add_parents(prev_element)
+        prev_element = node
+        if isinstance(node,bs.Tag):
+            if is_unstable_tag(node):
+                add_parents(node)
+            prev = None
+            for child in node.contents:
+                if not isinstance(child,bs.Tag) and is_unstable_string(child,prev):
+                    add_parents(child)
+                prev = child
+            stack.append(iter(node.contents))
+    return unstable
+
+def soup_up_block(block, unstable):
+    # Nested blocks used to be soup_up_div(unicode(block)), another
+    # html5lib parse of each, deeper blocks again for every level.
+    # Only needed when that parse would change the block.
+    if id(block) in unstable:
+        return soup_up_div(unicode(block))
+    # the start tag only.
+    tag = unicode(bs.Tag(name=block.name, attrs=dict(block.attrs)))
+    tag = tag[:tag.index('>')+1]
+    return tag + soup_up_contents(block, unstable) + u'</%s>'%block.name
+
+def soup_up_contents(element, unstable):
+    blockTags = ['address', 'aside', 'blockquote', 'del', 'div', 'dl', 'fieldset', 'form', 'ins', 'noscript', 'ol', 'p', 'pre', 'table', 'ul']
+    recurseTags = ['blockquote', 'div', 'noscript']
+
     body = u''
     lastElement = 1 # 1 = block, 2 = nested, 3 = invalid
 
-    for i in soup.contents[0]:
-        if unicode(i).strip().__len__() > 0:
-            s = unicode(i)
-            if  type(i) == bs.Tag:
-                if  i.name in blockTags:
-                    if lastElement > 1:
-                        body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
-                        body += u'{/p}'
-
-                    lastElement = 1
+    for i in element:
+        if  type(i) == bs.Tag:
+            if  i.name in blockTags:
+                if lastElement > 1:
+                    body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
+                    body += u'{/p}'
 
-                    if i.name in recurseTags:
-                        s = soup_up_div(s)
+                lastElement = 1
 
-                    body += s.strip() + '\n'
+                if i.name in recurseTags:
+                    s = soup_up_block(i, unstable)
                 else:
-                    if lastElement == 1:
-                        body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
-                        body += u'{p}'
-
-                    lastElement = 2
-                    body += s
-            elif type(i) == bs.Comment:
-                #body += s
-                # skip comments because '<!-- text -->' becomes just 'text'
-                pass
+                    s = unicode(i)
+
+                body += s.strip() + '\n'
             else:
                 if lastElement == 1:
                     body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
                     body += u'{p}'
 
-                lastElement = 3
-                body += s
+                lastElement = 2
+                body += unicode(i)
+        elif type(i) == bs.Comment:
+            #body += s
+            # skip comments because '<!-- text -->' becomes just 'text'
+            pass
+        elif unicode(i).strip().__len__() > 0:
+            if lastElement == 1:
+                body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
+                body += u'{p}'
+
+            lastElement = 3
+            body += unicode(i)
 
     if lastElement > 1:
         body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
@@ -324,7 +383,7 @@ def soup_up_div(body):
 
     body = body.replace(u'[br /]', u'<br />')
 
-    return tag + body + tagend
+    return body
 
 
 def is_end_tag(tag):
@@ -339,11 +398,12 @@ def is_closed_tag(tag):
 def tag_sanitizer(html):
     blockTags = ['address', 'blockquote', 'del', 'div', 'dl', 'fieldset', 'form', 'ins', 'noscript', 'ol', 'pre', 'table', 'ul']
 
-    body = u''
+    stack = HtmlTagStack()
+    body = []
     tags = re.findall(r'(<[^>]+>)([^<]*)', html)
 
     for rTag in tags:
-        name = stack.get_tag_name(rTag[0])
+        name = get_tag_name(rTag[0])
         is_end = is_end_tag(rTag[0])
         is_closed = is_closed_tag(rTag[0]) or is_comment_tag(rTag[0])
 
@@ -352,34 +412,32 @@ def tag_sanitizer(html):
         # logdebug(u'> %s%s\n'%(rTag[0], rTag[1]))
 
         if name in blockTags:
-            body += rTag[0]
-            body += rTag[1]
+            body.append(rTag[0])
+            body.append(rTag[1])
         elif name == u'p':
             if is_end:
-                body += stack.spool_end()
-                body += rTag[0]
-                body += rTag[1]
+                body.append(stack.spool_end())
+                body.append(rTag[0])
+                body.append(rTag[1])
             elif is_closed:
-                body += rTag[0]
-                body += rTag[1]
+                body.append(rTag[0])
+                body.append(rTag[1])
             else:
-                body += rTag[0]
-                body += stack.spool_start()
-                body += rTag[1]
+                body.append(rTag[0])
+                body.append(stack.spool_start())
+                body.append(rTag[1])
         else:
             if is_end:
                 t = stack.get_last()
-                tn = stack.get_tag_name(t)
-                rTn = stack.get_tag_name(rTag[0])
-                if tn == rTn:
-                    body += rTag[0]
+                tn = get_tag_name(t)
+                if tn == name:
+                    body.append(rTag[0])
                     stack.pop()
             elif not is_closed:
                 stack.push(rTag[0])
-                body += rTag[0]
+                body.append(rTag[0])
             else:
-                body += rTag[0]
+                body.append(rTag[0])
 
-            body += rTag[1]
-    stack.flush()
-    return body
+            body.append(rTag[1])
+    return u''.join(body)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import absolute_import
+import logging
+logger = logging.getLogger(__name__)
+
+from bs4 import BeautifulSoup, Tag, NavigableString, FeatureNotFound
+
+# py2 vs py3 transition
+from .six import text_type as unicode
+
+## html_parser setting values.  html5lib (pure python) is the
+## default and the most forgiving, lxml is much faster but optional.
+SOUP_PARSERS = ('html5lib','lxml','html.parser')
+DEFAULT_SOUP_PARSER = 'html5lib'
+
+## Used to soup and re-soup with html5lib because it's more forgiving
+## of incorrectly nested tags that way.  The second parse only changes
+## the tree when the first left nesting the HTML parsing rules
+## wouldn't produce from its own output--block tags left inside a
+## <p>, <a> in <a>, <form> in <form>, etc.  Those are found with
+## one walk of the tree and only those pages are parsed again.
+
+## Tags that close an open <p> (html5 'in body' start tag rules).
+CLOSES_P = frozenset(['address','article','aside','blockquote','center',
+                      'details','dialog','dir','div','dl','fieldset',
+                      'figcaption','figure','footer','header','hgroup',
+                      'main','menu','nav','ol','p','search','section',
+                      'summary','ul','h1','h2','h3','h4','h5','h6','pre',
+                      'listing','form','plaintext','table','hr','xmp',
+                      'li','dd','dt'])
+HEADINGS = frozenset(['h1','h2','h3','h4','h5','h6'])
+
+## scope boundaries for the html5 'has an element in scope' checks.
+SCOPE = frozenset(['applet','caption','html','table','td','th','marquee',
+                   'object','template','math','svg'])
+BUTTON_SCOPE = SCOPE | frozenset(['button'])
+
+## markers in the list of active formatting elements.
+FORMATTING_MARKERS = frozenset(['applet','object','marquee','template',
+                                'td','th','caption','button'])
+
+## html5 'special' elements, except address, div and p--where the <li>
+## and <dd>/<dt> start tag rules stop looking.
+LIST_ITEM_STOP = frozenset(['applet','area','article','aside','base',
+                            'basefont','bgsound','blockquote','body','br',
+                            'button','caption','center','col','colgroup',
+                            'details','dir','dl','embed','fieldset',
+                            'figcaption','figure','footer','form','frame',
+                            'frameset','h1','h2','h3','h4','h5','h6',
+                            'head','header','hgroup','hr','html','iframe',
+                            'img','input','keygen','link','listing','main',
+                            'marquee','menu','meta','nav','noembed',
+                            'noframes','noscript','object','ol','param',
+                            'plaintext','pre','script','search','section',
+                            'select','source','style','summary','table',
+                            'tbody','td','template','textarea','tfoot',
+                            'th','thead','title','tr','track','ul','wbr',
+                            'xmp'])
+
+## allowed parents of table parts.
+TABLE_PARENTS = {
+    'caption':('table',),
+    'colgroup':('table',),
+    'col':('colgroup',),
+    'thead':('table',),
+    'tbody':('table',),
+    'tfoot':('table',),
+    'tr':('thead','tbody','tfoot'),
+    'td':('tr',),
+    'th':('tr',),
+    }
+TABLE_CONTAINERS = frozenset(['table','thead','tbody','tfoot','tr'])
+## allowed children of TABLE_CONTAINERS other than table parts.
+TABLE_ALLOWED = frozenset(['script','style','template'])
+
+HEAD_ALLOWED = frozenset(['base','basefont','bgsound','link','meta','title',
+                          'noscript','noframes','style','script','template'])
+
+## text only elements whose text bs4 escapes, so &, < and > don't
+## read back the same.  (script and style aren't escaped.)
+RAW_TEXT = frozenset(['xmp','iframe','noembed','noframes','plaintext'])
+TEXT_ONLY = RAW_TEXT | frozenset(['script','style','textarea','title'])
+LEADING_NEWLINE = frozenset(['pre','listing','textarea'])
+## foreign content, framesets, template and plaintext (end tags after
+## it are text), rare in stories, always re-soup.
+ALWAYS_RESOUP = frozenset(['svg','math','frameset','frame','image','isindex',
+                           'template','plaintext'])
+
+def find_ancestor(tag,names,stop):
+    parent = tag.parent
+    while isinstance(parent,Tag) and parent.name not in stop:
+        if parent.name in names:
+            return parent
+        parent = parent.parent
+    return None
+
+def parent_name(tag):
+    parent = tag.parent
+    return parent.name if isinstance(parent,Tag) else None
+
+def is_unstable_tag(tag):
+    name = tag.name
+    if name in ALWAYS_RESOUP:
+        return True
+    if name in CLOSES_P and find_ancestor(tag,('p',),BUTTON_SCOPE):
+        return True
+    parent = parent_name(tag)
+    if parent in TEXT_ONLY:
+        return True
+    if name in HEADINGS and parent in HEADINGS:
+        return True
+    if name == 'li' and find_ancestor(tag,('li',),LIST_ITEM_STOP):
+        return True
+    if name in ('dd','dt') and find_ancestor(tag,('dd','dt'),LIST_ITEM_STOP):
+        return True
+    if name == 'a' and find_ancestor(tag,('a',),FORMATTING_MARKERS):
+        return True
+    if name == 'nobr' and find_ancestor(tag,('nobr',),SCOPE):
+        return True
+    if name == 'button' and find_ancestor(tag,('button',),SCOPE):
+        return True
+    if name == 'form' and find_ancestor(tag,('form',),('template',)):
+        return True
+    if name in ('select','input','keygen','textarea') and find_ancestor(tag,('select',),()):
+        return True
+    if name in ('option','optgroup') and parent in ('option','optgroup'):
+        return True
+    if name in TABLE_PARENTS:
+        if parent not in TABLE_PARENTS[name]:
+            return True
+    elif parent in TABLE_CONTAINERS and name not in TABLE_ALLOWED:
+        ## would be foster parented out of the table.
+        if not (name == 'input' and tag.get('type','').lower() == 'hidden'):
+            return True
+    if parent == 'head' and name not in HEAD_ALLOWED:
+        return True
+    if name == 'html' and parent != '[document]':
+        return True
+    if name in ('head','body') and parent != 'html':
+        return True
+    return False
+
+def is_unstable_string(s,prev):
+    parent = parent_name(s)
+    if type(s) is NavigableString:
+        if type(prev) is NavigableString:
+            ## re-parse merges adjacent text.
+            return True
+        if parent in TABLE_CONTAINERS or parent in ('head','html'):
+            if s.strip():
+                return True
+        if parent in RAW_TEXT and ('&' in s or '<' in s or '>' in s):
+            return True
+        if parent in LEADING_NEWLINE and s.startswith('\n') and prev is None:
+            return True
+    return False
+
+def needs_resoup(soup):
+    '''
+    True if parsing unicode(soup) again with html5lib could give a
+    different tree.  False positives only cost a second parse.
+    '''
+    for tag in soup.find_all(True):
+        if is_unstable_tag(tag):
+            return True
+        prev = None
+        for child in tag.contents:
+            if not isinstance(child,Tag) and is_unstable_string(child,prev):
+                return True
+            prev = child
+    return False
+
+def parse_html(data,parser=DEFAULT_SOUP_PARSER):
+    '''
+    Returns a bs4 soup of data parsed with parser (one of
+    SOUP_PARSERS).  html5lib gives the same tree as the old soup and
+    re-soup, lxml and html.parser are parsed once as they are.
+    '''
+    if parser not in SOUP_PARSERS:
+        logger.warning("Unknown html_parser(%s), using %s"%(parser,DEFAULT_SOUP_PARSER))
+        parser = DEFAULT_SOUP_PARSER
+    try:
+        soup = BeautifulSoup(data,parser)
+    except FeatureNotFound:
+        logger.warning("html_parser(%s) not installed, using %s"%(parser,DEFAULT_SOUP_PARSER))
+        parser = DEFAULT_SOUP_PARSER
+        soup = BeautifulSoup(data,parser)
+    if parser == 'html5lib' and needs_resoup(soup):
+        soup = BeautifulSoup(unicode(soup),parser)
+    return soup
@@ -753,11 +753,13 @@ class Story(Requestable):
                                                self.getConfigList)
             def get_request_raw(url,
                                 referer=None,
-                                usecache=True): ## referer is used with raw for images.
+                                usecache=True,
+                                image=False): ## referer is used with raw for images.
                 return fetcher.get_request_redirected(
                     url,
                     referer=referer,
-                    usecache=usecache)[0]
+                    usecache=usecache,
+                    image=image)[0]
             self.direct_fetcher = get_request_raw
 
     def prepare_replacements(self):
@@ -1634,7 +1636,16 @@ class Story(Requestable):
                                   url) ):
                         refererurl = url
                         logger.debug("Use Referer:%s"%refererurl)
-                    imgdata = fetch(imgurl,referer=refererurl)
+                    imgdata = fetch(imgurl,referer=refererurl,image=True)
+
+                    ## streamed fetches stop early, this catches
+                    ## caches and other fetchers.
+                    try:
+                        max_bytes = int(self.getConfig('max_image_bytes') or 0)
+                    except ValueError:
+                        max_bytes = 0
+                    if max_bytes and len(imgdata) > max_bytes:
+                        raise exceptions.RejectImage("Image size %s over max_image_bytes(%s)"%(len(imgdata),max_bytes))
 
                 if self.no_image_processing(imgurl):
                     (data,ext,mime) = no_convert_image(imgurl,
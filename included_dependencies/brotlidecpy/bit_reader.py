@@ -4,7 +4,12 @@
 
 
 class BrotliBitReader:
-    """Wrap a bytes buffer to enable reading 0 < n <=24 bits at a time, or transfer of arbitrary number of bytes"""
+    """Wrap a bytes buffer to enable reading 0 < n <=24 bits at a time, or transfer of arbitrary number of bytes
+
+    Bits are taken from an integer bit buffer (val_) that is refilled 8 bytes at a time, instead of being assembled
+    from the input one byte at a time for every read. The hot loops in decode.py copy val_, bit_count_ and pos_ into
+    local variables and do the same refill themselves.
+    """
 
     kBitMask = [
         0x000000, 0x000001, 0x000003, 0x000007, 0x00000f, 0x00001f, 0x00003f, 0x00007f,
@@ -14,15 +19,25 @@ class BrotliBitReader:
     ]
 
     def __init__(self, input_buffer):
-        self.buf_ = bytearray(input_buffer)
-        self.buf_len_ = len(input_buffer)
-        self.pos_ = 0          # byte position in stream
-        self.bit_pos_ = 0      # current bit-reading position in current byte (number bits already read from byte, 0-7)
+        self.buf_ = bytes(input_buffer)
+        self.buf_len_ = len(self.buf_)
+        self.pos_ = 0          # position in input of next byte to load into val_
+        self.val_ = 0          # bits loaded but not yet read, next bit is the lowest
+        self.bit_count_ = 0    # number of bits in val_
 
     def reset(self):
         """Reset an initialized BrotliBitReader to start of input buffer"""
         self.pos_ = 0
-        self.bit_pos_ = 0
+        self.val_ = 0
+        self.bit_count_ = 0
+
+    def fill(self):
+        """Load the next 8 bytes into the bit buffer. Past the end of input this loads zeros, which simulates zero
+        padding after the end, which is correct"""
+        pos = self.pos_
+        self.val_ |= int.from_bytes(self.buf_[pos:pos + 8], 'little') << self.bit_count_
+        self.bit_count_ += 64
+        self.pos_ = pos + 8
 
     def read_bits(self, n_bits, bits_to_skip=None):
         """Get n_bits unsigned integer treating input as little-endian byte stream, maybe advancing input buffer pointer
@@ -32,31 +47,25 @@ class BrotliBitReader:
         It is ok to have n_bits and bits_to_skip be different non-zero values if that is what is wanted
         Returns: the next n_bits from the buffer as a little-endian integer, 0 if n_bits is None or 0
         """
-        val = 0
         if bits_to_skip is None:
             bits_to_skip = n_bits
-        if n_bits:
-            bytes_shift = 0
-            buf_pos = self.pos_
-            bit_pos_when_done = n_bits + self.bit_pos_
-            while bytes_shift < bit_pos_when_done:
-                if buf_pos >= self.buf_len_:
-                    break  # if hit end of buffer, this simulates zero padding after end, which is correct
-                val |= self.buf_[buf_pos] << bytes_shift
-                bytes_shift += 8
-                buf_pos += 1
-            val = (val >> self.bit_pos_) & self.kBitMask[n_bits]
+        needed = n_bits or 0
+        if bits_to_skip and bits_to_skip > needed:
+            needed = bits_to_skip
+        while self.bit_count_ < needed:
+            self.fill()
+        val = self.val_ & self.kBitMask[n_bits] if n_bits else 0
         if bits_to_skip:
-            next_in_bits = self.bit_pos_ + bits_to_skip
-            self.bit_pos_ = next_in_bits & 7
-            self.pos_ += next_in_bits >> 3
+            self.val_ >>= bits_to_skip
+            self.bit_count_ -= bits_to_skip
         return val
 
     def copy_bytes(self, dest_buffer, dest_pos, n_bytes):
         """Copy bytes from input buffer. This will first skip to next byte boundary if not already on one"""
-        if self.bit_pos_ != 0:
-            self.bit_pos_ = 0
-            self.pos_ += 1
+        # drop the bits left in the current byte, then go back to reading the input directly
+        self.pos_ -= (self.bit_count_ >> 3)
+        self.val_ = 0
+        self.bit_count_ = 0
         if n_bytes > 0:  # call with n_bytes == 0 to just skip to next byte boundary
             new_pos = self.pos_ + n_bytes
             memoryview(dest_buffer)[dest_pos:dest_pos+n_bytes] = self.buf_[self.pos_:new_pos]
@@ -104,16 +104,22 @@ def decode_meta_block_length(br):
 
 
 def read_symbol(table, index, br):
-    """Decodes the next Huffman code from bit-stream. table is array of nodes in a huffman tree, index points to root"""
-    x_bits = br.read_bits(16, 0)  # The C reference version assumes 15 is the max needed and uses 16 in this function
-    index += (x_bits & HUFFMAN_TABLE_MASK)
-    nbits = table[index].bits - HUFFMAN_TABLE_BITS
-    skip = 0
+    """Decodes the next Huffman code from bit-stream. table is array of nodes in a huffman tree, index points to root
+    The same is done inline in the literal loop of brotli_decompress_buffer"""
+    if br.bit_count_ < 16:  # The C reference version assumes 15 is the max needed and uses 16 in this function
+        br.fill()
+    x_bits = br.val_
+    entry = table[index + (x_bits & HUFFMAN_TABLE_MASK)]
+    nbits = (entry & 0xff) - HUFFMAN_TABLE_BITS
     if nbits > 0:
-        skip = HUFFMAN_TABLE_BITS
-        index += table[index].value + ((x_bits >> HUFFMAN_TABLE_BITS) & br.kBitMask[nbits])
-    br.read_bits(None, skip + table[index].bits)
-    return table[index].value
+        entry = table[index + (x_bits & HUFFMAN_TABLE_MASK) + (entry >> 8) +
+                      ((x_bits >> HUFFMAN_TABLE_BITS) & ((1 << nbits) - 1))]
+        skip = HUFFMAN_TABLE_BITS + (entry & 0xff)
+    else:
+        skip = entry & 0xff
+    br.val_ = x_bits >> skip
+    br.bit_count_ -= skip
+    return entry >> 8
 
 
 def read_huffman_code_lengths(code_length_code_lengths, num_symbols, code_lengths, br):
@@ -123,15 +129,14 @@ def read_huffman_code_lengths(code_length_code_lengths, num_symbols, code_length
     repeat_code_len = 0
     space = 32768
 
-    table = [HuffmanCode(0, 0) for _ in range(0, 32)]
+    table = [HuffmanCode(0, 0)] * 32
 
     brotli_build_huffman_table(table, 0, 5, code_length_code_lengths, CODE_LENGTH_CODES)
 
     while (symbol < num_symbols) and (space > 0):
-        p = 0
-        p += br.read_bits(5, 0)
-        br.read_bits(None, table[p].bits)
-        code_len = table[p].value & 0xff
+        p = br.read_bits(5, 0)
+        br.read_bits(None, table[p] & 0xff)
+        code_len = (table[p] >> 8) & 0xff
         if code_len < kCodeLengthRepeatCode:
             repeat = 0
             code_lengths[symbol] = code_len
@@ -222,10 +227,9 @@ def read_huffman_code(alphabet_size, tables, table, br):
             if space <= 0:
                 break
             code_len_idx = kCodeLengthCodeOrder[i]
-            p = 0
-            p += br.read_bits(4, 0)
-            br.read_bits(None, huff[p].bits)
-            v = huff[p].value
+            p = br.read_bits(4, 0)
+            br.read_bits(None, huff[p] & 0xff)
+            v = huff[p] >> 8
             code_length_code_lengths[code_len_idx] = v
             if v != 0:
                 space -= (32 >> v)
@@ -302,7 +306,7 @@ class DecodeContextMap:
         if use_rle_for_zeros:
             max_run_length_prefix = br.read_bits(4) + 1
 
-        table = [HuffmanCode(0, 0) for _ in range(0, HUFFMAN_MAX_TABLE_SIZE)]
+        table = [HuffmanCode(0, 0)] * HUFFMAN_MAX_TABLE_SIZE
 
         read_huffman_code(self.num_huff_trees + max_run_length_prefix, table, 0, br)
 
@@ -367,8 +371,8 @@ def brotli_decompress_buffer(input_buffer):
     window_bits = decode_window_bits(br)
     max_backward_distance = (1 << window_bits) - 16
 
-    block_type_trees = [HuffmanCode(0, 0) for _ in range(0, 3 * HUFFMAN_MAX_TABLE_SIZE)]
-    block_len_trees = [HuffmanCode(0, 0) for _ in range(0, 3 * HUFFMAN_MAX_TABLE_SIZE)]
+    block_type_trees = [HuffmanCode(0, 0)] * (3 * HUFFMAN_MAX_TABLE_SIZE)
+    block_len_trees = [HuffmanCode(0, 0)] * (3 * HUFFMAN_MAX_TABLE_SIZE)
 
     while not input_end:
         block_length = [1 << 28, 1 << 28, 1 << 28]
@@ -440,10 +444,14 @@ def brotli_decompress_buffer(input_buffer):
 
         context_map_slice = 0
         dist_context_map_slice = 0
+        context_lookup = Context.lookup
+        lookup_offsets = Context.lookupOffsets
         context_mode = context_modes[block_type[0]]
-        context_lookup_offset1 = Context.lookupOffsets[context_mode]
-        context_lookup_offset2 = Context.lookupOffsets[context_mode + 1]
+        context_lookup_offset1 = lookup_offsets[context_mode]
+        context_lookup_offset2 = lookup_offsets[context_mode + 1]
         huff_tree_command = hgroup[1].huff_trees[0]
+        literal_codes = hgroup[0].codes
+        literal_trees = hgroup[0].huff_trees
 
         while meta_block_remaining_len > 0:
 
@@ -465,26 +473,53 @@ def brotli_decompress_buffer(input_buffer):
                 kInsertLengthPrefixCode[insert_code].nbits)
             copy_length = kCopyLengthPrefixCode[copy_code].offset + br.read_bits(
                 kCopyLengthPrefixCode[copy_code].nbits)
-            prev_byte1 = output_buffer[pos - 1] if pos > 0 else 0
-            prev_byte2 = output_buffer[pos - 2] if pos > 1 else 0
-            for j in range(0, insert_length):
-                if block_length[0] == 0:
-                    decode_block_type(num_block_types[0], block_type_trees, 0, block_type, block_type_rb,
-                                      block_type_rb_index, br)
-                    block_length[0] = read_block_length(block_len_trees, 0, br)
-                    context_offset = block_type[0] << kLiteralContextBits
-                    context_map_slice = context_offset
-                    context_mode = context_modes[block_type[0]]
-                    context_lookup_offset1 = Context.lookupOffsets[context_mode]
-                    context_lookup_offset2 = Context.lookupOffsets[context_mode + 1]
-                context = Context.lookup[context_lookup_offset1 + prev_byte1] | Context.lookup[
-                    context_lookup_offset2 + prev_byte2]
-                literal_huff_tree_index = context_map[context_map_slice + context]
-                block_length[0] -= 1
-                prev_byte2 = prev_byte1
-                prev_byte1 = read_symbol(hgroup[0].codes, hgroup[0].huff_trees[literal_huff_tree_index], br)
-                output_buffer[pos] = prev_byte1
-                pos += 1
+            if insert_length:
+                prev_byte1 = output_buffer[pos - 1] if pos > 0 else 0
+                prev_byte2 = output_buffer[pos - 2] if pos > 1 else 0
+                # read_symbol() and the bit reader refill are inlined here with the bit reader state in locals,
+                # this loop decodes nearly every literal byte
+                bit_val = br.val_
+                bit_count = br.bit_count_
+                in_pos = br.pos_
+                in_buf = br.buf_
+                block_length0 = block_length[0]
+                for j in range(0, insert_length):
+                    if block_length0 == 0:
+                        br.val_, br.bit_count_, br.pos_ = bit_val, bit_count, in_pos
+                        decode_block_type(num_block_types[0], block_type_trees, 0, block_type, block_type_rb,
+                                          block_type_rb_index, br)
+                        block_length0 = read_block_length(block_len_trees, 0, br)
+                        bit_val, bit_count, in_pos = br.val_, br.bit_count_, br.pos_
+                        context_offset = block_type[0] << kLiteralContextBits
+                        context_map_slice = context_offset
+                        context_mode = context_modes[block_type[0]]
+                        context_lookup_offset1 = lookup_offsets[context_mode]
+                        context_lookup_offset2 = lookup_offsets[context_mode + 1]
+                    context = context_lookup[context_lookup_offset1 + prev_byte1] | context_lookup[
+                        context_lookup_offset2 + prev_byte2]
+                    index = literal_trees[context_map[context_map_slice + context]]
+                    block_length0 -= 1
+                    if bit_count < 16:
+                        bit_val |= int.from_bytes(in_buf[in_pos:in_pos + 8], 'little') << bit_count
+                        bit_count += 64
+                        in_pos += 8
+                    index += bit_val & HUFFMAN_TABLE_MASK
+                    entry = literal_codes[index]
+                    nbits = (entry & 0xff) - HUFFMAN_TABLE_BITS
+                    if nbits > 0:
+                        entry = literal_codes[index + (entry >> 8) +
+                                              ((bit_val >> HUFFMAN_TABLE_BITS) & ((1 << nbits) - 1))]
+                        skip = HUFFMAN_TABLE_BITS + (entry & 0xff)
+                    else:
+                        skip = entry & 0xff
+                    bit_val >>= skip
+                    bit_count -= skip
+                    prev_byte2 = prev_byte1
+                    prev_byte1 = entry >> 8
+                    output_buffer[pos] = prev_byte1
+                    pos += 1
+                br.val_, br.bit_count_, br.pos_ = bit_val, bit_count, in_pos
+                block_length[0] = block_length0
             meta_block_remaining_len -= insert_length
             if meta_block_remaining_len <= 0:
                 break
@@ -551,8 +586,13 @@ def brotli_decompress_buffer(input_buffer):
                     raise Exception("Invalid backward reference. pos: %s distance: %s len: %s bytes left: %s" % (
                         pos, distance, copy_length, meta_block_remaining_len))
 
-                for j in range(0, copy_length):  # don't try to optimize with a slice. source and dest may overlap
-                    output_buffer[pos] = output_buffer[pos - distance]
-                    pos += 1
-                    meta_block_remaining_len -= 1
+                copy_src = pos - distance
+                if distance >= copy_length:
+                    output_buffer[pos:pos + copy_length] = output_buffer[copy_src:copy_src + copy_length]
+                else:
+                    # source and dest overlap, the copy repeats the last distance bytes
+                    pattern = output_buffer[copy_src:pos]
+                    output_buffer[pos:pos + copy_length] = (pattern * (copy_length // distance + 1))[:copy_length]
+                pos += copy_length
+                meta_block_remaining_len -= copy_length
     return output_buffer
@@ -16,8 +16,7 @@ def _get_next_key(key, length):
 
 def _replicate_value(table, i, step, end, code):
     """Stores code in table[0], table[step], table[2*step], ..., table[end] Assumes end is integer multiple of step"""
-    for index in range(i+end-step, i - step, -step):
-        table[index] = HuffmanCode(code.bits, code.value)
+    table[i:i + end:step] = [code] * (end // step)
 
 
 def _next_table_bit_size(count, length, root_bits):
@@ -33,10 +32,15 @@ def _next_table_bit_size(count, length, root_bits):
     return length - root_bits
 
 
-class HuffmanCode:
-    def __init__(self, bits, value):
-        self.bits = bits  # number of bits used for this symbol
-        self.value = value  # symbol value or table offset
+def HuffmanCode(bits, value):
+    """Table entries are ints, (value << 8) | bits, instead of objects, saving an attribute lookup per symbol
+    bits: number of bits used for this symbol
+    value: symbol value or table offset"""
+    return (value << 8) | bits
+
+
+HUFFMAN_BITS_MASK = 0xff
+HUFFMAN_VALUE_SHIFT = 8
 
 
 def brotli_build_huffman_table(root_table, table, root_bits, code_lengths, code_lengths_size):
@@ -80,8 +84,7 @@ def brotli_build_huffman_table(root_table, table, root_bits, code_lengths, code_
 
     # special case code with only one value
     if offset[MAX_LENGTH] == 1:
-        for key in range(0, total_size):
-            root_table[table + key] = HuffmanCode(0, sorted_symbols[0] & 0xffff)
+        root_table[table:table + total_size] = [HuffmanCode(0, sorted_symbols[0] & 0xffff)] * total_size
         return total_size
 
     # fill in root table
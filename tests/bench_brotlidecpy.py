@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Benchmark of the bundled pure python brotlidecpy decoder against the
+C brotli module, which is also used to compress the corpus and to
+check brotlidecpy's output is identical.
+
+The corpus is the story pages saved in the test fixtures plus a
+longer generated chapter, each compressed at a few quality and window
+settings, like pages found in a browser cache.  Pass a directory to
+also include files from it (browser cache bodies, saved pages, etc).
+
+    python -m tests.bench_brotlidecpy [dir]
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+
+import brotli
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'included_dependencies'))
+import brotlidecpy
+
+from tests import fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom
+
+## (quality, lgwin)
+SETTINGS = [(1, 22), (5, 22), (9, 16), (11, 22)]
+
+def make_chapter(paragraphs=400):
+    random.seed(1)
+    words = ('the she he said looked back at door room Harry Hermione '
+             'wand castle night quietly never again because something '
+             'it was not what they had expected and yet').split()
+    paras = []
+    for _ in range(paragraphs):
+        paras.append('<p>%s.</p>' % ' '.join(random.choice(words) for _ in range(random.randint(10, 60))))
+    return ('<html><head><title>Chapter 1</title></head><body><div id="storytext">%s</div></body></html>'
+            % '\n'.join(paras)).encode('utf-8')
+
+def load_corpus(extra_dir=None):
+    pages = []
+    for module in (fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom):
+        for name in sorted(dir(module)):
+            value = getattr(module, name)
+            if isinstance(value, str) and len(value) > 1000:
+                pages.append(('%s.%s' % (module.__name__.split('.')[-1], name), value.encode('utf-8')))
+    pages.append(('generated_chapter', make_chapter()))
+    if extra_dir:
+        for name in sorted(os.listdir(extra_dir)):
+            with open(os.path.join(extra_dir, name), 'rb') as f:
+                pages.append((name, f.read()))
+    corpus = []
+    for (name, data) in pages:
+        for (quality, lgwin) in SETTINGS:
+            corpus.append(('%s q%s w%s' % (name, quality, lgwin), data,
+                           brotli.compress(data, quality=quality, lgwin=lgwin)))
+    return corpus
+
+def bench(fn, data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv):
+    corpus = load_corpus(argv[1] if len(argv) > 1 else None)
+    total_py = total_c = 0.0
+    total_bytes = 0
+    print('%-58s %9s %10s %10s %8s' % ('page', 'bytes', 'python ms', 'C ms', 'ratio'))
+    for (name, data, compressed) in corpus:
+        if bytes(brotlidecpy.decompress(compressed)) != data:
+            print('%s: brotlidecpy output differs' % name)
+            return 1
+        if brotli.decompress(compressed) != data:
+            print('%s: brotli output differs' % name)
+            return 1
+        py = bench(brotlidecpy.decompress, compressed, 3)
+        c = bench(brotli.decompress, compressed, 20)
+        total_py += py
+        total_c += c
+        total_bytes += len(data)
+        print('%-58s %9d %10.1f %10.3f %8.0f' % (name[:58], len(data), py*1000, c*1000, py/c))
+    print('%-58s %9d %10.1f %10.3f %8.0f' % ('total', total_bytes, total_py*1000, total_c*1000, total_py/total_c))
+    print('brotlidecpy: %.2f MB/s' % (total_bytes/total_py/1024/1024))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Microbenchmark of htmlcleanup.removeEntities() against the
+text.replace() per entity version it replaced (kept in
+tests/test_htmlcleanup.py), on the chapter pages saved in the test
+fixtures, a long generated chapter with entities and short metadata
+values.
+
+    python -m tests.bench_removeentities
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+import time
+import random
+
+from fanficfare.htmlcleanup import removeEntities
+
+from tests import fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom
+from tests.test_htmlcleanup import reference_removeEntities
+
+def make_chapter(paragraphs=1000):
+    random.seed(1)
+    words = ('the she he said looked back at door room wand castle night '
+             'quietly never again because &mdash; &hellip; &nbsp; &quot;yes&quot; '
+             'caf&eacute; &#8217;s AT&amp;T &rsquo; it was not what they').split()
+    return '\n'.join('<p>%s.</p>' % ' '.join(random.choice(words) for _ in range(random.randint(10, 60)))
+                     for _ in range(paragraphs))
+
+def load_corpus():
+    corpus = []
+    for module in (fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom):
+        for name in sorted(dir(module)):
+            value = getattr(module, name)
+            if isinstance(value, str) and len(value) > 1000:
+                corpus.append((name, [value]))
+    corpus.append(('generated_chapter', [make_chapter()]))
+    corpus.append(('1000 metadata values', [ 'Title &amp; Subtitle &mdash; Part %s' % i for i in range(1000) ]))
+    return corpus
+
+def bench(fn, texts, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(argv):
+    print('%-42s %9s %10s %10s %7s' % ('text', 'bytes', 'old ms', 'new ms', 'x'))
+    for (name, texts) in load_corpus():
+        for text in texts:
+            assert removeEntities(text) == reference_removeEntities(text)
+        old = bench(reference_removeEntities, texts)
+        new = bench(removeEntities, texts)
+        print('%-42s %9d %10.2f %10.2f %7.1f' % (name, sum(len(t) for t in texts), old*1000, new*1000, old/new))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
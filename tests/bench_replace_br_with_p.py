@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Benchmark of htmlheuristics.replace_br_with_p() scaling with chapter
+size and with how deeply the text is nested in <div>s, on generated
+single post forum chapters with <br> paragraphs, quotes and nested
+blocks.  Time per KB should stay about the same down each column and
+across each row.
+
+    python -m tests.bench_replace_br_with_p
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+import time
+import random
+
+from fanficfare.htmlheuristics import replace_br_with_p
+
+SIZES = (50000, 100000, 200000, 400000, 800000)
+DEPTHS = (0, 4, 8)
+
+WORDS = ('the she he said looked back at door room wand castle night '
+         'quietly never again because something it was not what they '
+         'had expected and yet [x] a&lt;b').split()
+
+def words(rand, n):
+    return ' '.join(rand.choice(WORDS) for _ in range(n))
+
+def make_chapter(size, depth=0):
+    rand = random.Random(size)
+    parts = []
+    length = 0
+    while length < size:
+        r = rand.random()
+        if r < 0.5:
+            part = words(rand, rand.randint(5,80)) + '<br />\n<br />\n'
+        elif r < 0.6:
+            part = '<b>%s</b> %s<br />' % (words(rand,3), words(rand,20))
+        elif r < 0.7:
+            part = '<div class="bbCodeBlock"><blockquote>%s<br />%s</blockquote></div>' % (words(rand,30), words(rand,10))
+        elif r < 0.75:
+            part = '<p>%s</p>' % words(rand,40)
+        elif r < 0.8:
+            part = '<hr />%s<br /><br /><br />' % words(rand,5)
+        elif r < 0.85:
+            part = '<i>%s &amp; %s</i><br />' % (words(rand,5), words(rand,5))
+        elif r < 0.9:
+            part = '<div><div>%s<br /><br />%s</div></div>' % (words(rand,20), words(rand,20))
+        else:
+            part = '<span class="u">%s</span> %s<br /><br />' % (words(rand,4), words(rand,30))
+        parts.append(part)
+        length += len(part)
+    return '<div>'*(depth+1) + ''.join(parts) + '</div>'*(depth+1)
+
+def main(argv):
+    print('%9s' % 'bytes' + ''.join('  %14s' % ('depth %s ms/KB' % depth) for depth in DEPTHS))
+    for size in SIZES:
+        row = '%9d' % size
+        for depth in DEPTHS:
+            html = make_chapter(size, depth)
+            start = time.perf_counter()
+            replace_br_with_p(html)
+            elapsed = time.perf_counter() - start
+            row += '  %14.3f' % (elapsed*1000/(len(html)/1000.0))
+        print(row)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
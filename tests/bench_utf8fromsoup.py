@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2026 FanFicFare team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Benchmark of BaseSiteAdapter.utf8FromSoup(), the chapter HTML
+cleanup, on long generated forum chapters (XenForo style threadmarks
+with many posts) and the chapter pages saved in the test fixtures.
+
+Settings are from fanficfare/defaults.ini, with include_images:false
+so no images are fetched.  Pass a directory to also write each
+chapter's output there, to compare before and after a change.
+
+    python -m tests.bench_utf8fromsoup [dir]
+'''
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import sys
+import time
+import random
+
+from fanficfare import adapters
+from fanficfare.configurable import Configuration
+
+from tests import fixtures_chireads, fixtures_fanfictionsfr
+
+URL = 'http://test1.com?sid=1'
+CHAPTER_URL = 'https://test1.com/threads/story.123/threadmarks'
+
+WORDS = ('the she he said looked back at door room wand castle night '
+         'quietly never again because something it was not what they '
+         'had expected and yet').split()
+
+def words(n):
+    return ' '.join(random.choice(WORDS) for _ in range(n))
+
+def make_post(i):
+    parts = []
+    for _ in range(random.randint(5,25)):
+        r = random.random()
+        if r < 0.15:
+            parts.append('<b>%s</b> %s'%(words(3),words(20)))
+        elif r < 0.3:
+            parts.append('<i>%s</i> <span style="color: #ff0000">%s</span>'%(words(10),words(5)))
+        elif r < 0.4:
+            parts.append('<u>%s</u> <a href="/threads/story.123/post-%s" class="link link--internal">%s</a>'%(words(4),i,words(2)))
+        elif r < 0.45:
+            parts.append('<div style="text-align: center"><b>%s</b></div>'%words(3))
+        elif r < 0.5:
+            parts.append('<blockquote class="bbCodeBlock bbCodeBlock--quote"><div class="bbCodeBlock-content"><div class="bbCodeBlock-expandContent">%s</div></div></blockquote>'%words(30))
+        elif r < 0.55:
+            parts.append('<span class="bbCodeInlineSpoiler"> </span><span><b> </b></span>')
+        elif r < 0.6:
+            parts.append('<a href="#post-%s">%s</a> <a href="https://example.com/x?y=%s">%s</a>'%(i-1,words(1),i,words(1)))
+        else:
+            parts.append(words(random.randint(20,80)))
+    return ('<article class="message message--post" data-author="author%s" id="js-post-%s">'
+            '<div class="message-inner"><div class="message-cell message-cell--main">'
+            '<div class="bbWrapper" id="post-%s">%s</div>'
+            '<script>var x=%s;</script></div></div></article>'
+            % (i%7, i, i, '<br />\n'.join(parts), i))
+
+def make_forum_chapter(posts):
+    random.seed(posts)
+    return ('<html><head><title>Story | Threadmarks</title></head><body>'
+            '<div class="block-body js-replyNewMessageContainer">%s</div></body></html>'
+            % '\n'.join(make_post(i) for i in range(posts)))
+
+def load_corpus():
+    corpus = [('forum_%s_posts'%posts, make_forum_chapter(posts)) for posts in (25,100,400)]
+    corpus.append(('chireads_chapter',fixtures_chireads.chireads_html_chapter_return))
+    corpus.append(('fanfictionsfr_chapter',fixtures_fanfictionsfr.fanfictionsfr_html_chapter_return))
+    return corpus
+
+def make_adapter():
+    configuration = Configuration(['test1.com'],'EPUB')
+    configuration.read(os.path.join(os.path.dirname(adapters.__file__),'..','defaults.ini'))
+    configuration.set('overrides','include_images','false')
+    return adapters.getAdapter(configuration,URL)
+
+def main(argv):
+    outdir = argv[1] if len(argv) > 1 else None
+    adapter = make_adapter()
+    total = 0.0
+    print('%-24s %9s %10s %10s'%('chapter','bytes','ms','out bytes'))
+    for (name, data) in load_corpus():
+        best = None
+        for _ in range(3):
+            soup = adapter.make_soup(data)
+            start = time.perf_counter()
+            text = adapter.utf8FromSoup(CHAPTER_URL,soup)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best,elapsed)
+        total += best
+        print('%-24s %9d %10.1f %10d'%(name,len(data),best*1000,len(text)))
+        if outdir:
+            with open(os.path.join(outdir,name+'.html'),'w') as f:
+                f.write(text)
+    print('%-24s %9s %10.1f'%('total','',total*1000))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
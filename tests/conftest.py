@@ -1,3 +1,26 @@
+import pytest
+
 from tests.fixtures_chireads import *
 from tests.fixtures_fanfictionsfr import *
 from tests.fixtures_wattpadcom import *
+
+class FakeClock(object):
+    '''
+    Stands in for the time module in the module under test:
+    monkeypatch.setattr(module,'time',clock).  sleep() just moves
+    the clock on.
+    '''
+    def __init__(self,now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self,secs):
+        self.slept.append(secs)
+        self.now += secs
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,54 @@
+import os
+import random
+import sys
+
+import pytest
+
+## appended, so the installed requests, urllib3, etc. other tests
+## use still come first.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'included_dependencies'))
+import brotlidecpy
+
+## The bundled pure python brotli decoder on known vectors and, when
+## the C brotli module is installed, on pages it compressed.
+
+VECTORS = [
+    ## from brotli's tests/testdata: empty, x, 10x10y.
+    (b'\x06', b''),
+    (b'\x0b\x00\x80\x58\x03', b'X'),
+    (b'\x1b\x13\x00\x00\xa4\xb0\xb2\xea\x81\x47\x02\x8a', b'XXXXXXXXXXYYYYYYYYYY'),
+    ## quality 11, static dictionary words and transforms.
+    (b'\x1bO\x00\xf8\x05\xb29\x95=|\xad\x89(\xec\xf9.?\xe8\x92\x92\x1c\x84R\x05@@\xa5{\xf0'
+     b'\x8c\x166\xe6\x14\x1d{\xcc[\xfb.:\xe6\x91y\xb7\x8b\xabX\xf2\xe2\xab\xfb\x17G\xe9\x18+\xc9',
+     b'ukko nooa, ukko nooa oli kunnon mies, kun han meni saunaan, pisti laukun naulaan'),
+    (b'\x1bE\x00\x80\x8d\x94\xa8\xe3[ \x83C\xd2)\x04x!\x0b^\x85\xbd\xc1\x06\x1c\xb0\xb7\xc0'
+     b'\xfe8\x00\r\x1e\xb2\x16~&\xa9\xa4\x91\xa3+\x14\xbftwc~\xe5\x0f\x1dl\x050Fc\x00',
+     b'The quick brown fox jumps over the lazy dog because the time was right'),
+    ]
+
+@pytest.mark.parametrize('compressed,expected', VECTORS)
+def test_known_vectors(compressed, expected):
+    assert bytes(brotlidecpy.decompress(compressed)) == expected
+
+def test_truncated():
+    with pytest.raises(Exception):
+        brotlidecpy.decompress(VECTORS[2][0][:7])
+
+def make_page():
+    random.seed(1)
+    words = ('the she he said looked back at door room wand castle night '
+             'quietly never again because something it was not what').split()
+    return ('<html><body>%s</body></html>' %
+            '\n'.join('<p>%s.</p>' % ' '.join(random.choice(words) for i in range(random.randint(10, 60)))
+                      for j in range(100))).encode('utf-8')
+
+## (quality, lgwin)
+@pytest.mark.parametrize('quality,lgwin', [(1, 22), (5, 16), (9, 18), (11, 22)])
+def test_matches_brotli(quality, lgwin):
+    brotli = pytest.importorskip('brotli')
+    random.seed(2)
+    for data in (make_page(),
+                 bytes(bytearray(random.getrandbits(8) for i in range(20000)))):
+        compressed = brotli.compress(data, quality=quality, lgwin=lgwin)
+        assert bytes(brotlidecpy.decompress(compressed)) == data
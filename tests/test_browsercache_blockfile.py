@@ -0,0 +1,69 @@
+import os
+import struct
+
+from fanficfare.browsercache.browsercache_blockfile import (
+    BlockFiles, INDEX_HEADER_SIZE, INDEX_TABLE_LEN_OFFSET)
+
+## BlockFiles map lifetimes: replaced maps are closed once no read
+## is using them, close() closes everything.
+
+def write_index(path, buckets):
+    header = bytearray(INDEX_HEADER_SIZE)
+    struct.pack_into('I', header, INDEX_TABLE_LEN_OFFSET, len(buckets))
+    with open(os.path.join(path,'index'),'wb') as f:
+        f.write(bytes(header) + struct.pack('%sI'%len(buckets), *buckets))
+
+def test_bucket_address(tmp_path):
+    write_index(str(tmp_path), [0x80000001, 0x80000002, 0, 0x80000004])
+    files = BlockFiles(str(tmp_path))
+    files.check_index()
+    assert files.bucket_address(1) == 0x80000002
+    assert files.bucket_address(7) == 0x80000004
+    files.close()
+
+def test_index_replaced(tmp_path):
+    write_index(str(tmp_path), [1, 2])
+    files = BlockFiles(str(tmp_path))
+    files.check_index()
+    old = files.get('index')
+    assert files.bucket_address(1) == 2
+    write_index(str(tmp_path), [1, 2, 3, 4])
+    files.check_index()
+    assert old.closed
+    assert files.bucket_address(3) == 4
+    files.close()
+
+def test_close_waits_for_readers(tmp_path):
+    write_index(str(tmp_path), [1, 2])
+    files = BlockFiles(str(tmp_path))
+    with files.reading():
+        m = files.get('index')
+        files.close()
+        ## still being read.
+        assert not m.closed
+        assert struct.unpack_from('I', m, INDEX_HEADER_SIZE)[0] == 1
+    assert m.closed
+    assert files.maps == {}
+    assert files.retired == []
+    ## mapped again when needed.
+    assert files.bucket_address(0) == 1
+    files.close()
+
+def test_remap_grown_file(tmp_path):
+    with open(os.path.join(str(tmp_path),'data_1'),'wb') as f:
+        f.write(b'a'*10)
+    files = BlockFiles(str(tmp_path))
+    old = files.get('data_1')
+    with open(os.path.join(str(tmp_path),'data_1'),'ab') as f:
+        f.write(b'b'*10)
+    new = files.get('data_1', 20)
+    assert old.closed
+    assert new[8:12] == b'aabb'
+    files.close()
+    assert new.closed
+
+def test_empty_file(tmp_path):
+    open(os.path.join(str(tmp_path),'data_2'),'wb').close()
+    files = BlockFiles(str(tmp_path))
+    assert files.get('data_2') == b''
+    files.close()
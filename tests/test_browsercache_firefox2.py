@@ -0,0 +1,96 @@
+import hashlib
+import os
+import struct
+import time
+
+import pytest
+
+from fanficfare.browsercache.browsercache_firefox2 import (
+    FirefoxCache2, _read_index, INDEX_HEADER, INDEX_RECORD_V9, INDEX_RECORD_V10,
+    INDEX_INITIALIZED, INDEX_REMOVED)
+from fanficfare.exceptions import BrowserCacheException
+
+## cache2/index parsing and FirefoxCache2.in_index() against
+## synthetic index files.
+
+def key_hash(key):
+    return hashlib.sha1(key.encode('utf8')).digest()
+
+def make_index(version, flags, dirty=0):
+    ## flags: key -> index record flags
+    data = INDEX_HEADER.pack(version, int(time.time()), dirty, 0)
+    for key, f in flags.items():
+        if version == 0x9:
+            data += INDEX_RECORD_V9.pack(key_hash(key), 10, 0, 2000000000, 5, 6, 1, f)
+        else:
+            data += INDEX_RECORD_V10.pack(key_hash(key), 10, 0, 5, 6, 1, f)
+    ## trailing hash, not checked.
+    return data + b'\0\0\0\0'
+
+FLAGS = {':https://a.com/s/1':INDEX_INITIALIZED,
+         ':https://a.com/s/2':INDEX_INITIALIZED|INDEX_REMOVED,
+         ':https://a.com/s/3':0}
+
+def hexhash(key):
+    return hashlib.sha1(key.encode('utf8')).hexdigest().upper()
+
+@pytest.mark.parametrize('version', [0x9, 0xA])
+def test_read_index(version):
+    index = _read_index(make_index(version, FLAGS, dirty=1))
+    assert index['dirty'] == 1
+    assert index['entries'] == dict( (hexhash(k),f) for (k,f) in FLAGS.items() )
+
+def test_read_index_empty():
+    assert _read_index(make_index(0xA, {}))['entries'] == {}
+
+def test_read_index_unknown_version():
+    with pytest.raises(BrowserCacheException):
+        _read_index(make_index(0x8, {}))
+
+def test_read_index_size_mismatch():
+    ## v9 records read as v10 don't come out even.
+    data = make_index(0x9, FLAGS)
+    data = struct.pack('>I', 0xA) + data[4:]
+    with pytest.raises(BrowserCacheException):
+        _read_index(data)
+
+def make_cache(tmp_path, flags=None, age_limit=None):
+    os.mkdir(str(tmp_path/'entries'))
+    if flags is not None:
+        with open(str(tmp_path/'index'),'wb') as f:
+            f.write(make_index(0xA, flags))
+    config = {'browser_cache_path':str(tmp_path),
+              'browser_cache_age_limit':age_limit}
+    cache = FirefoxCache2('a.com',lambda key,default=None:config.get(key,default),lambda key:[])
+    cache.update_index()
+    return cache
+
+def test_in_index_flags(tmp_path):
+    cache = make_cache(tmp_path, FLAGS)
+    assert cache.in_index(hexhash(':https://a.com/s/1'))
+    assert not cache.in_index(hexhash(':https://a.com/s/2'))
+    assert not cache.in_index(hexhash(':https://a.com/s/3'))
+    ## clean index newer than entries dir.
+    os.utime(str(tmp_path/'entries'), (0, 0))
+    assert not cache.in_index(hexhash(':https://a.com/s/4'))
+
+def test_in_index_no_index(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.index is None
+    assert cache.in_index(hexhash(':https://a.com/s/4'))
+
+def test_in_index_age_limit(tmp_path):
+    ## one hour.
+    cache = make_cache(tmp_path, FLAGS, age_limit='1')
+    hashkey = hexhash(':https://a.com/s/1')
+    entry = str(tmp_path/'entries'/hashkey)
+    with open(entry,'wb') as f:
+        f.write(b'entry')
+    assert cache.in_index(hashkey, os.stat(entry))
+    old = time.time() - 2*3600
+    os.utime(entry, (old, old))
+    assert not cache.in_index(hashkey, os.stat(entry))
+    assert cache.get_data_key_impl('https://a.com/s/1', ':https://a.com/s/1') is None
+    ## no age limit.
+    cache.age_limit = None
+    assert cache.in_index(hashkey, os.stat(entry))
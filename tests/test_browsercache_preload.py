@@ -0,0 +1,104 @@
+import gzip
+import os
+import time
+
+import pytest
+
+from fanficfare import adapters, browsercache
+from fanficfare.browsercache import BrowserCache
+from fanficfare.browsercache.base_browsercache import BaseBrowserCache, decompressed_cache
+from fanficfare.configurable import Configuration
+
+## BrowserCache.preload()/get_data()/take_missing() over a fake
+## browser cache holding gzipped pages.
+
+class FakeCache(BaseBrowserCache):
+    ## url -> (location, page)
+    entries = {}
+    decompressed = []
+
+    @staticmethod
+    def is_cache_dir(cache_dir):
+        return True
+
+    def make_keys(self, url):
+        return [url]
+
+    def get_data_key_impl(self, url, key):
+        if key not in self.entries:
+            return None
+        (location,page) = self.entries[key]
+        if location:
+            return (location, time.time(), '', None)
+        return (None, time.time(), 'gzip', gzip.compress(page), ('fake',key,len(page)))
+
+    def decompress(self, encoding, data):
+        d = super(FakeCache,self).decompress(encoding,data)
+        if encoding == 'gzip':
+            self.decompressed.append(d)
+        return d
+
+@pytest.fixture
+def cache(monkeypatch):
+    FakeCache.entries = {}
+    FakeCache.decompressed = []
+    decompressed_cache.clear()
+    monkeypatch.setattr(browsercache,'SimpleCache',FakeCache)
+    config = {'browser_cache_path':'/tmp'}
+    return BrowserCache('a.com',lambda key,default=None:config.get(key,default),lambda key:[])
+
+URLS = [ 'https://a.com/s/1/%s'%i for i in range(1,6) ]
+
+def page(url):
+    return b'<html>'+url.encode('ascii')+b'</html>'
+
+def test_preload_keeps_compressed(cache):
+    for url in URLS[:3]:
+        FakeCache.entries[url] = (None,page(url))
+    assert cache.preload(URLS) == 3
+    assert FakeCache.decompressed == []
+    assert cache.get_data(URLS[1]) == page(URLS[1])
+    assert FakeCache.decompressed == [page(URLS[1])]
+    ## given out once, then looked up again.
+    assert URLS[1] not in cache.preloaded
+    assert cache.get_data(URLS[1]) == page(URLS[1])
+
+def test_preload_redirect(cache):
+    FakeCache.entries[URLS[0]] = ('/s/1/1-moved',None)
+    FakeCache.entries['https://a.com/s/1/1-moved'] = (None,b'moved')
+    FakeCache.entries[URLS[1]] = (None,page(URLS[1]))
+    assert cache.preload(URLS[:2]) == 2
+    assert cache.get_data(URLS[0]) == b'moved'
+
+def test_take_missing(cache):
+    FakeCache.entries[URLS[1]] = (None,page(URLS[1]))
+    cache.preload(URLS)
+    assert cache.missing == [URLS[0]]+URLS[2:]
+    assert cache.take_missing(2,exclude=URLS[0]) == URLS[2:4]
+    assert cache.missing == [URLS[4]]
+    cache.add_preloaded(URLS[4],b'opened')
+    assert cache.missing == []
+    assert cache.get_data(URLS[4]) == b'opened'
+    assert cache.take_missing(2) == []
+
+def test_close_clears(cache):
+    FakeCache.entries[URLS[0]] = (None,page(URLS[0]))
+    cache.preload(URLS)
+    cache.close()
+    assert cache.preloaded == {}
+    assert cache.missing == []
+
+def test_adapter_preloads_conditioned_urls(cache):
+    ## chapter url with a space, fetched (and looked up) as
+    ## condition_url() quotes it.
+    configuration = Configuration(['test1.com'],'EPUB')
+    configuration.read(os.path.join(os.path.dirname(adapters.__file__),'..','defaults.ini'))
+    configuration.set('overrides','use_browser_cache','true')
+    configuration.set_browser_cache(cache)
+    adapter = adapters.getAdapter(configuration,'http://test1.com?sid=1')
+    adapter.add_chapter('One','https://a.com/s/1/one two')
+    adapter.add_chapter('Two','https://a.com/s/1/three')
+    FakeCache.entries['https://a.com/s/1/one+two'] = (None,b'one two')
+    assert adapter.preload_browser_cache() is cache
+    assert list(cache.preloaded) == ['https://a.com/s/1/one+two']
+    assert cache.missing == ['https://a.com/s/1/three']
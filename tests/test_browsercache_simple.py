@@ -0,0 +1,108 @@
+import os
+import struct
+import time
+
+import pytest
+
+from fanficfare.browsercache import browsercache_simple
+from fanficfare.browsercache.base_browsercache import decompressed_cache
+from fanficfare.browsercache.base_chromium import EPOCH_DIFFERENCE
+from fanficfare.browsercache.browsercache_simple import (
+    SimpleCache, _key_hash, SIMPLE_EOF, ENTRY_MAGIC_NUMBER, EOF_MAGIC_NUMBER)
+
+## SimpleCache's in-memory index of entry files against a synthetic
+## Chrome Simple Cache dir.
+
+def write_entry(cache_dir, key, data, response_time=None, headers=()):
+    ## key header, stream 1 (data), stream 0 (meta + http headers),
+    ## each stream followed by its EOF record.
+    response_time = response_time or time.time()
+    rtime = int((response_time+EPOCH_DIFFERENCE)*1000000)
+    http = b'\0'.join([b'HTTP/1.1 200']+[ h.encode('utf-8') for h in headers ])+b'\0'
+    stream0 = struct.pack('<LLL',0,0,0) + struct.pack('<QQL',rtime,rtime,len(http)) + http
+    kb = key.encode('utf-8')
+    body = struct.pack('<QLLLL',ENTRY_MAGIC_NUMBER,5,len(kb),0,0) + kb
+    body += data + SIMPLE_EOF.pack(EOF_MAGIC_NUMBER,0,0,len(data),0)
+    body += stream0 + SIMPLE_EOF.pack(EOF_MAGIC_NUMBER,0,0,len(stream0),0)
+    path = os.path.join(cache_dir,_key_hash(key)+'_0')
+    with open(path,'wb') as f:
+        f.write(body)
+    ## dir mtime is what tells SimpleCache to rescan, don't depend on
+    ## the filesystem's timestamp granularity.
+    st = os.stat(cache_dir)
+    os.utime(cache_dir,ns=(st.st_atime_ns,st.st_mtime_ns+1000000))
+    return path
+
+@pytest.fixture
+def cache(tmp_path):
+    decompressed_cache.clear()
+    config = {'browser_cache_path':str(tmp_path),
+              'browser_cache_age_limit':'1'}
+    return SimpleCache('a.com',lambda key,default=None:config.get(key,default),lambda key:[])
+
+def key(cache, url):
+    return cache.make_keys(url)[0]
+
+URL = 'https://a.com/s/1'
+
+def test_found(cache):
+    write_entry(cache.cache_dir,key(cache,URL),b'page1')
+    assert cache.get_data(URL) == b'page1'
+    assert cache.get_data('https://a.com/s/2') is None
+
+def test_added_after_scan(cache):
+    write_entry(cache.cache_dir,key(cache,URL),b'page1')
+    assert cache.get_data('https://a.com/s/2') is None
+    write_entry(cache.cache_dir,key(cache,'https://a.com/s/2'),b'page2')
+    assert cache.get_data('https://a.com/s/2') == b'page2'
+
+def test_entry_read_once(cache, monkeypatch):
+    path = write_entry(cache.cache_dir,key(cache,URL),b'page1')
+    reads = []
+    read_entry_file = browsercache_simple._read_entry_file
+    def counting(path, entry_file):
+        reads.append(path)
+        return read_entry_file(path, entry_file)
+    monkeypatch.setattr(browsercache_simple,'_read_entry_file',counting)
+    assert cache.get_data(URL) == b'page1'
+    assert cache.get_data(URL) == b'page1'
+    assert reads == [path]
+    ## rewritten by the browser, read again.
+    write_entry(cache.cache_dir,key(cache,URL),b'page1, newer')
+    assert cache.get_data(URL) == b'page1, newer'
+    assert reads == [path, path]
+
+def test_removed_forgotten(cache):
+    path = write_entry(cache.cache_dir,key(cache,URL),b'page1')
+    assert cache.get_data(URL) == b'page1'
+    assert path in cache.entry_info
+    os.remove(path)
+    ## removed since the scan.
+    assert cache.get_data(URL) is None
+    st = os.stat(cache.cache_dir)
+    os.utime(cache.cache_dir,ns=(st.st_atime_ns,st.st_mtime_ns+1000000))
+    assert cache.get_data(URL) is None
+    assert cache.index == {}
+    assert cache.entry_info == {}
+
+def test_other_files_ignored(cache):
+    write_entry(cache.cache_dir,key(cache,URL),b'page1')
+    for name in ('index','the-real-index','0123456789abcdef_10','0123456789abcdef'):
+        with open(os.path.join(cache.cache_dir,name),'wb') as f:
+            f.write(b'junk')
+    st = os.stat(cache.cache_dir)
+    os.utime(cache.cache_dir,ns=(st.st_atime_ns,st.st_mtime_ns+1000000))
+    assert cache.get_data(URL) == b'page1'
+    assert list(cache.index) == [_key_hash(key(cache,URL))]
+
+def test_age_limit(cache, monkeypatch):
+    write_entry(cache.cache_dir,key(cache,URL),b'page1',response_time=time.time()-2*3600)
+    def no_headers(entry_file, header_size):
+        raise AssertionError("read headers of too old entry")
+    monkeypatch.setattr(browsercache_simple,'_read_headers',no_headers)
+    assert cache.get_data(URL) is None
+
+def test_redirect(cache):
+    write_entry(cache.cache_dir,key(cache,URL),b'',headers=['Location:/s/1/moved'])
+    write_entry(cache.cache_dir,key(cache,URL+'/moved'),b'moved')
+    assert cache.get_data(URL) == b'moved'
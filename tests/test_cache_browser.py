@@ -0,0 +1,109 @@
+import pytest
+
+from fanficfare.fetchers import cache_browser
+from fanficfare.fetchers.cache_browser import BrowserCacheDecorator
+
+## BrowserCacheDecorator's open_pages_in_browser_window mode with a
+## fake browser cache and clock.  Pages 'load' in the browser after
+## the given number of seconds.
+
+class FakeBrowserCache(object):
+    def __init__(self,clock,load_times,missing):
+        self.clock = clock
+        self.load_times = load_times
+        self.missing = list(missing)
+        self.preloaded = {}
+
+    def page(self,url):
+        if url in self.load_times and self.clock.now >= self.load_times[url]:
+            return b'page:'+url.encode('ascii')
+        return None
+
+    def get_data(self,url):
+        return self.preloaded.pop(url,None) or self.page(url)
+
+    def get_data_many(self,urls):
+        return dict( (url,self.page(url)) for url in urls )
+
+    def add_preloaded(self,url,d):
+        self.preloaded[url] = d
+
+    def take_missing(self,count,exclude=None):
+        taken = [ url for url in self.missing if url != exclude ][:count]
+        self.missing = [ url for url in self.missing if url not in taken and url != exclude ]
+        return taken
+
+class FakeFetcher(object):
+    def __init__(self,config):
+        self.config = config
+
+    def getConfig(self,key,default=None):
+        return self.config.get(key,default)
+
+    def do_request(self,method,url,**kwargs):
+        raise AssertionError("browser cache only, no site requests")
+
+@pytest.fixture(autouse=True)
+def fake_time(clock,monkeypatch):
+    ## load times are from 0.
+    clock.now = 0.0
+    monkeypatch.setattr(cache_browser,'time',clock)
+    monkeypatch.setattr(cache_browser,'domain_open_tries',{})
+
+@pytest.fixture
+def opened(monkeypatch):
+    opened = []
+    monkeypatch.setattr(cache_browser,'open_url',opened.append)
+    return opened
+
+def make_fetcher(cache,window=3):
+    fetcher = FakeFetcher({'use_browser_cache_only':True,
+                           'open_pages_in_browser':True,
+                           'open_pages_in_browser_window':window})
+    BrowserCacheDecorator(cache).decorate_fetcher(fetcher)
+    return fetcher
+
+URLS = [ 'https://a.com/c/%s'%i for i in range(1,6) ]
+
+def test_window_returns_when_url_found(clock,opened):
+    ## url is in after the first 2s poll, the others take longer.
+    cache = FakeBrowserCache(clock,
+                             {URLS[0]:1, URLS[1]:1, URLS[2]:30},
+                             URLS)
+    fetcher = make_fetcher(cache)
+    resp = fetcher.do_request('GET',URLS[0])
+    assert resp.content == b'page:'+URLS[0].encode('ascii')
+    assert not resp.fromcache
+    assert opened == URLS[:3]
+    assert clock.slept == [2]
+    ## found with url, kept for later.
+    assert cache.preloaded == {URLS[1]:b'page:'+URLS[1].encode('ascii')}
+    assert fetcher.do_request('GET',URLS[1]).content == b'page:'+URLS[1].encode('ascii')
+    assert clock.slept == [2]
+
+def test_window_keeps_polling_for_url(clock,opened):
+    cache = FakeBrowserCache(clock,
+                             {URLS[0]:7, URLS[1]:1},
+                             URLS)
+    fetcher = make_fetcher(cache)
+    assert fetcher.do_request('GET',URLS[0]).content == b'page:'+URLS[0].encode('ascii')
+    assert clock.slept == [2,2,4]
+    assert URLS[1] in cache.preloaded
+
+def test_window_cache_hit(clock,opened):
+    cache = FakeBrowserCache(clock,{URLS[0]:0},URLS)
+    fetcher = make_fetcher(cache)
+    resp = fetcher.do_request('GET',URLS[0])
+    assert resp.fromcache
+    assert opened == []
+    assert clock.slept == []
+
+def test_window_not_found(clock,opened):
+    cache = FakeBrowserCache(clock,{},URLS[:2])
+    fetcher = make_fetcher(cache,window=2)
+    with pytest.raises(Exception) as e:
+        fetcher.do_request('GET',URLS[0])
+    assert e.value.status_code == 428
+    ## opened twice, with the window the first time.
+    assert opened == [URLS[0],URLS[1],URLS[0]]
+    assert clock.slept == [2,2,4,10,20]*2
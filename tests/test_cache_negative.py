@@ -0,0 +1,159 @@
+import socket
+
+import pytest
+from requests.exceptions import ConnectionError, ConnectTimeout
+
+from fanficfare import exceptions
+from fanficfare.fetchers.cache_negative import (
+    NegativeCache, NegativeCacheDecorator, failure_class)
+from fanficfare.fetchers.base_fetcher import FetcherResponse
+
+## NegativeCacheDecorator over a fake fetcher that fails or succeeds
+## per url.
+
+class FakeFetcher(object):
+    def __init__(self,errors,config=None):
+        self.errors = errors
+        self.config = config or {}
+        self.cookiejar = None
+        self.requests = []
+
+    def getConfig(self,key,default=None):
+        return self.config.get(key,default)
+
+    def do_request(self,method,url,parameters=None,**kwargs):
+        self.requests.append(url)
+        if url in self.errors:
+            raise self.errors[url]
+        return FetcherResponse(b'page',redirecturl=url)
+
+def make_fetcher(errors,config=None,cache=None):
+    cache = cache or NegativeCache()
+    fetcher = FakeFetcher(errors,config)
+    NegativeCacheDecorator(cache).decorate_fetcher(fetcher)
+    return (fetcher,cache)
+
+NOTFOUND = 'https://a.com/gone'
+
+def notfound():
+    return exceptions.HTTPErrorFFF(NOTFOUND,404,'Not Found',b'<html>big page</html>')
+
+def test_failure_class():
+    assert failure_class(notfound()) == 'notfound'
+    assert failure_class(exceptions.HTTPErrorFFF(NOTFOUND,500,'Error')) is None
+    assert failure_class(ConnectTimeout('timed out')) == 'timeout'
+    assert failure_class(ConnectionError(socket.gaierror(-2,'Name or service not known'))) == 'dns'
+    assert failure_class(ConnectionError('Connection reset by peer')) is None
+    assert failure_class(ValueError()) is None
+
+def test_failure_remembered():
+    (fetcher,cache) = make_fetcher({NOTFOUND:notfound()})
+    for i in range(3):
+        with pytest.raises(exceptions.HTTPErrorFFF) as e:
+            fetcher.do_request('GET',NOTFOUND)
+        assert e.value.status_code == 404
+        assert e.value.url == NOTFOUND
+    assert fetcher.requests == [NOTFOUND]
+    assert cache.get_hits() == {'notfound':2}
+
+def test_new_exception_each_time():
+    (fetcher,cache) = make_fetcher({NOTFOUND:notfound()})
+    raised = []
+    for i in range(3):
+        try:
+            fetcher.do_request('GET',NOTFOUND)
+        except exceptions.HTTPErrorFFF as e:
+            raised.append(e)
+    assert len(set(map(id,raised))) == 3
+    assert str(raised[1]) == str(raised[0])
+
+def test_page_kept():
+    ## adapters check 404 pages for 'log in' prompts.
+    (fetcher,cache) = make_fetcher({NOTFOUND:notfound()})
+    for i in range(2):
+        with pytest.raises(exceptions.HTTPErrorFFF) as e:
+            fetcher.do_request('GET',NOTFOUND)
+        assert e.value.data == b'<html>big page</html>'
+        assert e.value.status_code == 404
+    assert len(fetcher.requests) == 1
+
+def test_other_failures_not_remembered():
+    url = 'https://a.com/busy'
+    (fetcher,cache) = make_fetcher({url:exceptions.HTTPErrorFFF(url,503,'Busy')})
+    for i in range(2):
+        with pytest.raises(exceptions.HTTPErrorFFF):
+            fetcher.do_request('GET',url)
+    assert fetcher.requests == [url,url]
+
+def test_keyed_by_cookiejar_and_parameters():
+    cache = NegativeCache()
+    (fetcher1,cache) = make_fetcher({NOTFOUND:notfound()},cache=cache)
+    (fetcher2,cache) = make_fetcher({},cache=cache)
+    fetcher1.cookiejar = object()
+    fetcher2.cookiejar = object()
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher1.do_request('GET',NOTFOUND)
+    ## another login gets its own try.
+    assert fetcher2.do_request('GET',NOTFOUND).content == b'page'
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher1.do_request('GET',NOTFOUND,parameters={'page':'2'})
+    assert fetcher1.requests == [NOTFOUND,NOTFOUND]
+
+def test_force_and_usecache_false():
+    (fetcher,cache) = make_fetcher({NOTFOUND:notfound()})
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher.do_request('GET',NOTFOUND)
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher.do_request('GET',NOTFOUND,usecache=False)
+    assert len(fetcher.requests) == 2
+    ## use_negative_cache:false, as set by --force, always asks.
+    fetcher.config['use_negative_cache'] = False
+    del fetcher.errors[NOTFOUND]
+    assert fetcher.do_request('GET',NOTFOUND).content == b'page'
+    ## and success forgets the failure.
+    fetcher.config['use_negative_cache'] = True
+    assert fetcher.do_request('GET',NOTFOUND).content == b'page'
+    assert len(fetcher.requests) == 4
+
+def test_usecache_false_forgets():
+    ## adapter gets a 404 'log in' page, logs in (same cookiejar) and
+    ## fetches again with usecache=False.
+    (fetcher,cache) = make_fetcher({NOTFOUND:notfound()})
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher.do_request('GET',NOTFOUND)
+    ## login retry fails some other way, old 404 still not kept.
+    fetcher.errors[NOTFOUND] = exceptions.HTTPErrorFFF(NOTFOUND,500,'Error')
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher.do_request('GET',NOTFOUND,usecache=False)
+    del fetcher.errors[NOTFOUND]
+    assert fetcher.do_request('GET',NOTFOUND).content == b'page'
+
+def test_ttl(clock,monkeypatch):
+    from fanficfare.fetchers import cache_negative
+    monkeypatch.setattr(cache_negative,'time',clock)
+    url = 'https://dead.example.com/img.jpg'
+    dns = ConnectionError(socket.gaierror(-2,'Name or service not known'))
+    (fetcher,cache) = make_fetcher({url:dns},{'negative_cache_dns_ttl':'60',
+                                              'negative_cache_timeout_ttl':'0'})
+    for i in range(2):
+        with pytest.raises(ConnectionError):
+            fetcher.do_request('GET',url)
+    assert len(fetcher.requests) == 1
+    clock.now += 61
+    with pytest.raises(ConnectionError):
+        fetcher.do_request('GET',url)
+    assert len(fetcher.requests) == 2
+    ## ttl 0 is off.
+    url2 = 'https://slow.example.com/'
+    fetcher.errors[url2] = ConnectTimeout('timed out')
+    for i in range(2):
+        with pytest.raises(ConnectTimeout):
+            fetcher.do_request('GET',url2)
+    assert fetcher.requests[-2:] == [url2,url2]
+
+def test_post_not_cached():
+    (fetcher,cache) = make_fetcher({NOTFOUND:notfound()})
+    for i in range(2):
+        with pytest.raises(exceptions.HTTPErrorFFF):
+            fetcher.do_request('POST',NOTFOUND,parameters={'a':'b'})
+    assert len(fetcher.requests) == 2
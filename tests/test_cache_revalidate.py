@@ -0,0 +1,104 @@
+from fanficfare.fetchers import cache_sqlite
+from fanficfare.fetchers.base_fetcher import Fetcher, FetcherResponse
+from fanficfare.fetchers.cache_basic import BasicCache, BasicCacheDecorator
+from fanficfare.fetchers.cache_sqlite import SqliteCache
+
+## Stale BasicCacheDecorator entries revalidated with
+## ETag/Last-Modified.
+
+class FakeSite(object):
+    ## stands in for the rest of the fetcher chain.
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+
+    def chainfn(self,method,url,validators=None,**kargs):
+        self.requests.append((url,validators))
+        return self.responses.pop(0)
+
+class FakeFetcher(Fetcher):
+    def __init__(self,**config):
+        super(FakeFetcher,self).__init__(lambda key,default=None:config.get(key,default),
+                                         lambda key,default=[]:default)
+        self.sent_headers = None
+
+    def request(self,method,url,headers=None,parameters=None,image=False):
+        self.sent_headers = headers
+        return FetcherResponse(b'',url,status_code=304)
+
+    def get_cookiejar(self,*args,**kargs):
+        class Jar(object):
+            def autosave_cookiejar(self):
+                pass
+        return Jar()
+
+URL = 'https://a.com/s/1'
+VALIDATORS = {'ETag':'"v1"','Last-Modified':'Wed, 01 Jan 2025 00:00:00 GMT'}
+
+def page(data,**kargs):
+    return FetcherResponse(data,URL,headers=kargs.pop('headers',VALIDATORS),**kargs)
+
+def setup(tmp_path,clock,monkeypatch):
+    monkeypatch.setattr(cache_sqlite,'time',clock)
+    cache = SqliteCache(str(tmp_path/'cache.sqlite'))
+    ## one hour.
+    fetcher = FakeFetcher(basic_cache_age_limit='1')
+    site = FakeSite()
+    decorator = BasicCacheDecorator(cache)
+    def fetch():
+        return decorator.fetcher_do_request(fetcher,site.chainfn,'GET',URL)
+    site.responses.append(page(b'page1',status_code=200))
+    fetch()
+    return (cache,site,fetch)
+
+def test_fresh_from_cache(tmp_path,clock,monkeypatch):
+    (cache,site,fetch) = setup(tmp_path,clock,monkeypatch)
+    resp = fetch()
+    assert resp.content == b'page1'
+    assert resp.fromcache and not resp.revalidated
+    assert site.requests == [(URL,None)]
+
+def test_stale_not_modified(tmp_path,clock,monkeypatch):
+    (cache,site,fetch) = setup(tmp_path,clock,monkeypatch)
+    clock.now += 7200
+    site.responses.append(page(b'',status_code=304))
+    resp = fetch()
+    assert site.requests[-1] == (URL,VALIDATORS)
+    assert resp.content == b'page1'
+    assert resp.fromcache and resp.revalidated
+    ## fresh again, no request.
+    assert fetch().content == b'page1'
+    assert len(site.requests) == 2
+
+def test_stale_changed(tmp_path,clock,monkeypatch):
+    (cache,site,fetch) = setup(tmp_path,clock,monkeypatch)
+    clock.now += 7200
+    site.responses.append(page(b'page2',status_code=200,headers={'ETag':'"v2"'}))
+    resp = fetch()
+    assert resp.content == b'page2'
+    assert not resp.fromcache
+    assert cache.get_from_cache(URL)[0] == b'page2'
+    assert cache.get_validators(URL) == {'ETag':'"v2"'}
+
+def test_stale_without_validators(tmp_path,clock,monkeypatch):
+    (cache,site,fetch) = setup(tmp_path,clock,monkeypatch)
+    cache.set_to_cache(URL,b'page1',URL)
+    clock.now += 7200
+    site.responses.append(page(b'page2',status_code=200,headers={}))
+    assert fetch().content == b'page2'
+    assert site.requests[-1] == (URL,None)
+
+def test_memory_cache_never_revalidates():
+    cache = BasicCache()
+    cache.set_to_cache(URL,b'page1',URL,validators=VALIDATORS)
+    assert cache.get_validators(URL) is None
+    assert cache.has_cachekey(URL,age_limit=0)
+
+def test_conditional_headers():
+    fetcher = FakeFetcher()
+    fetcher.do_request('GET',URL,validators=VALIDATORS)
+    assert fetcher.sent_headers['If-None-Match'] == '"v1"'
+    assert fetcher.sent_headers['If-Modified-Since'] == VALIDATORS['Last-Modified']
+    fetcher.do_request('GET',URL)
+    assert 'If-None-Match' not in fetcher.sent_headers
+    assert 'If-Modified-Since' not in fetcher.sent_headers
@@ -0,0 +1,119 @@
+import os
+import pickle
+
+import pytest
+
+from fanficfare.fetchers import cache_sqlite
+from fanficfare.fetchers.cache_sqlite import SqliteCache
+
+## SqliteCache: persistence, age limit, LRU eviction and the one-time
+## import of pickled BasicCache files.
+
+@pytest.fixture(autouse=True)
+def fake_time(clock,monkeypatch):
+    monkeypatch.setattr(cache_sqlite,'time',clock)
+
+def make_cache(tmp_path,size_limit=None):
+    return SqliteCache(str(tmp_path/'cache.sqlite'),size_limit=size_limit)
+
+def test_set_get(tmp_path):
+    cache = make_cache(tmp_path)
+    assert not cache.has_cachekey('https://a.com/1')
+    assert cache.get_from_cache('https://a.com/1') is None
+    cache.set_to_cache('https://a.com/1',b'page1','https://a.com/1r')
+    assert cache.has_cachekey('https://a.com/1')
+    assert cache.get_from_cache('https://a.com/1') == (b'page1','https://a.com/1r')
+    ## still there for the next process.
+    reopened = SqliteCache(cache.filename)
+    assert reopened.get_from_cache('https://a.com/1') == (b'page1','https://a.com/1r')
+
+def test_age_limit(tmp_path,clock):
+    cache = make_cache(tmp_path)
+    cache.set_to_cache('https://a.com/1',b'page1','https://a.com/1')
+    clock.now += 100
+    assert cache.has_cachekey('https://a.com/1',age_limit=200)
+    assert not cache.has_cachekey('https://a.com/1',age_limit=50)
+    assert cache.has_cachekey('https://a.com/1')
+    ## replaced entry is fresh again.
+    cache.set_to_cache('https://a.com/1',b'page1','https://a.com/1')
+    assert cache.has_cachekey('https://a.com/1',age_limit=50)
+
+def test_lru_eviction(tmp_path,clock):
+    ## size counts data and redirect url, 10 each here.
+    cache = make_cache(tmp_path,size_limit=50)
+    for i in range(1,6):
+        clock.now += 1
+        cache.set_to_cache('https://a.com/%s'%i,b'x'*10,None)
+    assert cache.total_size() == 50
+    ## 1 used since 2 was stored.
+    clock.now += 1
+    cache.get_from_cache('https://a.com/1')
+    clock.now += 1
+    cache.set_to_cache('https://a.com/6',b'x'*10,None)
+    ## down to EVICT_TO of the limit.
+    assert cache.total_size() == cache.total == 40
+    for i in (2,3):
+        assert not cache.has_cachekey('https://a.com/%s'%i)
+    for i in (1,4,5,6):
+        assert cache.has_cachekey('https://a.com/%s'%i)
+
+def test_eviction_batches(tmp_path,clock,monkeypatch):
+    monkeypatch.setattr(cache_sqlite,'EVICT_BATCH',3)
+    cache = make_cache(tmp_path)
+    for i in range(20):
+        clock.now += 1
+        cache.set_to_cache('https://a.com/%s'%i,b'x'*10,None)
+    cache.size_limit = 100
+    cache.evict()
+    assert cache.total_size() == 90
+    assert not cache.has_cachekey('https://a.com/10')
+    assert cache.has_cachekey('https://a.com/11')
+
+def test_total_not_resummed(tmp_path):
+    cache = make_cache(tmp_path,size_limit=1000)
+    sums = []
+    total_size = cache.total_size
+    def counting():
+        sums.append(1)
+        return total_size()
+    cache.total_size = counting
+    for i in range(10):
+        cache.set_to_cache('https://a.com/%s'%i,b'x'*10,None)
+    ## replaced, not added.
+    cache.set_to_cache('https://a.com/1',b'x'*20,None)
+    assert len(sums) == 1
+    assert cache.total == total_size() == 110
+
+def test_no_size_limit(tmp_path):
+    cache = make_cache(tmp_path)
+    for i in range(10):
+        cache.set_to_cache('https://a.com/%s'%i,b'x'*1000,None)
+    assert cache.total_size() == 10000
+
+def write_pickle(filename,entries):
+    with open(filename,'wb') as f:
+        pickle.dump(entries,f,protocol=2)
+
+def test_load_cache_once(tmp_path):
+    cache = make_cache(tmp_path)
+    filename = str(tmp_path/'global_cache')
+    write_pickle(filename,{'https://a.com/1':(b'page1','https://a.com/1')})
+    cache.load_cache(filename)
+    assert cache.get_from_cache('https://a.com/1') == (b'page1','https://a.com/1')
+    ## changed here, not overwritten by importing the same file again.
+    cache.set_to_cache('https://a.com/1',b'newer','https://a.com/1')
+    cache.load_cache(filename)
+    assert cache.get_from_cache('https://a.com/1') == (b'newer','https://a.com/1')
+    ## but is when the file changes.
+    write_pickle(filename,{'https://a.com/1':(b'changed','https://a.com/1')})
+    os.utime(filename,(2000,2000))
+    cache.load_cache(filename)
+    assert cache.get_from_cache('https://a.com/1') == (b'changed','https://a.com/1')
+
+def test_save_cache_pickle(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set_to_cache('https://a.com/1',b'page1','https://a.com/1r')
+    filename = str(tmp_path/'saved')
+    cache.save_cache(filename)
+    with open(filename,'rb') as f:
+        assert pickle.load(f) == {'https://a.com/1':(b'page1','https://a.com/1r')}
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from requests.cookies import create_cookie
+
+from fanficfare.fetchers import base_fetcher
+from fanficfare.fetchers.base_fetcher import Fetcher
+
+## BasicCookieJar's dirty tracking and saving.
+
+def make_jar(filename):
+    return Fetcher(lambda key,default=None:default,
+                   lambda key,default=None:default).get_cookiejar(filename=filename)
+
+def cookie(name='session',value='abc'):
+    return create_cookie(name,value,domain='a.com',path='/',expires=2000000000)
+
+def test_dirty_only_on_change(tmp_path):
+    jar = make_jar(str(tmp_path/'cookies.lwp'))
+    assert not jar.dirty
+    jar.set_cookie(cookie())
+    assert jar.dirty
+    jar.save_cookiejar()
+    assert not jar.dirty
+    ## same cookie resent.
+    jar.set_cookie(cookie())
+    assert not jar.dirty
+    jar.set_cookie(cookie(value='xyz'))
+    assert jar.dirty
+
+def test_save_and_load(tmp_path):
+    filename = str(tmp_path/'cookies.lwp')
+    jar = make_jar(filename)
+    jar.set_cookie(cookie())
+    jar.save_cookiejar()
+    assert not os.path.exists(filename+'.tmp')
+    jar2 = make_jar(filename)
+    assert [ c.value for c in jar2 ] == ['abc']
+    assert not jar2.dirty
+
+def test_failed_replace_stays_dirty(tmp_path,monkeypatch):
+    filename = str(tmp_path/'cookies.lwp')
+    jar = make_jar(filename)
+    jar.set_cookie(cookie())
+    def fail(src,dst):
+        raise OSError("file in use")
+    monkeypatch.setattr(base_fetcher,'replace_file',fail)
+    with pytest.raises(OSError):
+        jar.save_cookiejar()
+    assert jar.dirty
+    assert jar.last_save == 0
+    monkeypatch.undo()
+    jar.save_cookiejar()
+    assert not jar.dirty
+    assert [ c.value for c in make_jar(filename) ] == ['abc']
+
+def test_failed_write_stays_dirty(tmp_path):
+    ## no such directory.
+    jar = make_jar(str(tmp_path/'missing'/'cookies.lwp'))
+    jar.set_cookie(cookie())
+    with pytest.raises(IOError):
+        jar.save_cookiejar()
+    assert jar.dirty
+
+def test_flush_logs_failure(tmp_path):
+    jar = make_jar(str(tmp_path/'missing'/'cookies.lwp'))
+    ## set_autosave() also registers an atexit save.
+    jar.autosave = True
+    jar.set_cookie(cookie())
+    jar.flush_cookiejar()
+    assert jar.dirty
@@ -0,0 +1,87 @@
+import gzip
+import zlib
+
+import pytest
+
+from fanficfare.browsercache import base_browsercache
+from fanficfare.browsercache.base_browsercache import BaseBrowserCache, DecompressedCache
+
+## DecompressedCache LRU and BaseBrowserCache.decompress_entry().
+
+def test_lru():
+    cache = DecompressedCache(size_limit=30)
+    for i in range(3):
+        cache.set(('entry%s'%i,'gzip'),b'x'*10)
+    assert cache.size == 30
+    ## 0 used since 1 was stored.
+    assert cache.get(('entry0','gzip')) == b'x'*10
+    cache.set(('entry3','gzip'),b'x'*10)
+    assert cache.size == 30
+    assert cache.get(('entry1','gzip')) is None
+    assert list(cache.entries) == [('entry2','gzip'),('entry0','gzip'),('entry3','gzip')]
+    assert (cache.hits,cache.misses) == (1,1)
+
+def test_too_big_not_kept():
+    cache = DecompressedCache(size_limit=30)
+    cache.set(('entry0','gzip'),b'x'*10)
+    cache.set(('big','gzip'),b'x'*31)
+    assert cache.get(('big','gzip')) is None
+    assert cache.get(('entry0','gzip')) == b'x'*10
+
+def test_set_size_limit_evicts():
+    cache = DecompressedCache(size_limit=30)
+    for i in range(3):
+        cache.set(('entry%s'%i,'gzip'),b'x'*10)
+    cache.set_size_limit(15)
+    assert list(cache.entries) == [('entry2','gzip')]
+    assert cache.size == 10
+    cache.clear()
+    assert cache.size == 0
+
+class FakeCache(BaseBrowserCache):
+    def __init__(self, config):
+        super(FakeCache,self).__init__('a.com',
+                                       lambda key,default=None:config.get(key,default),
+                                       lambda key:[])
+        self.decompressed = 0
+
+    def decompress(self, encoding, data):
+        self.decompressed += 1
+        return super(FakeCache,self).decompress(encoding,data)
+
+@pytest.fixture
+def shared(monkeypatch):
+    shared = DecompressedCache()
+    monkeypatch.setattr(base_browsercache,'decompressed_cache',shared)
+    return shared
+
+def test_decompress_entry_once(shared):
+    cache = FakeCache({'browser_cache_path':'/tmp'})
+    data = gzip.compress(b'page1')
+    entryid = ('/cache/f_0',1000,len(data))
+    assert cache.decompress_entry(entryid,'gzip',data) == b'page1'
+    assert cache.decompress_entry(entryid,'gzip',data) == b'page1'
+    assert cache.decompressed == 1
+    ## another instance (update check, then download) shares it.
+    other = FakeCache({'browser_cache_path':'/tmp'})
+    assert other.decompress_entry(entryid,'gzip',data) == b'page1'
+    assert other.decompressed == 0
+    ## entry file rewritten.
+    data = zlib.compress(b'page1, newer')
+    assert cache.decompress_entry(('/cache/f_0',2000,len(data)),'deflate',data) == b'page1, newer'
+    assert cache.decompressed == 2
+
+def test_decompress_entry_not_kept(shared):
+    cache = FakeCache({'browser_cache_path':'/tmp'})
+    data = gzip.compress(b'page1')
+    ## no entry id (WebToEpub pages) or not compressed.
+    cache.decompress_entry(None,'gzip',data)
+    cache.decompress_entry(None,'gzip',data)
+    cache.decompress_entry(('/cache/f_0',1000,5),'',b'page1')
+    assert shared.entries == {}
+
+def test_memory_limit_config(shared):
+    FakeCache({'browser_cache_path':'/tmp','browser_cache_memory_limit':'2'})
+    assert shared.size_limit == 2*1024*1024
+    FakeCache({'browser_cache_path':'/tmp','browser_cache_memory_limit':'lots'})
+    assert shared.size_limit == 2*1024*1024
@@ -0,0 +1,84 @@
+import pytest
+
+from fanficfare.fetchers import fetcher_requests
+from fanficfare.fetchers.fetcher_requests import RequestsFetcher, close_shared_adapters
+
+## Connection pools (transport adapters) shared between fetchers.
+
+@pytest.fixture(autouse=True)
+def shared(monkeypatch):
+    shared = {}
+    monkeypatch.setattr(fetcher_requests,'shared_adapters',shared)
+    return shared
+
+def make_fetcher(cls=RequestsFetcher,**config):
+    return cls(lambda key,default=None:config.get(key,default),
+               lambda key,default=[]:default)
+
+def adapters(fetcher):
+    session = fetcher.get_requests_session()
+    return (session.get_adapter('https://a.com/'),
+            session.get_adapter('http://a.com/'))
+
+def test_shared_between_fetchers(shared):
+    (https1,http1) = adapters(make_fetcher())
+    (https2,http2) = adapters(make_fetcher())
+    assert https1 is https2
+    assert http1 is http2
+    assert https1 is not http1
+    assert len(shared) == 2
+
+def test_sessions_not_shared():
+    fetcher1 = make_fetcher()
+    fetcher2 = make_fetcher()
+    assert fetcher1.get_requests_session() is not fetcher2.get_requests_session()
+    fetcher1.set_cookiejar(fetcher1.get_cookiejar())
+    assert fetcher1.get_requests_session().cookies is not fetcher2.get_requests_session().cookies
+
+@pytest.mark.parametrize('config', [
+    {'connection_pool_size':'4'},
+    {'use_ssl_default_seclevelone':True},
+    {'https_proxy':'http://proxy:3128'},
+    ])
+def test_settings_get_own_adapter(config):
+    (https1,http1) = adapters(make_fetcher())
+    (https2,http2) = adapters(make_fetcher(**config))
+    assert https1 is not https2
+
+def test_pool_size():
+    (https,http) = adapters(make_fetcher(connection_pool_size='4'))
+    assert https._pool_maxsize == 4
+    (https,http) = adapters(make_fetcher(connection_pool_size='lots'))
+    assert https._pool_maxsize == 10
+
+def test_fetcher_del_keeps_shared(shared):
+    fetcher = make_fetcher()
+    (https,http) = adapters(fetcher)
+    del fetcher
+    assert adapters(make_fetcher())[0] is https
+
+def test_close_shared_adapters(shared):
+    adapters(make_fetcher())
+    assert shared
+    close_shared_adapters()
+    assert not shared
+
+def test_cloudscraper_ciphersuite(shared):
+    cloudscraper = pytest.importorskip('cloudscraper')
+    from fanficfare.fetchers.fetcher_cloudscraper import CloudScraperFetcher
+    class OtherCipherFetcher(CloudScraperFetcher):
+        def make_sesssion(self):
+            session = super(OtherCipherFetcher,self).make_sesssion()
+            session.cipherSuite = 'ECDHE-RSA-AES128-GCM-SHA256'
+            return session
+    (https1,http1) = adapters(make_fetcher(CloudScraperFetcher))
+    (https2,http2) = adapters(make_fetcher(CloudScraperFetcher))
+    assert isinstance(https1,cloudscraper.CipherSuiteAdapter)
+    assert https1 is https2
+    ## no unused plain https adapter left shared.
+    assert [ k[1] for k in shared ] == ['https-ciphersuite','http']
+    ## same fetcher class name isn't enough, TLS settings must match.
+    OtherCipherFetcher.__name__ = 'CloudScraperFetcher'
+    (https3,http3) = adapters(make_fetcher(OtherCipherFetcher))
+    assert https3 is not https1
+    assert https3.cipherSuite == 'ECDHE-RSA-AES128-GCM-SHA256'
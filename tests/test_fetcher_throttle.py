@@ -0,0 +1,95 @@
+import io
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from urllib3.util.retry import RequestHistory
+
+from fanficfare import exceptions
+from fanficfare.fetchers import fetcher_requests
+from fanficfare.fetchers.decorators import HostBackoff
+from fanficfare.fetchers.fetcher_requests import RequestsFetcher
+
+## RequestsFetcher reporting 429/503s (and Retry-After) to the
+## shared per-host backoff.
+
+class FakeLimiter(object):
+    def __init__(self):
+        self.deferred = []
+
+    def defer(self,host,secs):
+        self.deferred.append((host,secs))
+
+class FakeAdapter(BaseAdapter):
+    ## answers every request with the next (status, headers)
+    def __init__(self,responses):
+        super(FakeAdapter,self).__init__()
+        self.responses = responses
+
+    def send(self,request,**kargs):
+        (status,headers) = self.responses.pop(0)
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers.update(headers)
+        resp.raw = io.BytesIO(b'page')
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def backoff(monkeypatch):
+    backoff = HostBackoff(FakeLimiter(),initial=2.0,maximum=300.0)
+    monkeypatch.setattr(fetcher_requests,'host_backoff',backoff)
+    monkeypatch.setattr(fetcher_requests,'shared_adapters',{})
+    return backoff
+
+def make_fetcher(*responses):
+    fetcher = RequestsFetcher(lambda key,default=None:default,
+                              lambda key,default=[]:default)
+    fetcher.get_requests_session().mount('https://a.com/',FakeAdapter(list(responses)))
+    return fetcher
+
+def test_throttled_retry_after(backoff):
+    fetcher = make_fetcher((429,{'Retry-After':'30'}))
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        fetcher.request('GET','https://a.com/s/1')
+    assert backoff.get_delay('a.com') == 30.0
+    assert backoff.limiter.deferred == [('a.com',30.0)]
+
+def test_throttled_shared_by_fetchers(backoff):
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        make_fetcher((503,{})).request('GET','https://a.com/s/1')
+    assert backoff.get_delay('a.com') == 2.0
+    with pytest.raises(exceptions.HTTPErrorFFF):
+        make_fetcher((429,{'Retry-After':'soon'})).request('GET','https://a.com/s/2')
+    ## bad Retry-After ignored, still throttled.
+    assert backoff.get_delay('a.com') == 4.0
+    assert backoff.limiter.deferred == []
+
+def test_success_decays(backoff):
+    backoff.throttled('a.com')
+    fetcher = make_fetcher((200,{}))
+    assert fetcher.request('GET','https://a.com/s/1').content == b'page'
+    assert backoff.get_delay('a.com') == 1.8
+    ## other hosts untouched.
+    backoff.throttled('b.com')
+    make_fetcher((200,{})).request('GET','https://a.com/s/1')
+    assert backoff.get_delay('b.com') == 2.0
+
+def test_counts_urllib3_retries(backoff):
+    ## the final answer was OK, but urllib3 retried two 429s first.
+    class Raw(object):
+        class retries(object):
+            history = (RequestHistory('GET','https://a.com/s/1',None,429,None),
+                       RequestHistory('GET','https://a.com/s/1',None,429,None),
+                       RequestHistory('GET','https://a.com/s/1',None,500,None))
+    class Resp(object):
+        raw = Raw()
+        status_code = 200
+        headers = {}
+    make_fetcher().report_throttling('https://a.com/s/1',Resp())
+    assert backoff.get_delay('a.com') == 4.0
+    assert backoff.get_stats()['a.com']['throttles'] == 2
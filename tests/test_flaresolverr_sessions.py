@@ -0,0 +1,111 @@
+import gc
+
+import pytest
+
+from fanficfare.fetchers import fetcher_flaresolverr_proxy as fsp
+from fanficfare.fetchers.fetcher_flaresolverr_proxy import (
+    FlareSolverrSessionPool, FlareSolverr_ProxyFetcher, get_session_pool)
+from fanficfare.fetchers.base_fetcher import FetcherResponse
+
+## FlareSolverr session pools against a fake FlareSolverr server.
+
+class FakeFlareSolverr(object):
+    def __init__(self):
+        self.created = []
+        self.destroyed = []
+        self.requests = []
+
+    def post(self,fs_url,data):
+        if data['cmd'] == 'sessions.create':
+            self.created.append(data['session'])
+            json = {'status':'ok','session':data['session']}
+        elif data['cmd'] == 'sessions.destroy':
+            self.destroyed.append(data['session'])
+            json = {'status':'ok'}
+        else:
+            self.requests.append((data['url'],data.get('session')))
+            json = {'status':'ok',
+                    'solution':{'status':200,
+                                'url':data['url'],
+                                'cookies':[],
+                                'response':'<html>page</html>'}}
+        return FetcherResponse(b'',fs_url,json=json)
+
+@pytest.fixture
+def fs(monkeypatch):
+    fs = FakeFlareSolverr()
+    monkeypatch.setattr(fsp,'session_pools',{})
+    monkeypatch.setattr(fsp,'dropped_jar_ids',[])
+    monkeypatch.setattr(fsp,'post_fs_json',fs.post)
+    return fs
+
+class Jar(object):
+    pass
+
+FS_URL = 'http://localhost:8191/v1'
+
+def test_pool_reuses_idle(fs):
+    pool = FlareSolverrSessionPool(FS_URL,2)
+    s1 = pool.acquire(fs.post)
+    s2 = pool.acquire(fs.post)
+    assert s1 != s2
+    pool.release(s1,fs.post)
+    assert pool.acquire(fs.post) == s1
+    assert len(fs.created) == 2
+    ## discarded sessions are not reused.
+    pool.release(s2,discard=True)
+    assert pool.acquire(fs.post) not in (s1,s2)
+    assert len(fs.created) == 3
+
+def test_pool_destroy_all(fs):
+    pool = FlareSolverrSessionPool(FS_URL,2)
+    s1 = pool.acquire(fs.post)
+    s2 = pool.acquire(fs.post)
+    pool.release(s1,fs.post)
+    pool.destroy_all(fs.post)
+    ## in use ones are left.
+    assert fs.destroyed == [s1]
+
+def test_pools_by_cookiejar_and_site(fs):
+    jar1 = Jar()
+    jar2 = Jar()
+    pool = get_session_pool(FS_URL,jar1,'a.com',1)
+    assert get_session_pool(FS_URL,jar1,'a.com',2) is pool
+    assert pool.size == 2
+    assert get_session_pool(FS_URL,jar2,'a.com',1) is not pool
+    assert get_session_pool(FS_URL,jar1,'b.com',1) is not pool
+    assert get_session_pool('http://other:8191/v1',jar1,'a.com',1) is not pool
+
+def test_dropped_jar_sessions_destroyed(fs):
+    jar1 = Jar()
+    pool = get_session_pool(FS_URL,jar1,'a.com',1)
+    session = pool.acquire(fs.post)
+    pool.release(session,fs.post)
+    del jar1
+    gc.collect()
+    ## cleaned up on the next lookup.
+    jar2 = Jar()
+    assert get_session_pool(FS_URL,jar2,'a.com',1) is not pool
+    assert fs.destroyed == [session]
+    assert len(fsp.session_pools) == 1
+
+def make_fetcher(fs,jar=None):
+    config = {'use_flaresolverr_proxy':'true',
+              'flaresolverr_proxy_sessions':'1'}
+    fetcher = FlareSolverr_ProxyFetcher(lambda key,default=None:config.get(key,default),
+                                        lambda key,default=[]:default)
+    fetcher.post_fs = fs.post
+    if jar is not None:
+        fetcher.set_cookiejar(jar)
+    return fetcher
+
+def test_fetchers_share_only_with_same_cookiejar(fs):
+    fetcher1 = make_fetcher(fs)
+    fetcher2 = make_fetcher(fs,fetcher1.get_cookiejar())
+    fetcher3 = make_fetcher(fs)
+    for fetcher in (fetcher1,fetcher2,fetcher3):
+        assert fetcher.request('GET','https://a.com/s/1').content == '<html>page</html>'
+    sessions = [ s for (u,s) in fs.requests ]
+    assert sessions[0] == sessions[1]
+    assert sessions[2] != sessions[0]
+    assert len(fs.created) == 2
@@ -0,0 +1,90 @@
+import random
+import re
+
+import pytest
+
+from fanficfare import htmlcleanup
+from fanficfare.htmlcleanup import removeEntities, entities
+
+from tests import fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom
+
+## Differential test of removeEntities()'s one pass entity decoding
+## against the text.replace() per entity it replaced.
+
+def reference_removeEntities(text, space_only=False, remove_all_entities=False):
+    if text is None:
+        return u""
+    if not isinstance(text,str):
+        text = str(text)
+    text = re.sub(r'&#0*38;','&amp;',text)
+    text = re.sub(r'&#0*60;','&lt;',text)
+    text = re.sub(r'&#0*62;','&gt;',text)
+    text = htmlcleanup._replaceNumberEntities(text)
+    for e in reversed(sorted(entities.keys())):
+        v = entities[e]
+        if space_only and re.match(r"^[^\s]$", v, re.UNICODE | re.S):
+            continue
+        text = text.replace(e, v)
+    text = htmlcleanup._replaceNotEntities(text)
+    if remove_all_entities:
+        text = text.replace('&lt', '<').replace('&gt', '>').replace('&amp;', '&')
+    else:
+        text = text.replace('&', '&amp;').replace('&amp;lt', '&lt;').replace('&amp;gt', '&gt;')
+    return text
+
+NAMES = sorted(entities.keys())
+
+PIECES = [ '&', ';', '&amp;', '&amp', '&AMP;', '&#38;', '&#038;', '&#x26;',
+           '&#60;', '&#062;', '&#8212', '&#8212;', '&#xE9;', '&#27861;', '&#x;',
+           '&lt;', '&gt', '&nbsp', '&not', '&notin;', '&sup1', '&AT', 'AT&T',
+           '&#', 'x', 'amp', 'lt;', 'in;', 'e;', ' ', '\n', '\xa0', 'é', '<b>',
+           '</p>', '-', '.' ]
+
+def fuzz_text(rand):
+    parts = []
+    for _ in range(rand.randint(1,12)):
+        r = rand.random()
+        if r < 0.35:
+            parts.append(rand.choice(NAMES))
+        elif r < 0.45:
+            ## partial or run-on names
+            name = rand.choice(NAMES)
+            parts.append(name[:rand.randint(1,len(name))])
+        else:
+            parts.append(rand.choice(PIECES))
+    return ''.join(parts)
+
+FUZZ = [ fuzz_text(random.Random(seed)) for seed in range(3000) ]
+
+FIXTURE_PAGES = [ getattr(module,name)
+                  for module in (fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom)
+                  for name in sorted(dir(module))
+                  if name.endswith('_return') and isinstance(getattr(module,name),str) ]
+
+@pytest.mark.parametrize('space_only,remove_all_entities', [ (False,False), (True,False), (False,True) ])
+def test_fuzz_matches_reference(space_only,remove_all_entities):
+    for text in FUZZ:
+        assert ( removeEntities(text,space_only,remove_all_entities) ==
+                 reference_removeEntities(text,space_only,remove_all_entities) ), text
+
+@pytest.mark.parametrize('text', [ '&amp;lt;', '&amp;amp;', '&amp;amp;amp;', '&AMP;amp;',
+                                   '&amp;AMP;', '&amp;Aacute;', '&amp;aacute', '&amp;nbsp;x',
+                                   '&#x26;lt;', '&notin;&not;&notx', 'AT&T; &', '' ])
+def test_amp_chains(text):
+    for space_only in (False,True):
+        assert removeEntities(text,space_only) == reference_removeEntities(text,space_only)
+
+def test_every_entity():
+    for name in NAMES:
+        for text in (name, 'x'+name+'x', name+name, name+';'):
+            assert removeEntities(text) == reference_removeEntities(text), text
+
+@pytest.mark.parametrize('num', range(len(FIXTURE_PAGES)))
+def test_fixture_pages(num):
+    text = FIXTURE_PAGES[num]
+    assert removeEntities(text) == reference_removeEntities(text)
+    assert removeEntities(text,remove_all_entities=True) == reference_removeEntities(text,remove_all_entities=True)
+
+def test_none_and_non_strings():
+    assert removeEntities(None) == u""
+    assert removeEntities(5) == u"5"
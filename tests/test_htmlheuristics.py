@@ -0,0 +1,145 @@
+import random
+
+import pytest
+from unittest.mock import patch
+import bs4 as bs
+
+from fanficfare import htmlheuristics
+from fanficfare.htmlheuristics import replace_br_with_p, was_run_marker
+
+from tests import fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom
+
+## Regression corpus for replace_br_with_p().  Expected outputs are
+## from the implementation before nested blocks were parsed once
+## instead of once per nesting level, with soup_up_div() below.
+
+EXPECTED = [
+    ('one<br />two<br />three',
+     u'<!-- FFF_replace_br_with_p_has_been_run -->\n<div id="FFF_replace_br_with_p_has_been_run">\n'
+     u'<p>one</p>\n<p>two</p>\n<p>three</p></div>\n'),
+    ('<div class="x">a<br /><br />b<br /><br />c<br />d</div>',
+     u'<!-- FFF_replace_br_with_p_has_been_run -->\n<div id="FFF_replace_br_with_p_has_been_run">\n'
+     u'<p>a</p>\n<p>b<br /><br />c</p>\n<p>d</p></div>\n'),
+    ('a<br /><div><blockquote>q</blockquote></div>b<hr class="x"/>c',
+     u'<!-- FFF_replace_br_with_p_has_been_run -->\n<div id="FFF_replace_br_with_p_has_been_run">\n'
+     u'<p>a</p>\n<div>\n<blockquote>\n<p>q</p>\n</blockquote>\n</div>\n<p>b</p>\n<hr />\n<p>c</p></div>\n'),
+    ## misnested <font> moved by html5lib, links between the tags
+    ## don't follow their contents after.
+    ('<div><div><h1><font></h1><table><span><li>more text here. </font></div>',
+     u'<!-- FFF_replace_br_with_p_has_been_run -->\n<div id="FFF_replace_br_with_p_has_been_run">\n'
+     u'<div>\n<p><h1></h1><font></font><li><font>more text here. </font></li></p>\n</div></div>\n'),
+    ]
+
+TOKENS = ['<br />','<br/>','<br>','\n','  ','word ','more text here. ','[x]','{p}','&amp;','&lt;','&nbsp;',
+          '<div>','</div>','<div class="a  b" style="x">','<blockquote>','</blockquote>','<p>','</p>',
+          '<p class="c">','<b>','</b>','<i>','</i>','<span>','</span>','<a href="x">','</a>','<hr />',
+          '<hr class="x"/>','<!-- c -->','<table><tr><td>','</td></tr></table>','<ul><li>','</li></ul>',
+          '<pre>','</pre>','<noscript>','</noscript>','<center>','</center>','<h1>','</h1>','<font>',
+          '</font>','<tr>','<li>','<select>','<option>','</br>','<em>','</em>','<img src="x"/>',
+          '<div><div>','</div></div>','<p>text<div>in</div>after</p>','<form>','</form>','<table>',
+          '<td>','</table>','<h2>','<nobr>','</nobr>','<s>','</s>','<dl><dt>','<dd>','</li>','</td>']
+
+def generated(seed):
+    rand = random.Random(seed)
+    parts = []
+    for _ in range(rand.randint(1,60)):
+        if rand.random() < 0.6:
+            parts.append(rand.choice(TOKENS))
+        else:
+            parts.append(rand.choice(['word ','text. ','<br />','<br /><br />','<br /><br /><br />']))
+    html = ''.join(parts)
+    if rand.random() < 0.5:
+        html = '<div>'*rand.randint(1,4) + html + '</div>'*rand.randint(0,4)
+    return html
+
+FIXTURE_PAGES = [ getattr(module,name)
+                  for module in (fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom)
+                  for name in sorted(dir(module))
+                  if name.endswith('_return') and isinstance(getattr(module,name),str) ]
+
+def reference_soup_up_div(body):
+    ## soup_up_div() as it was, parsing each nested block again.
+    blockTags = ['address', 'aside', 'blockquote', 'del', 'div', 'dl', 'fieldset', 'form', 'ins', 'noscript', 'ol', 'p', 'pre', 'table', 'ul']
+    recurseTags = ['blockquote', 'div', 'noscript']
+
+    tag = body[:body.index('>')+1]
+    tagend = body[body.rindex('<'):]
+
+    body = body.replace(u'<br />', u'[br /]')
+
+    soup = bs.BeautifulSoup('<div id="soup_up_div">'+body+'</div>','html5lib').find('div',id="soup_up_div")
+
+    body = u''
+    lastElement = 1 # 1 = block, 2 = nested, 3 = invalid
+
+    for i in soup.contents[0]:
+        if str(i).strip().__len__() > 0:
+            s = str(i)
+            if  type(i) == bs.Tag:
+                if  i.name in blockTags:
+                    if lastElement > 1:
+                        body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
+                        body += u'{/p}'
+
+                    lastElement = 1
+
+                    if i.name in recurseTags:
+                        s = reference_soup_up_div(s)
+
+                    body += s.strip() + '\n'
+                else:
+                    if lastElement == 1:
+                        body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
+                        body += u'{p}'
+
+                    lastElement = 2
+                    body += s
+            elif type(i) == bs.Comment:
+                pass
+            else:
+                if lastElement == 1:
+                    body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
+                    body += u'{p}'
+
+                lastElement = 3
+                body += s
+
+    if lastElement > 1:
+        body = body.strip(r'\s*(\[br\ \/\]\s*)*\s*')
+        body += u'{/p}'
+
+    body = body.replace(u'[br /]', u'<br />')
+
+    return tag + body + tagend
+
+def reference_replace_br_with_p(html):
+    with patch.object(htmlheuristics,'soup_up_div',reference_soup_up_div):
+        return replace_br_with_p(html)
+
+@pytest.mark.parametrize('html,expected', EXPECTED)
+def test_expected(html,expected):
+    assert replace_br_with_p(html) == expected
+
+def test_run_once():
+    html = replace_br_with_p(EXPECTED[0][0])
+    assert was_run_marker in html
+    assert replace_br_with_p(html) == html
+
+@pytest.mark.parametrize('block', range(8))
+def test_generated(block):
+    for seed in range(block*250,(block+1)*250):
+        html = generated(seed)
+        assert replace_br_with_p(html) == reference_replace_br_with_p(html), html
+
+@pytest.mark.parametrize('num', range(len(FIXTURE_PAGES)))
+def test_fixture_pages(num):
+    assert replace_br_with_p(FIXTURE_PAGES[num]) == reference_replace_br_with_p(FIXTURE_PAGES[num])
+
+## replace_br_with_p() from many threads at once, as from a pool of
+## chapter workers, gives the same as one at a time.
+def test_concurrent_matches_serial():
+    from concurrent.futures import ThreadPoolExecutor
+    chapters = [ generated(seed) for seed in range(2000) ]
+    serial = [ replace_br_with_p(html) for html in chapters ]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert list(pool.map(replace_br_with_p, chapters)) == serial
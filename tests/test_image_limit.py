@@ -0,0 +1,92 @@
+import io
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from fanficfare import exceptions
+from fanficfare.fetchers import fetcher_requests
+from fanficfare.fetchers.fetcher_requests import RequestsFetcher
+
+## Streamed image downloads and max_image_bytes.
+
+class CountingBody(io.BytesIO):
+    ## how much of the body was actually read.
+    def __init__(self,data):
+        super(CountingBody,self).__init__(data)
+        self.bytes_read = 0
+
+    def read(self,size=-1):
+        d = super(CountingBody,self).read(size)
+        self.bytes_read += len(d)
+        return d
+
+class FakeAdapter(BaseAdapter):
+    def __init__(self,body,headers):
+        super(FakeAdapter,self).__init__()
+        self.body = CountingBody(body)
+        self.headers = headers
+
+    def send(self,request,**kargs):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.headers.update(self.headers)
+        resp.raw = self.body
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def shared(monkeypatch):
+    monkeypatch.setattr(fetcher_requests,'shared_adapters',{})
+
+IMG = 'https://img.a.com/1.jpg'
+
+def make_fetcher(body,headers,**config):
+    fetcher = RequestsFetcher(lambda key,default=None:config.get(key,default),
+                              lambda key,default=[]:default)
+    adapter = FakeAdapter(body,headers)
+    fetcher.get_requests_session().mount('https://img.a.com/',adapter)
+    return (fetcher,adapter.body)
+
+def fetch(body,headers,image=True,**config):
+    (fetcher,body) = make_fetcher(body,headers,**config)
+    return fetcher.request('GET',IMG,image=image).content
+
+def test_under_limit():
+    data = b'x'*1000
+    assert fetch(data,{'Content-Type':'image/jpeg'},max_image_bytes='2000') == data
+
+def test_no_limit():
+    data = b'x'*200000
+    assert fetch(data,{'Content-Type':'image/jpeg'}) == data
+    assert fetch(data,{'Content-Type':'image/jpeg'},max_image_bytes='lots') == data
+
+def test_content_length_over_limit():
+    (fetcher,body) = make_fetcher(b'x'*5000,{'Content-Type':'image/png','Content-Length':'5000'},
+                                  max_image_bytes='2000')
+    with pytest.raises(exceptions.RejectImage):
+        fetcher.request('GET',IMG,image=True)
+    assert body.bytes_read == 0
+
+def test_streamed_over_limit():
+    ## no Content-Length, stops after the first chunk over.
+    (fetcher,body) = make_fetcher(b'x'*500000,{'Content-Type':'image/png'},max_image_bytes='2000')
+    with pytest.raises(exceptions.RejectImage):
+        fetcher.request('GET',IMG,image=True)
+    assert body.bytes_read < 500000
+
+def test_not_an_image():
+    (fetcher,body) = make_fetcher(b'<html>login</html>',{'Content-Type':'text/html; charset=utf-8'})
+    with pytest.raises(exceptions.RejectImage):
+        fetcher.request('GET',IMG,image=True)
+    assert body.bytes_read == 0
+    ## generic types are allowed through.
+    assert fetch(b'img',{'Content-Type':'application/octet-stream'}) == b'img'
+
+def test_page_not_limited():
+    data = b'x'*5000
+    assert fetch(data,{'Content-Type':'text/html'},image=False,max_image_bytes='2000') == data
@@ -0,0 +1,59 @@
+import json
+
+from fanficfare.fetchers import cache_basic
+from fanficfare.fetchers.base_fetcher import FetcherResponse
+from fanficfare.fetchers.cache_basic import BasicCache, BasicCacheDecorator
+from fanficfare.fetchers.metrics import FetchMetrics
+
+## FetchMetrics counters and what BasicCacheDecorator reports into
+## them.
+
+def test_counters():
+    metrics = FetchMetrics()
+    metrics.record('BasicCache','https://a.com/1',hit=True,nbytes=100,latency=0.001)
+    metrics.record('BasicCache','https://a.com/2',hit=False,latency=0.3)
+    metrics.record('BasicCache','https://b.com/1',hit=False,latency=100,error=True)
+    metrics.record('Sleep','https://a.com/1',sleep=2.5)
+    stats = metrics.get_stats()
+    a = stats['BasicCache']['a.com']
+    assert (a['requests'],a['hits'],a['misses'],a['errors'],a['bytes']) == (2,1,1,0,100)
+    assert a['hit_ratio'] == 0.5
+    assert a['latency_max'] == 0.3
+    assert a['latency_buckets']['<=0.01'] == 1
+    assert a['latency_buckets']['<=0.5'] == 1
+    assert stats['BasicCache']['b.com']['latency_buckets']['>60.0'] == 1
+    assert stats['Sleep']['a.com']['sleep_time'] == 2.5
+    ## no lookups, no ratio.
+    assert stats['Sleep']['a.com']['hit_ratio'] is None
+
+def test_totals():
+    metrics = FetchMetrics()
+    metrics.record('BasicCache','https://a.com/1',hit=True,nbytes=100,latency=0.2)
+    metrics.record('BasicCache','https://b.com/1',hit=False,nbytes=50,latency=3)
+    total = metrics.get_stats()['BasicCache']['*']
+    assert (total['requests'],total['hits'],total['misses'],total['bytes']) == (2,1,1,150)
+    assert total['latency_max'] == 3
+    assert total['latency_total'] == 3.2
+    assert total['latency_buckets']['<=0.25'] == 1
+    assert total['latency_buckets']['<=5.0'] == 1
+
+def test_reset_and_json():
+    metrics = FetchMetrics()
+    metrics.record('BasicCache','https://a.com/1',hit=True)
+    assert json.loads(metrics.to_json())['BasicCache']['*']['hits'] == 1
+    metrics.reset()
+    assert metrics.get_stats() == {}
+
+def test_basic_cache_reports(monkeypatch):
+    metrics = FetchMetrics()
+    monkeypatch.setattr(cache_basic,'fetch_metrics',metrics)
+    class Fetcher(object):
+        def getConfig(self,key,default=None):
+            return default
+    def chainfn(method,url,**kargs):
+        return FetcherResponse(b'page',url)
+    decorator = BasicCacheDecorator(BasicCache())
+    for i in range(3):
+        decorator.fetcher_do_request(Fetcher(),chainfn,'GET','https://a.com/1')
+    c = metrics.get_stats()['BasicCache']['a.com']
+    assert (c['requests'],c['hits'],c['misses'],c['bytes']) == (3,2,1,8)
@@ -0,0 +1,126 @@
+import base64
+import socket
+import threading
+import time
+
+import pytest
+
+from fanficfare import exceptions
+from fanficfare.fetchers.fetcher_nsapa_proxy import NSAPA_ProxyFetcher, END_OF_HEADER
+
+## NSAPA_ProxyFetcher against a fake proxy on localhost.
+
+class FakeProxy(object):
+    '''
+    Answers each request with the next of replies, a list of
+    (pieces, close): bytes sent one piece at a time, then the
+    connection closed if close.
+    '''
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        self.connections = 0
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while self.replies:
+            try:
+                (conn, addr) = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            with conn:
+                while self.replies:
+                    url = conn.recv(4096)
+                    if not url:
+                        break
+                    self.requests.append(url.decode('utf-8'))
+                    (pieces, close) = self.replies.pop(0)
+                    for piece in pieces:
+                        conn.sendall(piece)
+                        time.sleep(0.01)
+                    if close:
+                        break
+
+    def close(self):
+        self.server.close()
+
+def reply(content, type_='text', pieces=1, close=False, size=None):
+    data = ('%s||%s' % (size or len(content), type_)).encode('utf-8') + END_OF_HEADER + content
+    step = len(data)//pieces + 1
+    return ([ data[i:i+step] for i in range(0, len(data), step) ], close)
+
+@pytest.fixture
+def make_fetcher():
+    proxies = []
+    fetchers = []
+    def make(*replies):
+        proxy = FakeProxy(replies)
+        proxies.append(proxy)
+        config = {'nsapa_proxy_address':'127.0.0.1',
+                  'nsapa_proxy_port':proxy.port}
+        fetcher = NSAPA_ProxyFetcher(lambda key,default=None:config.get(key,default),
+                                     lambda key,default=[]:default)
+        fetchers.append(fetcher)
+        return (fetcher, proxy)
+    yield make
+    for fetcher in fetchers:
+        fetcher.close_proxy()
+    for proxy in proxies:
+        proxy.close()
+
+def test_one_connection(make_fetcher):
+    (fetcher, proxy) = make_fetcher(reply(b'<html>1</html>'), reply(b'<html>2</html>'))
+    assert fetcher.proxy_request('https://a.com/1') == ('text', '<html>1</html>')
+    assert fetcher.proxy_request('https://a.com/2') == ('text', '<html>2</html>')
+    assert proxy.requests == ['https://a.com/1', 'https://a.com/2']
+    assert proxy.connections == 1
+
+def test_split_reply(make_fetcher):
+    ## header marker split across reads, payload in several.
+    page = b'<html>%s</html>' % (b'x'*5000)
+    (fetcher, proxy) = make_fetcher(reply(page, pieces=7), reply(b'\x89PNG', 'image', pieces=3))
+    assert fetcher.proxy_request('https://a.com/1') == ('text', page.decode('utf-8'))
+    assert fetcher.proxy_request('https://a.com/1.png') == ('image', b'\x89PNG')
+
+def test_base64(make_fetcher):
+    (fetcher, proxy) = make_fetcher(reply(base64.standard_b64encode(b'\x00page'), 'text-b64'))
+    assert fetcher.proxy_request('https://a.com/1') == ('text-b64', b'\x00page')
+
+def test_reconnect_after_proxy_closed(make_fetcher):
+    (fetcher, proxy) = make_fetcher(reply(b'<html>1</html>', close=True), reply(b'<html>2</html>'))
+    assert fetcher.proxy_request('https://a.com/1') == ('text', '<html>1</html>')
+    assert fetcher.proxy_request('https://a.com/2') == ('text', '<html>2</html>')
+    assert proxy.connections == 2
+
+def test_truncated_reply(make_fetcher):
+    (fetcher, proxy) = make_fetcher(reply(b'<html>1', size=100, close=True), reply(b'<html>2</html>'))
+    with pytest.raises(exceptions.FailedToDownload):
+        fetcher.proxy_request('https://a.com/1', timeout=1)
+    ## not read as part of the next reply.
+    assert fetcher.proxy_socket is None
+    assert fetcher.proxy_request('https://a.com/2') == ('text', '<html>2</html>')
+
+def test_bad_header(make_fetcher):
+    (fetcher, proxy) = make_fetcher(([b'lots||text'+END_OF_HEADER+b'page'], False))
+    with pytest.raises(exceptions.FailedToDownload):
+        fetcher.proxy_request('https://a.com/1')
+    assert fetcher.proxy_socket is None
+
+def test_connection_refused():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    config = {'nsapa_proxy_address':'127.0.0.1',
+              'nsapa_proxy_port':port}
+    fetcher = NSAPA_ProxyFetcher(lambda key,default=None:config.get(key,default),
+                                 lambda key,default=[]:default)
+    with pytest.raises(ConnectionError):
+        fetcher.proxy_request('https://a.com/1')
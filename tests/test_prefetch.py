@@ -0,0 +1,150 @@
+import threading
+
+from fanficfare.fetchers.prefetch import Prefetcher
+from fanficfare.fetchers.base_fetcher import FetcherResponse
+
+## Prefetcher against a fake fetcher whose requests block until
+## released, so the window can be checked.
+
+class FakeFetcher(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        ## url -> Event set when the request may finish
+        self.gates = {}
+        ## urls requested, in order, prefetch or not
+        self.requests = []
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def gate(self,url):
+        with self.lock:
+            return self.gates.setdefault(url,threading.Event())
+
+    def release(self,*urls):
+        for url in urls:
+            self.gate(url).set()
+
+    def condition_url(self,url):
+        return url
+
+    def do_request(self,method,url,**kargs):
+        with self.lock:
+            self.requests.append(url)
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight,self.inflight)
+        try:
+            assert self.gate(url).wait(5), url
+        finally:
+            with self.lock:
+                self.inflight -= 1
+        return FetcherResponse(b'page',redirecturl=url)
+
+    def get_request_redirected(self,url,**kargs):
+        resp = self.do_request('GET',self.condition_url(url),**kargs)
+        return (resp.content,resp.redirecturl)
+
+URLS = [ 'https://a.com/c/%s'%i for i in range(1,8) ]
+
+def read_chapter(prefetcher,fetcher,url):
+    ## what BaseSiteAdapter.getStory() does for each chapter, with
+    ## the site answering for url now.
+    fetcher.release(url)
+    prefetcher.wait(url)
+    fetcher.get_request_redirected(url)
+    prefetcher.fetched(url)
+
+def drain(prefetcher):
+    with prefetcher.lock:
+        futures = list(prefetcher.futures.values())
+    for future in futures:
+        future.result()
+
+def test_first_chapter_only_until_confirmed():
+    fetcher = FakeFetcher()
+    prefetcher = Prefetcher(fetcher,URLS,window=3)
+    try:
+        fetcher.release(URLS[0])
+        prefetcher.wait(URLS[0])
+        assert fetcher.requests == [URLS[0]]
+        fetcher.get_request_redirected(URLS[0])
+        prefetcher.fetched(URLS[0])
+        assert prefetcher.confirmed
+        assert set(prefetcher.futures) == set(URLS[1:4])
+    finally:
+        fetcher.release(*URLS)
+        prefetcher.shutdown()
+
+def test_window():
+    fetcher = FakeFetcher()
+    prefetcher = Prefetcher(fetcher,URLS,window=3)
+    try:
+        for url in URLS:
+            read_chapter(prefetcher,fetcher,url)
+            assert len(prefetcher.futures) <= 3
+        drain(prefetcher)
+        assert fetcher.max_inflight <= 4
+        ## each chapter once from prefetch, once from the main thread.
+        assert sorted(fetcher.requests) == sorted(URLS*2)
+    finally:
+        fetcher.release(*URLS)
+        prefetcher.shutdown()
+
+def test_wait_blocks_until_prefetched():
+    fetcher = FakeFetcher()
+    prefetcher = Prefetcher(fetcher,URLS,window=2)
+    done = threading.Event()
+    def waiter():
+        prefetcher.wait(URLS[0])
+        done.set()
+    t = threading.Thread(target=waiter)
+    t.start()
+    try:
+        assert not done.wait(0.2)
+        fetcher.release(URLS[0])
+        assert done.wait(5)
+    finally:
+        t.join()
+        fetcher.release(*URLS)
+        prefetcher.shutdown()
+
+def test_stops_when_adapter_fetches_other_url():
+    fetcher = FakeFetcher()
+    prefetcher = Prefetcher(fetcher,URLS,window=3)
+    try:
+        fetcher.release(URLS[0],URLS[0]+'&action=printable')
+        prefetcher.wait(URLS[0])
+        fetcher.get_request_redirected(URLS[0]+'&action=printable')
+        prefetcher.fetched(URLS[0])
+        assert not prefetcher.confirmed
+        assert prefetcher.futures == {}
+        assert prefetcher.pending == []
+        ## no more prefetching, main thread fetches go straight through.
+        for url in URLS[1:3]:
+            prefetcher.wait(url)
+            prefetcher.fetched(url)
+        assert fetcher.requests == [URLS[0],URLS[0]+'&action=printable']
+        assert fetcher.do_request.__func__ is FakeFetcher.do_request
+    finally:
+        fetcher.release(*URLS)
+        prefetcher.shutdown()
+
+def test_shutdown_restores_fetcher():
+    fetcher = FakeFetcher()
+    prefetcher = Prefetcher(fetcher,URLS,window=3)
+    assert fetcher.do_request == prefetcher.watch_do_request
+    prefetcher.shutdown()
+    fetcher.release(*URLS)
+    assert fetcher.do_request.__func__ is FakeFetcher.do_request
+    ## pending never started.
+    assert URLS[1] not in fetcher.requests
+
+def test_prefetch_failure_ignored():
+    fetcher = FakeFetcher()
+    def fail(url,**kargs):
+        raise Exception("site down")
+    prefetcher = Prefetcher(fetcher,[],window=2)
+    fetcher.get_request_redirected = fail
+    prefetcher.pending = [URLS[0]]
+    prefetcher.fill()
+    prefetcher.wait(URLS[0])
+    prefetcher.shutdown()
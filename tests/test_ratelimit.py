@@ -0,0 +1,168 @@
+import pytest
+
+from fanficfare.fetchers import decorators
+from fanficfare.fetchers.decorators import HostRateLimiter, HostBackoff, SleepDecorator
+from fanficfare.fetchers.cache_browser import BrowserCacheDecorator
+from fanficfare.fetchers.base_fetcher import FetcherResponse
+
+## HostRateLimiter/HostBackoff/SleepDecorator against the fake clock.
+## random.uniform() always gives the middle of the range, so each
+## step is exactly the interval.
+
+class FakeRandom(object):
+    def uniform(self,a,b):
+        return (a+b)/2.0
+
+@pytest.fixture(autouse=True)
+def fake_time(clock,monkeypatch):
+    monkeypatch.setattr(decorators,'time',clock)
+    monkeypatch.setattr(decorators,'random',FakeRandom())
+
+class FakeFetcher(object):
+    def __init__(self,config=None,fromcache=False):
+        self.config = config or {}
+        self.fromcache = fromcache
+        self.requests = []
+
+    def getConfig(self,key,default=None):
+        return self.config.get(key,default)
+
+    def do_request(self,method,url,**kwargs):
+        self.requests.append(url)
+        return FetcherResponse(b'page',redirecturl=url,fromcache=self.fromcache)
+
+def waits(limiter,host,interval,burst,count):
+    return [ limiter.reserve(host,interval,burst)[0] for i in range(count) ]
+
+def test_reserve_spaces_requests(clock):
+    limiter = HostRateLimiter()
+    assert waits(limiter,'a.com',2.0,1,4) == [0,2.0,4.0,6.0]
+    ## other hosts have their own schedule.
+    assert waits(limiter,'b.com',2.0,1,1) == [0]
+
+def test_reserve_burst(clock):
+    limiter = HostRateLimiter()
+    assert waits(limiter,'a.com',1.0,3,5) == [0,0,0,1.0,2.0]
+    ## time passing earns the burst back.
+    clock.now += 10
+    assert waits(limiter,'a.com',1.0,3,4) == [0,0,0,1.0]
+
+def test_reserve_after_idle(clock):
+    limiter = HostRateLimiter()
+    waits(limiter,'a.com',2.0,1,2)
+    clock.now += 1.5
+    assert waits(limiter,'a.com',2.0,1,1) == [2.5]
+    clock.now += 10
+    assert waits(limiter,'a.com',2.0,1,1) == [0]
+    assert waits(limiter,'a.com',2.0,1,1) == [2.0]
+
+def test_refund(clock):
+    limiter = HostRateLimiter()
+    (wait,step) = limiter.reserve('a.com',2.0)
+    limiter.refund('a.com',step)
+    assert waits(limiter,'a.com',2.0,1,2) == [0,2.0]
+    st = limiter.get_stats()['a.com']
+    assert st['requests'] == 3
+    assert st['throttled_requests'] == 1
+    assert limiter.get_throttled_time('a.com') == 2.0
+
+def test_defer(clock):
+    limiter = HostRateLimiter()
+    limiter.defer('a.com',30)
+    assert waits(limiter,'a.com',1.0,1,2) == [30.0,31.0]
+    ## defer never moves the schedule earlier.
+    limiter.defer('a.com',5)
+    assert waits(limiter,'a.com',1.0,1,1) == [32.0]
+
+def test_backoff_doubles_and_decays(clock):
+    limiter = HostRateLimiter()
+    backoff = HostBackoff(limiter,initial=2.0,maximum=10.0,decay=0.5)
+    assert backoff.throttled('a.com') == 2.0
+    assert backoff.throttled('a.com') == 4.0
+    assert backoff.throttled('a.com',count=2) == 10.0
+    assert backoff.get_stats() == {'a.com':{'throttles':4,'delay':10.0}}
+    backoff.succeeded('a.com')
+    assert backoff.get_delay('a.com') == 5.0
+    backoff.succeeded('a.com')
+    backoff.succeeded('a.com')
+    assert backoff.get_delay('a.com') == 1.25
+    backoff.succeeded('a.com')
+    assert backoff.get_delay('a.com') == 0.625
+    ## under initial/4, delay is dropped.
+    backoff.succeeded('a.com')
+    assert backoff.get_delay('a.com') == 0.0
+    assert 'a.com' not in backoff.delay
+
+def test_backoff_retry_after(clock):
+    limiter = HostRateLimiter()
+    backoff = HostBackoff(limiter,initial=2.0,maximum=300.0)
+    assert backoff.throttled('a.com',retry_after=60) == 60.0
+    assert waits(limiter,'a.com',1.0,1,1) == [60.0]
+
+def test_sleep_decorator(clock):
+    limiter = HostRateLimiter()
+    sleeper = SleepDecorator(limiter,HostBackoff(limiter))
+    fetcher = FakeFetcher({'slow_down_sleep_time':'2'})
+    sleeper.decorate_fetcher(fetcher)
+    for i in range(3):
+        fetcher.do_request('GET','https://a.com/%s'%i)
+    assert clock.slept == [2.0,2.0]
+    assert sleeper.throttled_time == 4.0
+    ## file: urls are never limited.
+    fetcher.do_request('GET','file:///tmp/x')
+    assert clock.slept == [2.0,2.0]
+
+def test_sleep_decorator_refunds_fromcache(clock):
+    limiter = HostRateLimiter()
+    sleeper = SleepDecorator(limiter,HostBackoff(limiter))
+    fetcher = FakeFetcher({'slow_down_sleep_time':'2'},fromcache=True)
+    sleeper.decorate_fetcher(fetcher)
+    for i in range(3):
+        fetcher.do_request('GET','https://a.com/%s'%i)
+    assert clock.slept == []
+
+def test_sleep_decorator_backoff_interval(clock):
+    limiter = HostRateLimiter()
+    backoff = HostBackoff(limiter,initial=5.0)
+    sleeper = SleepDecorator(limiter,backoff)
+    fetcher = FakeFetcher({'slow_down_sleep_time':'1'})
+    assert sleeper.get_interval(fetcher,'a.com') == 1.0
+    backoff.throttled('a.com')
+    assert sleeper.get_interval(fetcher,'a.com') == 5.0
+    sleeper.set_sleep_override(8)
+    assert sleeper.get_interval(fetcher,'a.com') == 8.0
+
+@pytest.mark.parametrize('config,interval,burst', [
+    ({}, 0.0, 1),
+    ({'rate_limit_requests_per_second':'4'}, 0.25, 1),
+    ({'rate_limit_requests_per_second':'4','slow_down_sleep_time':'1'}, 1.0, 1),
+    ({'rate_limit_requests_per_second':'fast','rate_limit_burst':'lots'}, 0.0, 1),
+    ({'rate_limit_requests_per_second':'-1','rate_limit_burst':'0'}, 0.0, 1),
+    ({'rate_limit_burst':'5'}, 0.0, 5),
+    ])
+def test_sleep_decorator_config(config,interval,burst):
+    sleeper = SleepDecorator(HostRateLimiter(),HostBackoff())
+    fetcher = FakeFetcher(config)
+    assert sleeper.get_interval(fetcher,'a.com') == interval
+    assert sleeper.get_burst(fetcher) == burst
+
+class FakeBrowserCache(object):
+    def __init__(self,pages):
+        self.pages = pages
+
+    def get_data(self,url):
+        return self.pages.get(url)
+
+def test_browser_cache_hits_dont_wait(clock):
+    ## same order as Configuration.get_fetcher(): SleepDecorator
+    ## first, so it's below BrowserCacheDecorator.
+    limiter = HostRateLimiter()
+    fetcher = FakeFetcher({'slow_down_sleep_time':'2'})
+    SleepDecorator(limiter,HostBackoff(limiter)).decorate_fetcher(fetcher)
+    cache = FakeBrowserCache({'https://a.com/1':b'cached',
+                              'https://a.com/2':b'cached'})
+    BrowserCacheDecorator(cache).decorate_fetcher(fetcher)
+    for url in ['https://a.com/1','https://a.com/2','https://a.com/3','https://a.com/1','https://a.com/4']:
+        fetcher.do_request('GET',url)
+    assert fetcher.requests == ['https://a.com/3','https://a.com/4']
+    assert clock.slept == [2.0]
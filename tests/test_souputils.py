@@ -0,0 +1,142 @@
+import re
+
+import pytest
+from unittest.mock import patch
+from bs4 import BeautifulSoup, Tag
+
+from fanficfare import souputils
+from fanficfare.souputils import parse_html, needs_resoup
+from fanficfare.configurable import Configuration
+from fanficfare.adapters.adapter_wattpadcom import WattpadComAdapter
+
+from tests import fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom
+from tests.adapters import test_adapter_chireadscom, test_adapter_fanfictionsfr, test_adapter_wattpadcom
+
+## Equivalence corpus for make_soup()'s single html5lib parse against
+## the soup and re-soup it replaced.
+
+FIXTURE_PAGES = [ (module.__name__.split('.')[-1]+'.'+name, getattr(module,name))
+                  for module in (fixtures_chireads, fixtures_fanfictionsfr, fixtures_wattpadcom)
+                  for name in sorted(dir(module))
+                  if name.endswith('_return') and isinstance(getattr(module,name),str) ]
+
+## Nesting the second html5lib parse changes, and some it doesn't.
+MISNESTED = [
+    '<b><p>x</b>y</p>',
+    '<i>a<p>b</i>c</p>',
+    '<p><b>1<i>2</b>3</i>4</p>',
+    '<a href="1">x<a href="2">y</a>',
+    '<table><tr><td>a</td><b>bold</b></tr></table>',
+    '<p>a<div>b</div>c</p>',
+    '<font><p>a</font>b<p>c',
+    '<center><b>x<center>y</b>z</center>',
+    '<p><b><i>x</p><p>y</b>z</i></p>',
+    '<ul><li>a<li>b</ul><b>c<li>d</b>',
+    '<em><p>one<p>two</em>three',
+    '<ul><li>a<ul><li>b</li></ul></li></ul>',
+    '<dl><dt>a<dd>b<dt>c</dl>',
+    '<p><b>x<i>y</p><p>z<em>w<hr>q</em></p>',
+    '</tr></p>x</table></u><b></ul></option><!--c--><b><!--c--></td></a><p>&amp;<a></hr><p><!--c--><i></td><tr>x<tbody><tbody> </tbody><b></s></b>&amp;<em></li><table><hr>',
+    '<form>y z<tr><nobr>x<span></i></tr>y z<b><center></form></h1></form></li>x<table>x<i><li><form>xx</form>',
+    '<form></tr></center> <nobr></li><span>y z</b></s><ul></h1>\n</a></div></span></tr></tr></font></div><!--c--><table></s><nobr></center>&amp;',
+    '<a><em>x<nobr><div><h1><center> </s><table></font>&amp;<b><span></span><b><h1> <a>&amp;</font><hr>&amp;<a> </hr></h1>x ',
+    '<h1>a<h2>b</h2></h1>',
+    '<select><option>a<option>b</select>',
+    '<pre>\n\nindented</pre>',
+    '<textarea><b>x</b>\n</textarea><b>y',
+    '<xmp>a &amp; b</xmp>',
+    '<li><plaintext>x</li>',
+    '<template><p>x</template>y',
+    '<p>x<svg><circle/></svg></p>',
+    '<fff_hide_noscript><p>x</p></fff_hide_noscript><p>y',
+    '<head><fff_hide_noscript><style>x</style></fff_hide_noscript></head><body>z',
+    ]
+
+def double_soup(data):
+    return BeautifulSoup(str(BeautifulSoup(data,'html5lib')),'html5lib')
+
+def tree(node,out=None):
+    '''
+    Structure by .contents, strings separately, and the
+    next_element order bs4's find_all() uses.
+    '''
+    if out is None:
+        out = []
+    for child in node.contents:
+        if isinstance(child,Tag):
+            out.append((child.name,sorted(child.attrs.items())))
+            tree(child,out)
+            out.append('/'+child.name)
+        else:
+            out.append((type(child).__name__,str(child)))
+    return out
+
+def signature(soup):
+    return (str(soup),
+            tree(soup),
+            [ t.name if isinstance(t,Tag) else str(t) for t in soup.descendants ])
+
+@pytest.mark.parametrize('name,data', FIXTURE_PAGES + [ ('misnested%s'%i,d) for i,d in enumerate(MISNESTED) ])
+def test_single_parse_matches_double(name,data):
+    assert signature(parse_html(data)) == signature(double_soup(data))
+
+@pytest.mark.parametrize('name,data', FIXTURE_PAGES)
+def test_fixture_pages_parsed_once(name,data):
+    assert not needs_resoup(BeautifulSoup(data,'html5lib'))
+
+def test_unknown_parser_uses_html5lib():
+    assert str(parse_html('<p>a<div>b</div>','nosuchparser')) == str(double_soup('<p>a<div>b</div>'))
+
+## Cleaned chapter text, each adapter with a chapter fixture.
+ADAPTER_TESTS = [test_adapter_chireadscom, test_adapter_fanfictionsfr, test_adapter_wattpadcom]
+
+def chapter_text(test_module,parser=None,resoup=False):
+    data = test_module.SPECIFIC_TEST_DATA
+    configuration = Configuration(data['sections'],"EPUB",lightweight=True)
+    if parser:
+        configuration.add_section('overrides')
+        configuration.set('overrides','html_parser',parser)
+    adapter = data['adapter'](configuration,data['url'])
+
+    def get_request(url,*args,**kargs):
+        if url == WattpadComAdapter.API_GETCATEGORIES:
+            return fixtures_wattpadcom.wattpadcom_api_getcategories_return
+        if url.startswith(WattpadComAdapter.API_STORYINFO % ''):
+            return fixtures_wattpadcom.wattpadcom_api_story_return
+        return data['chapter_fixture']
+
+    path = 'fanficfare.adapters.'+data['specific_path_adapter']
+    with patch(path+'.get_request',side_effect=get_request), \
+         patch(path+'.get_request_redirected',return_value=(data['chapter_fixture'],data['chapter_url'])), \
+         patch.object(souputils,'needs_resoup',(lambda soup:True) if resoup else needs_resoup):
+        if test_module is test_adapter_wattpadcom:
+            adapter.extractChapterUrlsAndMetadata()
+        return adapter.getChapterText(data['chapter_url'])
+
+def collapse_whitespace(html):
+    return re.sub(r'>\s+','>',re.sub(r'\s+',' ',html))
+
+@pytest.mark.parametrize('test_module', ADAPTER_TESTS)
+def test_chapter_text_unchanged(test_module):
+    assert chapter_text(test_module,'html5lib') == chapter_text(test_module,resoup=True)
+
+## lxml and html.parser differences from html5lib, per adapter:
+##   chireads.com, fanfictions.fr: indentation whitespace only.  With
+##     html.parser, chireads' unclosed <p>s nest instead of closing.
+##   wattpad.com: none.
+LXML_SAME_EXCEPT_WHITESPACE = ADAPTER_TESTS
+HTML_PARSER_SAME_EXCEPT_WHITESPACE = [test_adapter_fanfictionsfr, test_adapter_wattpadcom]
+
+@pytest.mark.parametrize('test_module', LXML_SAME_EXCEPT_WHITESPACE)
+def test_chapter_text_lxml(test_module):
+    pytest.importorskip('lxml')
+    assert collapse_whitespace(chapter_text(test_module,'lxml')) == collapse_whitespace(chapter_text(test_module))
+
+@pytest.mark.parametrize('test_module', ADAPTER_TESTS)
+def test_chapter_text_html_parser(test_module):
+    expected = chapter_text(test_module)
+    text = chapter_text(test_module,'html.parser')
+    if test_module in HTML_PARSER_SAME_EXCEPT_WHITESPACE:
+        assert collapse_whitespace(text) == collapse_whitespace(expected)
+    for sentence in test_module.SPECIFIC_TEST_DATA['expected_sentences']:
+        assert sentence in text
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from fanficfare import adapters
+from fanficfare.configurable import Configuration
+
+## BaseSiteAdapter._do_utf8FromSoup() chapter cleanup, with
+## defaults.ini settings and images off, see also
+## bench_utf8fromsoup.py.
+
+CHAPTER_URL = 'https://test1.com/threads/story.123/threadmarks'
+
+# [email&#160;protected] for johndoe@email.com
+CF_EMAIL = ('<a href="/cdn-cgi/l/email-protection" class="__cf_email__" '
+            'data-cfemail="c7ada8afa9a3a8a287a2aaa6aeabe9a4a8aa">[email&#160;protected]</a>')
+
+def make_adapter(site='test1.com',url='http://test1.com?sid=1'):
+    configuration = Configuration([site],'EPUB')
+    configuration.read(os.path.join(os.path.dirname(adapters.__file__),'..','defaults.ini'))
+    configuration.set('overrides','include_images','false')
+    return adapters.getAdapter(configuration,url)
+
+def clean(html,adapter=None,url=CHAPTER_URL):
+    adapter = adapter or make_adapter()
+    return adapter.utf8FromSoup(url,BeautifulSoup('<div>'+html+'</div>','html5lib').div)
+
+def test_tags_renamed_and_removed():
+    text = clean('<u>under</u><center>c</center><script>x()</script><p class="chapter x" style="y">p</p>')
+    assert text == '<div><span class="u">under</span><div class="center">c</div><p class="x">p</p></div>'
+
+def test_empty_tags_removed_in_cascade():
+    assert clean('<div> <span> </span> <i> </i> </div><b>x</b>') == '<div><b>x</b></div>'
+
+def test_whitespace_tag_containing_tag():
+    assert clean('<div><span><b> </b></span><u>x</u></div>') == '<div><div><span class="u">x</span></div></div>'
+
+def test_empty_tags_kept():
+    assert clean('<p> </p><br/><hr/><a id="a"></a>x') == '<div><p> </p><br/><hr/><a id="a"></a>x</div>'
+
+def test_anchor_target_kept_when_emptied():
+    text = clean('<a id="foo"><img src="a.png"/></a> text <a href="#foo">go</a>')
+    assert text == '<div><a id="foo"></a> text <a href="#foo">go</a></div>'
+
+def test_links():
+    text = clean('<a href="#nope">n</a><a href="rel">r</a><a href="/abs">a</a><a href="http://x.com//y">h</a>')
+    assert text == ('<div><a href="https://test1.com/threads/story.123/#nope">n</a>'
+                    '<a href="https://test1.com/threads/story.123/rel">r</a>'
+                    '<a href="https://test1.com/abs">a</a>'
+                    '<a href="http://x.com/y">h</a></div>')
+
+def test_cf_email_decoded():
+    assert clean(CF_EMAIL) == '<div><span class="decoded_email">johndoe@email.com</span></div>'
+
+def test_cf_email_decoded_adapter_with_own_decode_emails():
+    ## adapter_spiritfanfictioncom has its own decode_emails(html_text).
+    adapter = make_adapter('www.spiritfanfiction.com','https://www.spiritfanfiction.com/historia/1234')
+    assert clean(CF_EMAIL,adapter) == '<div><span class="decoded_email">johndoe@email.com</span></div>'